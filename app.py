@@ -1,14 +1,19 @@
 """Main Streamlit application for DecisionGuide."""
+import io
+import uuid
 import streamlit as st
-from typing import Dict, Any, Optional
-from datetime import datetime
+from typing import Optional
 
 from utils.config import Config
 from services.decision_tree_service import DecisionTreeService
+from services.evaluation_cursor import EvaluationCursor
 from services.pdf_service import PDFService
+from services.pdf_jobs import PDFJobQueue, PDFJobRejected
 from services.history_service import HistoryService
 from services.analytics_service import AnalyticsService
 from models.decision_tree import DecisionResult
+from models.pdf_job import PDFJob
+from utils.metrics import start_exporter
 from utils.validators import validate_radio_selection, sanitize_input
 
 
@@ -27,9 +32,18 @@ st.set_page_config(
 @st.cache_resource
 def get_services():
     """Initialize and cache services."""
+    # Load errors go to stderr and are shown in the sidebar from tree_service.load_errors
+    tree_service = DecisionTreeService()
+    if Config.HOT_RELOAD:
+        # Sessions keep the tree snapshot their cursor was created from
+        tree_service.start_watching()
+    # Serves or dumps latency metrics when ENABLE_METRICS is set
+    start_exporter()
+    pdf_service = PDFService()
     return {
-        "tree_service": DecisionTreeService(),
-        "pdf_service": PDFService(),
+        "tree_service": tree_service,
+        "pdf_service": pdf_service,
+        "pdf_jobs": PDFJobQueue(pdf_service),
         "history_service": HistoryService(),
         "analytics_service": AnalyticsService()
     }
@@ -37,6 +51,7 @@ def get_services():
 services = get_services()
 tree_service = services["tree_service"]
 pdf_service = services["pdf_service"]
+pdf_jobs = services["pdf_jobs"]
 history_service = services["history_service"]
 analytics_service = services["analytics_service"]
 
@@ -51,6 +66,12 @@ if "decision_result" not in st.session_state:
     st.session_state.decision_result = None
 if "show_path" not in st.session_state:
     st.session_state.show_path = False
+if "cursor" not in st.session_state:
+    st.session_state.cursor = None
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if "pdf_job_id" not in st.session_state:
+    st.session_state.pdf_job_id = None
 
 # ----------------------------
 # HELPER FUNCTIONS
@@ -61,6 +82,8 @@ def reset_session() -> None:
     st.session_state.current_tree = None
     st.session_state.decision_result = None
     st.session_state.show_path = False
+    st.session_state.cursor = None
+    st.session_state.pdf_job_id = None
     st.rerun()
 
 def render_question(
@@ -95,185 +118,93 @@ def render_question(
     # Sanitize input
     return sanitize_input(answer)
 
-def calculate_progress(answers: Dict[str, Any], tree_name: str) -> float:
+def calculate_progress(cursor: Optional[EvaluationCursor]) -> float:
     """
     Calculate progress through decision tree.
     
     Args:
-        answers: Dictionary of answers
-        tree_name: Name of the current tree
+        cursor: Evaluation cursor of the current session
         
     Returns:
         Progress percentage (0-100)
     """
-    # Estimate based on number of answers
-    # This is a simplified calculation
-    if tree_name == "Incident Reporting":
-        total_questions = 5
-    elif tree_name == "Vendor Risk Tiering":
-        total_questions = 3
-    elif tree_name == "DPIA Requirement":
-        total_questions = 3
-    else:
-        total_questions = 5
-    
-    answered = sum(1 for v in answers.values() if v and v != "Select...")
-    return min(100, (answered / total_questions) * 100) if total_questions > 0 else 0
+    return cursor.progress if cursor is not None else 0.0
 
 # ----------------------------
 # TREE RENDERING FUNCTIONS
 # ----------------------------
-def render_incident_reporting_tree() -> Optional[DecisionResult]:
-    """Render the incident reporting decision tree."""
-    st.subheader("Tree 1 – Vendor Incident Reporting")
-    
-    # Question 1
-    q1 = render_question(
-        "ir_q1",
-        "1. Does this vendor process personal or sensitive data on your behalf?",
-        ["Select...", "Yes", "No"],
-        help_text="Personal data includes any information that can identify an individual"
-    )
-    st.session_state.answers["ir_q1"] = q1
-    
-    if q1 == "Select...":
-        return None
-    
-    if q1 == "No":
-        return tree_service.execute_tree("Incident Reporting", st.session_state.answers)
-    
-    # Question 2
-    q2 = render_question(
-        "ir_q2",
-        "2. Is there a regulatory or contractual incident/breach reporting requirement "
-        "(for example GDPR/UK GDPR, sector rules, or customer contracts)?",
-        ["Select...", "Yes", "No"]
-    )
-    st.session_state.answers["ir_q2"] = q2
-    
-    if q2 == "Select...":
-        return None
-    
-    if q2 == "No":
-        return tree_service.execute_tree("Incident Reporting", st.session_state.answers)
-    
-    # Question 3
-    q3 = render_question(
-        "ir_q3",
-        "3. What is your required maximum incident notification timeframe?",
-        ["Select...", "24 hours", "48 hours", "72 hours"]
-    )
-    st.session_state.answers["ir_q3"] = q3
-    
-    if q3 == "Select...":
-        return None
-    
-    # Question 4 - Safe extraction with error handling
-    try:
-        required_hours = int(q3.split()[0]) if q3 != "Select..." else 24
-    except (ValueError, AttributeError, IndexError):
-        required_hours = 24
-    
-    q4 = render_question(
-        "ir_q4",
-        f"4. Can the vendor contractually commit to notify you within {required_hours} hours?",
-        ["Select...", "Yes", "No"]
-    )
-    st.session_state.answers["ir_q4"] = q4
-    
-    if q4 == "Select...":
-        return None
-    
-    if q4 == "Yes":
-        return tree_service.execute_tree("Incident Reporting", st.session_state.answers)
+def render_tree(tree_name: str) -> Optional[DecisionResult]:
+    """
+    Render the questions of a decision tree along the answered path.
     
-    # Question 5
-    q5 = render_question(
-        "ir_q5",
-        "5. Can you introduce compensating controls (for example enhanced monitoring, "
-        "stricter SLAs, high-priority incident routing)?",
-        ["Select...", "Yes", "No"]
-    )
-    st.session_state.answers["ir_q5"] = q5
+    The session's evaluation cursor only moves for answers that changed,
+    so a rerun does not re-walk the tree from the first question.
     
-    if q5 == "Select...":
+    Args:
+        tree_name: Name of the tree to render
+        
+    Returns:
+        DecisionResult once an outcome is reached, otherwise None
+    """
+    cursor = st.session_state.cursor
+    if cursor is None or cursor.tree_name != tree_name:
+        on_step = analytics_service.track_step if Config.ENABLE_ANALYTICS else None
+        cursor = tree_service.create_cursor(tree_name, on_step)
+        st.session_state.cursor = cursor
+    if cursor is None:
+        st.error(f"Tree '{tree_name}' is not available.")
         return None
     
-    return tree_service.execute_tree("Incident Reporting", st.session_state.answers)
+    st.subheader(cursor.tree.title)
+    
+    position = 0
+    question = cursor.question_at(position)
+    while question is not None:
+        answer = render_question(
+            question.id,
+            f"{position + 1}. {question.text}",
+            ["Select..."] + question.options,
+            help_text=question.help_text
+        )
+        st.session_state.answers[question.id] = answer
+        cursor.answer(question.id, answer)
+        position += 1
+        question = cursor.question_at(position)
+    
+    return cursor.result() if cursor.complete else None
 
-def render_vendor_classification_tree() -> Optional[DecisionResult]:
-    """Render the vendor classification decision tree."""
-    st.subheader("Tree 2 – Vendor Data Risk Classification")
-    
-    q1 = render_question(
-        "vc_q1",
-        "1. Does the vendor handle personal data?",
-        ["Select...", "No data", "Personal data", "Special category / highly sensitive data"]
-    )
-    st.session_state.answers["vc_q1"] = q1
-    
-    if q1 == "Select...":
-        return None
-    
-    q2 = render_question(
-        "vc_q2",
-        "2. What is the scale of processing?",
-        ["Select...", "Small (few records, low volume)", "Medium", "Large (high volume / continuous)"]
-    )
-    st.session_state.answers["vc_q2"] = q2
-    
-    if q2 == "Select...":
-        return None
-    
-    q3 = render_question(
-        "vc_q3",
-        "3. Does the vendor connect to your core systems or internal network?",
-        ["Select...", "Yes", "No"]
-    )
-    st.session_state.answers["vc_q3"] = q3
-    
-    if q3 == "Select...":
-        return None
-    
-    return tree_service.execute_tree("Vendor Risk Tiering", st.session_state.answers)
+# Fragments are still experimental in older Streamlit releases
+fragment = getattr(st, "fragment", None) or st.experimental_fragment
 
-def render_dpia_tree() -> Optional[DecisionResult]:
-    """Render the DPIA requirement decision tree."""
-    st.subheader("Tree 3 – DPIA Requirement Check")
-    
-    q1 = render_question(
-        "dp_q1",
-        "1. Does the processing involve systematic and extensive profiling or automated decisions about individuals?",
-        ["Select...", "Yes", "No"]
-    )
-    st.session_state.answers["dp_q1"] = q1
-    
-    if q1 == "Select...":
-        return None
-    
-    q2 = render_question(
-        "dp_q2",
-        "2. Will the processing involve large-scale use of special category data "
-        "(for example health, biometrics, ethnicity)?",
-        ["Select...", "Yes", "No"]
-    )
-    st.session_state.answers["dp_q2"] = q2
-    
-    if q2 == "Select...":
-        return None
+@fragment(run_every=1)
+def poll_pdf_job() -> None:
+    """Show the session's PDF job status, rerunning the page once it finishes."""
+    job = pdf_jobs.get(st.session_state.pdf_job_id)
+    if job is None or job.finished:
+        st.rerun()
+    st.caption(f"⏳ Preparing PDF ({job.status.value})...")
+
+def render_pdf_job(job: PDFJob) -> None:
+    """
+    Offer the download of a finished PDF job.
     
-    q3 = render_question(
-        "dp_q3",
-        "3. Will the processing involve systematic monitoring of publicly accessible areas "
-        "or behaviour (for example CCTV, online tracking)?",
-        ["Select...", "Yes", "No"]
+    Args:
+        job: Finished job
+    """
+    if job.error:
+        st.error(job.error)
+        return
+    if job.data is not None:
+        data = job.data
+    else:
+        with open(job.path, 'rb') as f:
+            data = f.read()
+    st.download_button(
+        "⬇️ Download PDF",
+        data,
+        file_name=job.file_name,
+        mime="application/pdf"
     )
-    st.session_state.answers["dp_q3"] = q3
-    
-    if q3 == "Select...":
-        return None
-    
-    return tree_service.execute_tree("DPIA Requirement", st.session_state.answers)
 
 # ----------------------------
 # SIDEBAR
@@ -284,6 +215,11 @@ with st.sidebar:
     if st.button("🔄 Reset Session", use_container_width=True):
         reset_session()
     
+    if tree_service.load_errors:
+        with st.expander(f"⚠️ {len(tree_service.load_errors)} tree(s) failed to load"):
+            for message in tree_service.load_errors:
+                st.error(message)
+    
     st.markdown("---")
     
     if Config.ENABLE_HISTORY:
@@ -296,17 +232,71 @@ with st.sidebar:
                     st.write(f"**Decision:** {entry['decision']}")
         else:
             st.caption("No history yet")
+        
+        with st.expander("⬇️ Export History"):
+            export_format = st.selectbox("Format", ["csv", "npz"], key="export_format")
+            export_tree = st.selectbox(
+                "Tree",
+                ["All trees"] + tree_service.get_available_trees(),
+                key="export_tree"
+            )
+            if st.button("Prepare Export", use_container_width=True):
+                filters = {} if export_tree == "All trees" else {"tree_name": export_tree}
+                buffer = io.BytesIO()
+                if export_format == "csv":
+                    text = io.TextIOWrapper(buffer, encoding="utf-8", newline="")
+                    count = history_service.export("csv", filters, text)
+                    text.flush()
+                    text.detach()
+                else:
+                    count = history_service.export("npz", filters, buffer)
+                st.session_state.history_export = (export_format, buffer.getvalue(), count)
+            
+            if st.session_state.get("history_export"):
+                fmt, data, count = st.session_state.history_export
+                st.caption(f"{count} decisions")
+                st.download_button(
+                    f"⬇️ Download {fmt.upper()}",
+                    data,
+                    file_name=f"decision_history.{fmt}",
+                    mime="text/csv" if fmt == "csv" else "application/octet-stream",
+                    use_container_width=True
+                )
     
     if Config.ENABLE_ANALYTICS:
         st.markdown("---")
         st.subheader("📊 Statistics")
         stats = analytics_service.get_statistics()
         if stats:
-            st.metric("Total Decisions", stats.get("total_decisions", 0))
+            recent = analytics_service.get_statistics(granularity="hour")
+            st.metric(
+                "Total Decisions",
+                stats.get("total_decisions", 0),
+                delta=f"{recent['total_decisions']} in last 24h"
+            )
             if stats.get("tree_usage"):
                 st.write("**Tree Usage:**")
                 for tree, count in stats["tree_usage"].items():
                     st.caption(f"{tree}: {count}")
+            sketches = analytics_service.get_sketch_statistics()
+            if sketches.get("trees"):
+                st.metric("Distinct Sessions (est.)", sketches["distinct_sessions"])
+                st.write("**Top Outcomes:**")
+                for tree, summary in sketches["trees"].items():
+                    outcomes = ", ".join(f"{decision} ({count})" for decision, count in summary["top_outcomes"])
+                    st.caption(
+                        f"{tree}: {outcomes} · ~{summary['distinct_answer_sets']} distinct answer sets"
+                    )
+            funnel = analytics_service.get_funnel(st.session_state.current_tree)
+            if funnel and funnel["started"]:
+                with st.expander("🔻 Funnel"):
+                    st.caption(f"Started: {funnel['started']} · Completed: {funnel['completed']}")
+                    for node in funnel["nodes"]:
+                        if node["kind"] == "question" and node["reached"]:
+                            st.caption(
+                                f"{node['label']}: {node['reached']} reached, "
+                                f"{node['dropped']} dropped ({node['drop_rate']:.0%})"
+                            )
 
 # ----------------------------
 # MAIN CONTENT
@@ -316,14 +306,8 @@ st.write(Config.APP_DESCRIPTION)
 
 # Tree selection
 available_trees = ["Select..."] + tree_service.get_available_trees()
-if not available_trees or available_trees == ["Select..."]:
-    # Fallback to hardcoded trees if JSON loading fails
-    available_trees = [
-        "Select...",
-        "Incident Reporting",
-        "Vendor Risk Tiering",
-        "DPIA Requirement"
-    ]
+if available_trees == ["Select..."]:
+    st.warning(f"No decision trees could be loaded from {Config.LOGIC_DIR}.")
 
 tree_choice = st.selectbox(
     "Select a decision guide to run:",
@@ -336,29 +320,24 @@ if st.session_state.current_tree != tree_choice:
     st.session_state.answers = {}
     st.session_state.current_tree = tree_choice
     st.session_state.decision_result = None
+    st.session_state.cursor = None
+    st.session_state.pdf_job_id = None
 
 if tree_choice == "Select...":
     st.info("👆 Please select a decision guide from the dropdown above to begin.")
-    st.markdown("""
-    ### Available Decision Trees:
-    - **Incident Reporting**: Determine vendor incident notification requirements
-    - **Vendor Risk Tiering**: Classify vendor data risk levels
-    - **DPIA Requirement**: Check if a Data Protection Impact Assessment is required
-    """)
+    st.markdown("### Available Decision Trees:")
+    for name in tree_service.get_available_trees():
+        tree = tree_service.get_compiled_tree(name)
+        st.markdown(f"- **{name}**: {tree.description}")
 else:
-    # Progress bar
-    progress = calculate_progress(st.session_state.answers, tree_choice)
-    st.progress(progress / 100, text=f"Progress: {int(progress)}%")
+    # Progress bar, filled in once the questions have updated the cursor
+    progress_slot = st.empty()
     
     # Render questions based on tree
-    decision_result: Optional[DecisionResult] = None
+    decision_result: Optional[DecisionResult] = render_tree(tree_choice)
     
-    if tree_choice == "Incident Reporting":
-        decision_result = render_incident_reporting_tree()
-    elif tree_choice == "Vendor Risk Tiering":
-        decision_result = render_vendor_classification_tree()
-    elif tree_choice == "DPIA Requirement":
-        decision_result = render_dpia_tree()
+    progress = calculate_progress(st.session_state.cursor)
+    progress_slot.progress(progress / 100, text=f"Progress: {int(progress)}%")
     
     # Store result
     if decision_result and decision_result.decision:
@@ -376,7 +355,9 @@ else:
         if Config.ENABLE_ANALYTICS:
             analytics_service.track_decision(
                 tree_choice,
-                decision_result.decision
+                decision_result.decision,
+                session_id=st.session_state.session_id,
+                answers=st.session_state.answers
             )
     
     # Display results
@@ -411,18 +392,17 @@ else:
         with col2:
             if Config.ENABLE_PDF_EXPORT and pdf_service.available:
                 if st.button("📄 Export PDF"):
-                    pdf_path = pdf_service.generate_pdf(
-                        decision_result,
-                        tree_choice
-                    )
-                    if pdf_path:
-                        with open(pdf_path, 'rb') as f:
-                            st.download_button(
-                                "⬇️ Download PDF",
-                                f.read(),
-                                file_name=pdf_path.name,
-                                mime="application/pdf"
-                            )
+                    try:
+                        job = pdf_jobs.submit(st.session_state.session_id, decision_result, tree_choice)
+                        st.session_state.pdf_job_id = job.id
+                    except PDFJobRejected as e:
+                        st.warning(str(e))
+                
+                job = pdf_jobs.get(st.session_state.pdf_job_id) if st.session_state.pdf_job_id else None
+                if job is not None and job.finished:
+                    render_pdf_job(job)
+                elif job is not None:
+                    poll_pdf_job()
         
         with col3:
             st.session_state.show_path = st.checkbox(
@@ -0,0 +1,21 @@
+"""Headless DecisionGuide core.
+
+The decision engine, models and storage services, importable without
+Streamlit for batch jobs, tests and API processes. ``app.py`` is the
+Streamlit layer on top of this package.
+"""
+from models.decision_tree import BatchDecisionResult, DecisionResult, DecisionType
+from services.analytics_service import AnalyticsService
+from services.decision_tree_service import DecisionTreeService
+from services.evaluation_cursor import EvaluationCursor
+from services.history_service import HistoryService
+
+__all__ = [
+    "AnalyticsService",
+    "BatchDecisionResult",
+    "DecisionResult",
+    "DecisionTreeService",
+    "DecisionType",
+    "EvaluationCursor",
+    "HistoryService",
+]
@@ -0,0 +1,409 @@
+"""Offline bulk evaluation of answer records.
+
+Usage:
+    python -m decisionguide.batch answers.csv -o decisions.csv --tree "Vendor Risk Tiering"
+    cat answers.jsonl | python -m decisionguide.batch - --workers 1 > decisions.jsonl
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import chain
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from services.decision_tree_service import DecisionTreeService
+
+# Output columns added to every record
+RESULT_FIELDS = ["decision", "explanation", "path"]
+
+# Separator for path steps in CSV output
+PATH_SEPARATOR = " | "
+
+_worker_service: Optional[DecisionTreeService] = None
+
+
+def _detect_format(path: Optional[str], explicit: Optional[str]) -> str:
+    """Pick ``csv`` or ``jsonl`` from an explicit flag or the file extension."""
+    if explicit:
+        return explicit
+    if path and Path(path).suffix.lower() == ".csv":
+        return "csv"
+    return "jsonl"
+
+
+def chunked(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """
+    Group items into lists of at most ``size`` entries.
+
+    Args:
+        items: Items to group
+        size: Maximum chunk length
+
+    Yields:
+        Lists of items
+    """
+    chunk: List[Any] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+@dataclass(frozen=True)
+class BatchJob:
+    """Settings shared by every chunk of a batch run."""
+    tree_name: Optional[str]
+    input_format: str
+    output_format: str
+    input_fields: Optional[Tuple[str, ...]] = None
+    output_fields: Optional[Tuple[str, ...]] = None
+
+
+def _init_worker() -> None:
+    """Build one service per worker process."""
+    global _worker_service
+    _worker_service = DecisionTreeService()
+
+
+def evaluate_chunk(
+    records: List[Dict[str, Any]],
+    tree_name: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Evaluate a chunk of records.
+
+    Args:
+        records: Answer records; each may carry its own ``tree_name``
+        tree_name: Tree to use for records without ``tree_name``
+
+    Returns:
+        Records with ``decision``, ``explanation`` and ``path`` added
+    """
+    if _worker_service is None:
+        _init_worker()
+
+    results = []
+    for record in records:
+        result = _worker_service.execute_tree(tree_name or record.get("tree_name", ""), record)
+        row = dict(record)
+        row["decision"] = result.decision
+        row["explanation"] = result.explanation
+        row["path"] = result.path
+        results.append(row)
+    return results
+
+
+def _decode(raw: List[Any], job: BatchJob) -> List[Dict[str, Any]]:
+    """Turn raw JSONL lines or CSV rows into answer records."""
+    if job.input_format == "csv":
+        return [dict(zip(job.input_fields, row)) for row in raw]
+    return [json.loads(line) for line in raw]
+
+
+def _encode(rows: List[Dict[str, Any]], job: BatchJob) -> str:
+    """Serialize evaluated records in the output format."""
+    if job.output_format == "jsonl":
+        return "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=job.output_fields, extrasaction="ignore")
+    for row in rows:
+        row["path"] = PATH_SEPARATOR.join(row["path"])
+        writer.writerow(row)
+    return buffer.getvalue()
+
+
+def process_chunk(raw: List[Any], job: BatchJob) -> Tuple[str, int, int, float]:
+    """
+    Decode, evaluate and encode one chunk inside a worker.
+
+    Parsing and serialization happen in the worker so the parent process
+    only moves text between files and the pool.
+
+    Args:
+        raw: JSONL lines or CSV rows
+        job: Batch settings
+
+    Returns:
+        Tuple of (output text, record count, worker pid, seconds spent)
+    """
+    started = time.perf_counter()
+    rows = evaluate_chunk(_decode(raw, job), job.tree_name)
+    return _encode(rows, job), len(rows), os.getpid(), time.perf_counter() - started
+
+
+def run_chunks(
+    chunks: Iterable[List[Any]],
+    job: BatchJob,
+    workers: int = 1,
+    stats: Optional[Dict[int, Dict[str, float]]] = None
+) -> Iterator[str]:
+    """
+    Process raw chunks across a process pool, preserving input order.
+
+    At most two chunks per worker are in flight, so the input is read
+    only as fast as results are consumed.
+
+    Args:
+        chunks: Raw input chunks
+        job: Batch settings
+        workers: Number of worker processes; 1 evaluates in-process
+        stats: Optional dict filled with per-worker chunk, record and time totals
+
+    Yields:
+        Encoded output text per chunk
+    """
+    def collect(outcome: Tuple[str, int, int, float]) -> str:
+        text, count, pid, seconds = outcome
+        if stats is not None:
+            entry = stats.setdefault(pid, {"chunks": 0, "records": 0, "seconds": 0.0})
+            entry["chunks"] += 1
+            entry["records"] += count
+            entry["seconds"] += seconds
+        return text
+
+    if workers <= 1:
+        for chunk in chunks:
+            yield collect(process_chunk(chunk, job))
+        return
+
+    in_flight: Deque[Future] = deque()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        for chunk in chunks:
+            in_flight.append(executor.submit(process_chunk, chunk, job))
+            if len(in_flight) >= workers * 2:
+                yield collect(in_flight.popleft().result())
+        while in_flight:
+            yield collect(in_flight.popleft().result())
+
+
+def _raw_input(handle, fmt: str) -> Tuple[Iterator[Any], Optional[Tuple[str, ...]], Optional[Dict[str, Any]]]:
+    """
+    Open raw input and peek at its field names.
+
+    Returns:
+        Tuple of (raw row iterator, CSV header, first JSONL record)
+    """
+    if fmt == "csv":
+        reader = csv.reader(handle)
+        header = tuple(next(reader, ()))
+        return reader, header, None
+
+    lines = (line for line in handle if line.strip())
+    first = next(lines, None)
+    if first is None:
+        return iter(()), None, None
+    return chain([first], lines), None, json.loads(first)
+
+
+class BoundedWriter:
+    """
+    Background writer fed through a bounded queue of output chunks.
+
+    ``write`` blocks once ``max_pending`` chunks are waiting, so a slow
+    output stalls the pipeline instead of letting results pile up in memory.
+    """
+
+    _CLOSE = object()
+
+    def __init__(self, handle, max_pending: int = 4):
+        """
+        Initialize the writer and start its thread.
+
+        Args:
+            handle: Open text file to write to
+            max_pending: Maximum number of chunks waiting to be written
+        """
+        self._handle = handle
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, max_pending))
+        self._error: Optional[BaseException] = None
+        self.stalled_seconds = 0.0
+        self.max_depth = 0
+        self._thread = threading.Thread(target=self._run, name="batch-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        """Drain the queue until the close marker arrives."""
+        while True:
+            item = self._queue.get()
+            if item is self._CLOSE:
+                return
+            if self._error is None:
+                try:
+                    self._handle.write(item)
+                except Exception as e:
+                    self._error = e
+
+    def write(self, text: str) -> None:
+        """
+        Queue a chunk of output, waiting while the queue is full.
+
+        Args:
+            text: Encoded output chunk
+
+        Raises:
+            Exception: The first error raised by the underlying write
+        """
+        if self._error is not None:
+            raise self._error
+        try:
+            self._queue.put_nowait(text)
+        except queue.Full:
+            started = time.perf_counter()
+            self._queue.put(text)
+            self.stalled_seconds += time.perf_counter() - started
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+
+    def close(self) -> None:
+        """Write everything still queued, flush and stop the thread."""
+        self._queue.put(self._CLOSE)
+        self._thread.join()
+        if self._error is None:
+            self._handle.flush()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self) -> "BoundedWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def stream_jsonl(
+    source,
+    target,
+    tree_name: Optional[str] = None,
+    chunk_size: int = 1000,
+    max_pending: int = 4
+) -> int:
+    """
+    Evaluate a JSONL stream chunk by chunk with bounded memory.
+
+    Each chunk is read, evaluated and handed to the writer before the next
+    one is read, so peak memory depends on ``chunk_size`` and
+    ``max_pending`` rather than on the input size.
+
+    Args:
+        source: Open text file (for example ``sys.stdin``)
+        target: Open text file (for example ``sys.stdout``)
+        tree_name: Tree to use for records without ``tree_name``
+        chunk_size: Records per chunk
+        max_pending: Output chunks allowed to wait for the writer
+
+    Returns:
+        Number of records written
+    """
+    stats: Dict[int, Dict[str, float]] = {}
+    job = BatchJob(tree_name, "jsonl", "jsonl")
+    lines = (line for line in source if line.strip())
+    with BoundedWriter(target, max_pending) as writer:
+        for text in run_chunks(chunked(lines, chunk_size), job, workers=1, stats=stats):
+            writer.write(text)
+    return sum(int(entry["records"]) for entry in stats.values())
+
+
+def _open(path: str, mode: str):
+    """Open a file, treating ``-`` as stdin or stdout."""
+    if path == "-":
+        return nullcontext(sys.stdin if "r" in mode else sys.stdout)
+    return open(path, mode, encoding="utf-8", newline="")
+
+
+def _report(
+    count: int,
+    elapsed: float,
+    stats: Dict[int, Dict[str, float]],
+    writer: Optional[BoundedWriter] = None
+) -> None:
+    """Print throughput, per-worker timing and writer backpressure to stderr."""
+    rate = count / elapsed if elapsed > 0 else 0.0
+    print(f"Evaluated {count} records in {elapsed:.2f}s ({rate:,.0f} records/sec)", file=sys.stderr)
+    if writer is not None:
+        print(
+            f"  writer: {writer.stalled_seconds:.2f}s stalled, max {writer.max_depth} chunks queued",
+            file=sys.stderr
+        )
+    for pid, entry in sorted(stats.items()):
+        print(
+            f"  worker {pid}: {int(entry['chunks'])} chunks, {int(entry['records'])} records, "
+            f"{entry['seconds']:.2f}s busy",
+            file=sys.stderr
+        )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the command-line parser."""
+    parser = argparse.ArgumentParser(
+        prog="python -m decisionguide.batch",
+        description="Evaluate answer records from CSV or JSONL against DecisionGuide trees."
+    )
+    parser.add_argument("input", help="Input CSV or JSONL file, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="Output CSV or JSONL file, or - for stdout")
+    parser.add_argument("--tree", help="Tree name (defaults to each record's tree_name)")
+    parser.add_argument("--input-format", choices=["csv", "jsonl"], help="Override input format")
+    parser.add_argument("--output-format", choices=["csv", "jsonl"], help="Override output format")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Records per worker chunk")
+    parser.add_argument(
+        "--max-pending", type=int, default=4,
+        help="Output chunks allowed to wait for a slow writer before evaluation pauses"
+    )
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Run the batch CLI.
+
+    Args:
+        argv: Command-line arguments (defaults to sys.argv)
+
+    Returns:
+        Process exit code
+    """
+    args = build_parser().parse_args(argv)
+    if args.chunk_size < 1:
+        print("--chunk-size must be at least 1", file=sys.stderr)
+        return 2
+
+    input_format = _detect_format(args.input, args.input_format)
+    output_format = _detect_format(args.output, args.output_format)
+    stats: Dict[int, Dict[str, float]] = {}
+    count = 0
+
+    started = time.perf_counter()
+    with _open(args.input, "r") as source, _open(args.output, "w") as target:
+        raw, header, first = _raw_input(source, input_format)
+        fields = header or tuple(first or ())
+        output_fields = tuple(f for f in fields if f not in RESULT_FIELDS) + tuple(RESULT_FIELDS)
+        job = BatchJob(args.tree, input_format, output_format, header, output_fields)
+
+        with BoundedWriter(target, args.max_pending) as writer:
+            if output_format == "csv":
+                header_line = io.StringIO()
+                csv.writer(header_line).writerow(output_fields)
+                writer.write(header_line.getvalue())
+            for text in run_chunks(chunked(raw, args.chunk_size), job, args.workers, stats):
+                writer.write(text)
+        count = sum(int(entry["records"]) for entry in stats.values())
+
+    _report(count, time.perf_counter() - started, stats, writer)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""Export decision history for spreadsheets and BI tools.
+
+Usage:
+    python -m decisionguide.export -o history.csv --tree "Vendor Risk Tiering" --since 2026-07-01
+    python -m decisionguide.export -o history.npz --decision "RISK TIER: CRITICAL"
+    python -m decisionguide.export --backend sqlite > history.csv
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from services.history_service import HistoryService
+
+
+def _detect_format(path: str, explicit: Optional[str]) -> str:
+    """Pick ``csv`` or ``npz`` from an explicit flag or the file extension."""
+    if explicit:
+        return explicit
+    return "npz" if Path(path).suffix.lower() == ".npz" else "csv"
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the command-line parser."""
+    parser = argparse.ArgumentParser(
+        prog="python -m decisionguide.export",
+        description="Stream DecisionGuide history to CSV or a columnar NumPy .npz bundle."
+    )
+    parser.add_argument("-o", "--output", default="-", help="Output .csv or .npz file, or - for CSV on stdout")
+    parser.add_argument("--format", choices=["csv", "npz"], help="Override output format")
+    parser.add_argument("--backend", choices=["jsonl", "sqlite", "json"], help="History backend to read")
+    parser.add_argument("--tree", help="Only decisions from this tree")
+    parser.add_argument("--decision", help="Only this decision")
+    parser.add_argument("--since", help="Only decisions at or after this ISO date/time")
+    parser.add_argument("--until", help="Only decisions before this ISO date/time")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Run the export CLI.
+
+    Args:
+        argv: Command-line arguments (defaults to sys.argv)
+
+    Returns:
+        Process exit code
+    """
+    args = build_parser().parse_args(argv)
+    fmt = _detect_format(args.output, args.format)
+    if fmt == "npz" and args.output == "-":
+        print("npz exports need an output file (-o history.npz)", file=sys.stderr)
+        return 2
+
+    filters = {
+        "tree_name": args.tree,
+        "decision": args.decision,
+        "start": args.since,
+        "end": args.until
+    }
+    service = HistoryService(backend=args.backend, write_behind=False)
+
+    started = time.perf_counter()
+    target = sys.stdout if args.output == "-" else Path(args.output)
+    count = service.export(fmt, {key: value for key, value in filters.items() if value}, target)
+    elapsed = time.perf_counter() - started
+    print(f"Exported {count} decisions in {elapsed:.2f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
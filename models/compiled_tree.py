@@ -0,0 +1,147 @@
+"""Compiled, integer-indexed representation of a decision tree."""
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, Dict, List, Optional, Tuple
+from models.decision_tree import DecisionResult, DecisionType
+
+
+class NodeKind(IntEnum):
+    """Kinds of nodes in a compiled tree."""
+    QUESTION = 0
+    OUTCOME = 1
+    SCORE = 2
+
+
+class TemplateValues(dict):
+    """Mapping that leaves unknown placeholders untouched when formatting."""
+
+    def __missing__(self, key: str) -> str:
+        return "{" + key + "}"
+
+
+@dataclass(frozen=True)
+class CompiledOutcome:
+    """Terminal outcome of a compiled tree."""
+    id: str
+    decision: str
+    explanation: str
+    decision_type: Optional[DecisionType] = None
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    templated: bool = False
+
+    def render_explanation(self, values: Dict[str, Any]) -> str:
+        """
+        Fill answer placeholders in the explanation.
+
+        Args:
+            values: Mapping of question IDs to option values
+
+        Returns:
+            Explanation text
+        """
+        if not self.templated:
+            return self.explanation
+        return self.explanation.format_map(TemplateValues(values))
+
+
+@dataclass
+class CompiledTree:
+    """
+    Flat node table built once from a JSON tree definition.
+
+    Every per-node list is indexed by node id. Question nodes map an answer
+    to an option index through ``option_index``; ``transitions``, ``scores``
+    and ``values`` are then indexed by that option index.
+
+    ``remaining_depth`` is the number of questions left on the longest path
+    from a node, ``reachable_outcomes`` the outcome nodes below it and
+    ``question_counts`` the distinct questions reachable from it.
+    """
+    name: str
+    title: str
+    description: str
+    start: int
+    node_ids: List[str]
+    kinds: List[NodeKind]
+    labels: List[str]
+    texts: List[str]
+    help_texts: List[Optional[str]]
+    options: List[Tuple[str, ...]]
+    option_index: List[Dict[str, int]]
+    transitions: List[Tuple[int, ...]]
+    scores: List[Tuple[int, ...]]
+    values: List[Tuple[Any, ...]]
+    outcomes: List[Optional[CompiledOutcome]]
+    band_limits: Tuple[float, ...] = ()
+    band_nodes: Tuple[int, ...] = ()
+    templated: bool = False
+    remaining_depth: List[int] = field(default_factory=list)
+    reachable_outcomes: List[Tuple[int, ...]] = field(default_factory=list)
+    question_counts: List[int] = field(default_factory=list)
+
+    @property
+    def scored(self) -> bool:
+        """Whether the tree resolves outcomes through score bands."""
+        return bool(self.band_nodes)
+
+    def question_nodes(self) -> List[int]:
+        """Return the ids of all question nodes in definition order."""
+        return [i for i, kind in enumerate(self.kinds) if kind == NodeKind.QUESTION]
+
+    def node_for(self, node_id: str) -> int:
+        """
+        Look up a node index by its JSON identifier.
+
+        Args:
+            node_id: Question or outcome identifier
+
+        Returns:
+            Node index
+        """
+        return self.node_ids.index(node_id)
+
+    def band_for(self, score: float) -> int:
+        """
+        Resolve a score to its outcome node.
+
+        Args:
+            score: Accumulated score
+
+        Returns:
+            Outcome node index
+        """
+        position = bisect_left(self.band_limits, score)
+        return self.band_nodes[min(position, len(self.band_nodes) - 1)]
+
+    def make_result(
+        self,
+        node: int,
+        path: List[str],
+        score: float = 0,
+        values: Optional[Dict[str, Any]] = None
+    ) -> DecisionResult:
+        """
+        Build the decision result for an outcome node.
+
+        Args:
+            node: Outcome node index
+            path: Formatted path steps leading to the outcome
+            score: Accumulated score (reported for scored trees)
+            values: Option values of the answered questions, for templates
+
+        Returns:
+            DecisionResult object
+        """
+        outcome = self.outcomes[node]
+        metadata = dict(outcome.metadata)
+        if self.scored:
+            metadata["score"] = score
+
+        return DecisionResult(
+            outcome.decision,
+            outcome.render_explanation(values) if values is not None else outcome.explanation,
+            path,
+            outcome.decision_type,
+            metadata
+        )
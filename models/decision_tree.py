@@ -55,3 +55,17 @@ class DecisionNode:
         if self.next_nodes is None:
             self.next_nodes = {}
 
+
+@dataclass
+class BatchDecisionResult:
+    """Columnar result of evaluating a tree over many answer sets."""
+    tree_name: str
+    decisions: Any
+    outcome_ids: Any
+    levels: Any
+    scores: Any
+    complete: Any
+    
+    def __len__(self) -> int:
+        """Return the number of evaluated rows."""
+        return len(self.decisions)
@@ -0,0 +1,14 @@
+"""Decision history data models."""
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+
+@dataclass
+class HistoryPage:
+    """One page of a history query."""
+    entries: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
+
+    def __len__(self) -> int:
+        """Return the number of entries on the page."""
+        return len(self.entries)
@@ -0,0 +1,38 @@
+"""Background PDF rendering job models."""
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+from typing import Optional
+
+
+class JobStatus(str, Enum):
+    """Lifecycle states of a PDF job."""
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+@dataclass
+class PDFJob:
+    """
+    Handle to a PDF render queued by PDFJobQueue.
+
+    Times are ``time.monotonic()`` seconds.
+    """
+    id: str
+    session_id: str
+    tree_name: str
+    submitted_at: float
+    status: JobStatus = JobStatus.QUEUED
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    file_name: Optional[str] = None
+    data: Optional[bytes] = None
+    path: Optional[Path] = None
+    error: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        """Whether the job is done or failed."""
+        return self.status in (JobStatus.DONE, JobStatus.FAILED)
@@ -0,0 +1,272 @@
+"""Per-node traversal and drop-off counters for compiled decision trees."""
+import marshal
+import os
+from array import array
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from models.compiled_tree import CompiledTree, NodeKind
+
+FUNNEL_FORMAT = 1
+
+
+class TreeFunnel:
+    """
+    Traversal counters for one tree, indexed by compiled node id.
+
+    ``reached[node]`` counts how often a cursor arrived at a node and
+    ``branches[offsets[node] + choice]`` how often each option of a question
+    was taken, so recording a step is O(1). A question's drop-off is what
+    reached it minus what was answered there. Counters are signed because a
+    cursor takes its steps back when an earlier answer changes, so each
+    cursor contributes exactly the path it finally stopped on.
+    """
+
+    def __init__(
+        self,
+        node_ids: List[str],
+        kinds: List[int],
+        labels: List[str],
+        options: List[Tuple[str, ...]],
+        start: int
+    ):
+        """
+        Create zeroed counters for a node table.
+
+        Args:
+            node_ids: JSON identifier per node
+            kinds: NodeKind value per node
+            labels: Display label per node
+            options: Option texts per node
+            start: Index of the first question
+        """
+        self.node_ids = node_ids
+        self.kinds = kinds
+        self.labels = labels
+        self.options = options
+        self.start = start
+        self.offsets = array('I')
+        total = 0
+        for node_options in options:
+            self.offsets.append(total)
+            total += len(node_options)
+        self.reached = array('q', [0]) * len(node_ids)
+        self.branches = array('q', [0]) * total
+
+    @classmethod
+    def for_tree(cls, tree: CompiledTree) -> "TreeFunnel":
+        """Create zeroed counters shaped like a compiled tree."""
+        return cls(tree.node_ids, [int(kind) for kind in tree.kinds], tree.labels, tree.options, tree.start)
+
+    def matches(self, tree: CompiledTree) -> bool:
+        """
+        Check whether counters line up with a compiled tree's node ids.
+
+        A reloaded tree with the same layout is adopted, so later checks
+        are an identity comparison.
+        """
+        if self.node_ids is tree.node_ids:
+            return True
+        if self.node_ids != tree.node_ids or self.options != tree.options:
+            return False
+        self.node_ids, self.options = tree.node_ids, tree.options
+        return True
+
+    def same_layout(self, other: "TreeFunnel") -> bool:
+        """Check whether another funnel counts the same nodes and options."""
+        return self.node_ids == other.node_ids and self.options == other.options
+
+    def merge(self, other: "TreeFunnel") -> None:
+        """
+        Add another funnel's counters.
+
+        Counters of a funnel built from a different version of the tree
+        are matched by node id and option text; nodes that no longer exist
+        are dropped.
+
+        Args:
+            other: Funnel to fold into this one
+        """
+        if self.same_layout(other):
+            self.reached = array('q', map(int.__add__, self.reached, other.reached))
+            self.branches = array('q', map(int.__add__, self.branches, other.branches))
+            return
+
+        index = {node_id: node for node, node_id in enumerate(self.node_ids)}
+        for other_node, node_id in enumerate(other.node_ids):
+            node = index.get(node_id)
+            if node is None:
+                continue
+            self.reached[node] += other.reached[other_node]
+            choices = {option: choice for choice, option in enumerate(self.options[node])}
+            for other_choice, option in enumerate(other.options[other_node]):
+                choice = choices.get(option)
+                if choice is not None:
+                    self.branches[self.offsets[node] + choice] += other.branches[other.offsets[other_node] + other_choice]
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Build the funnel in one pass over the node table.
+
+        Returns:
+            ``started`` and ``completed`` counts and a ``nodes`` list with,
+            per question, how often it was reached, answered and abandoned
+            and the count per option; outcomes report how often they were
+            reached
+        """
+        nodes = []
+        completed = 0
+        for node, kind in enumerate(self.kinds):
+            reached = self.reached[node]
+            if kind == NodeKind.OUTCOME:
+                completed += reached
+                nodes.append({"id": self.node_ids[node], "label": self.labels[node], "kind": "outcome", "reached": reached})
+            elif kind == NodeKind.QUESTION:
+                offset = self.offsets[node]
+                counts = self.branches[offset:offset + len(self.options[node])]
+                answered = sum(counts)
+                nodes.append({
+                    "id": self.node_ids[node],
+                    "label": self.labels[node],
+                    "kind": "question",
+                    "reached": reached,
+                    "answered": answered,
+                    "dropped": reached - answered,
+                    "drop_rate": (reached - answered) / reached if reached > 0 else 0.0,
+                    "branches": dict(zip(self.options[node], counts))
+                })
+        return {"started": self.reached[self.start], "completed": completed, "nodes": nodes}
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize to marshal-friendly values."""
+        return {
+            "node_ids": list(self.node_ids),
+            "kinds": list(self.kinds),
+            "labels": list(self.labels),
+            "options": [list(node_options) for node_options in self.options],
+            "start": self.start,
+            "reached": self.reached.tobytes(),
+            "branches": self.branches.tobytes()
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TreeFunnel":
+        """Deserialize from ``to_dict`` output."""
+        funnel = cls(
+            data["node_ids"],
+            data["kinds"],
+            data["labels"],
+            [tuple(node_options) for node_options in data["options"]],
+            data["start"]
+        )
+        funnel.reached = array('q', data["reached"])
+        funnel.branches = array('q', data["branches"])
+        if len(funnel.reached) != len(funnel.node_ids) or len(funnel.branches) != sum(map(len, funnel.options)):
+            raise ValueError("Funnel counters do not match the node table")
+        return funnel
+
+
+class FunnelSet:
+    """Funnels for every tree that can be merged and saved as one file."""
+
+    def __init__(self):
+        """Create an empty set."""
+        self.trees: Dict[str, TreeFunnel] = {}
+
+    def step(self, tree: CompiledTree, node: int, choice: Optional[int] = None, count: int = 1) -> None:
+        """
+        Count a cursor step.
+
+        Args:
+            tree: Compiled tree the cursor walks
+            node: Node the cursor reached, or the question it answered
+            choice: Option index taken at ``node``, or None for reaching it
+            count: 1 for a step, -1 for a step taken back
+        """
+        funnel = self.trees.get(tree.name)
+        if funnel is None or not funnel.matches(tree):
+            # First use, or the tree was edited and reloaded
+            fresh = TreeFunnel.for_tree(tree)
+            if funnel is not None:
+                fresh.merge(funnel)
+            funnel = self.trees[tree.name] = fresh
+        if choice is None:
+            funnel.reached[node] += count
+        else:
+            funnel.branches[funnel.offsets[node] + choice] += count
+
+    def merge(self, other: "FunnelSet") -> None:
+        """
+        Fold in another set, e.g. from another worker process.
+
+        When a tree's layouts differ, the other set's is kept: callers pass
+        the newer counts, which were recorded against the tree as currently
+        loaded, so nodes added by an edit survive the merge.
+
+        Args:
+            other: Set to fold into this one
+        """
+        for tree_name, funnel in other.trees.items():
+            mine = self.trees.get(tree_name)
+            if mine is None or not mine.same_layout(funnel):
+                fresh = TreeFunnel(funnel.node_ids, funnel.kinds, funnel.labels, funnel.options, funnel.start)
+                if mine is not None:
+                    fresh.merge(mine)
+                mine = self.trees[tree_name] = fresh
+            mine.merge(funnel)
+
+    def report(self, tree_name: str) -> Optional[Dict[str, Any]]:
+        """Build one tree's funnel, or None if no steps were counted for it."""
+        funnel = self.trees.get(tree_name)
+        return funnel.report() if funnel is not None else None
+
+    def to_bytes(self) -> bytes:
+        """Serialize the set."""
+        return marshal.dumps({
+            "format": FUNNEL_FORMAT,
+            "trees": {name: funnel.to_dict() for name, funnel in self.trees.items()}
+        })
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "FunnelSet":
+        """
+        Deserialize a set written by ``to_bytes``.
+
+        Raises:
+            ValueError: If the data is corrupt or in another format
+        """
+        try:
+            payload = marshal.loads(data)
+        except (EOFError, TypeError) as e:
+            raise ValueError(f"Corrupt funnel data: {e}") from e
+        if payload.get("format") != FUNNEL_FORMAT:
+            raise ValueError("Funnel data has a different format")
+        funnel_set = cls()
+        funnel_set.trees = {name: TreeFunnel.from_dict(data) for name, data in payload["trees"].items()}
+        return funnel_set
+
+    @classmethod
+    def load(cls, path: Path) -> "FunnelSet":
+        """Load a set from disk, starting empty if it is missing or unreadable."""
+        try:
+            return cls.from_bytes(path.read_bytes())
+        except FileNotFoundError:
+            return cls()
+        except (IOError, ValueError) as e:
+            print(f"Error loading analytics funnels: {e}")
+            return cls()
+
+    def save(self, path: Path) -> bool:
+        """
+        Write the set atomically.
+
+        Returns:
+            False if the file could not be written
+        """
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            tmp_path.write_bytes(self.to_bytes())
+            os.replace(tmp_path, path)
+            return True
+        except IOError as e:
+            print(f"Error saving analytics funnels: {e}")
+            return False
@@ -0,0 +1,264 @@
+"""Time-bucketed decision counts kept in fixed-size ring arrays."""
+import marshal
+import os
+from array import array
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# Bucket width in seconds and number of buckets kept, per granularity
+GRANULARITIES: Dict[str, Tuple[int, int]] = {
+    "minute": (60, 24 * 60),      # one day of minutes
+    "hour": (3600, 90 * 24),      # ninety days of hours
+    "day": (86400, 5 * 366)       # five years of days
+}
+
+ROLLUP_FORMAT = 1
+
+_EPOCH = datetime(1970, 1, 1)
+
+Series = Tuple[str, str]
+
+
+def _seconds(moment: datetime) -> float:
+    """Seconds since 1970 for a naive local timestamp, without timezone conversion."""
+    return (moment.replace(tzinfo=None) - _EPOCH).total_seconds()
+
+
+class RollupTable:
+    """
+    Decision counts per (tree, decision) in minute, hour and day buckets.
+
+    Each granularity is a ring of ``slots`` buckets. Every series owns one
+    array of counts per granularity, and a shared array of bucket numbers
+    records which bucket each slot currently holds, so memory is fixed per
+    series. A decision increments its minute, hour and day bucket at once,
+    so the coarser levels already hold the downsampled counts when old
+    minute buckets are recycled. Queries cost one step per bucket and
+    series in the range, however many decisions were tracked.
+    """
+
+    def __init__(self):
+        """Create an empty table."""
+        self.keys: List[Series] = []
+        self._series: Dict[Series, int] = {}
+        self._buckets: Dict[str, array] = {
+            name: array('q', [-1]) * slots for name, (_, slots) in GRANULARITIES.items()
+        }
+        self._counts: Dict[str, List[array]] = {name: [] for name in GRANULARITIES}
+
+    def _series_index(self, key: Series) -> int:
+        """Get the index of a series, allocating its arrays on first use."""
+        index = self._series.get(key)
+        if index is None:
+            index = self._series[key] = len(self.keys)
+            self.keys.append(key)
+            for name, (_, slots) in GRANULARITIES.items():
+                self._counts[name].append(array('I', [0]) * slots)
+        return index
+
+    def add(self, tree_name: str, decision: str, moment: datetime, count: int = 1) -> None:
+        """
+        Count decisions at a point in time.
+
+        Args:
+            tree_name: Name of the decision tree
+            decision: Decision outcome
+            moment: Naive local time of the decision
+            count: Number of decisions to add
+        """
+        index = self._series_index((tree_name, decision))
+        seconds = _seconds(moment)
+        for name, (width, slots) in GRANULARITIES.items():
+            bucket = int(seconds // width)
+            slot = bucket % slots
+            held = self._buckets[name][slot]
+            if held != bucket:
+                if held > bucket:
+                    # Older than this level keeps
+                    continue
+                for counts in self._counts[name]:
+                    counts[slot] = 0
+                self._buckets[name][slot] = bucket
+            self._counts[name][index][slot] += count
+
+    def merge(self, other: "RollupTable") -> None:
+        """
+        Add another table's counts, e.g. from another process.
+
+        Args:
+            other: Table to fold into this one
+        """
+        for name, (width, slots) in GRANULARITIES.items():
+            for slot, bucket in enumerate(other._buckets[name]):
+                if bucket < 0:
+                    continue
+                held = self._buckets[name][slot]
+                if held > bucket:
+                    continue
+                if held != bucket:
+                    for counts in self._counts[name]:
+                        counts[slot] = 0
+                    self._buckets[name][slot] = bucket
+                for key, counts in zip(other.keys, other._counts[name]):
+                    if counts[slot]:
+                        self._counts[name][self._series_index(key)][slot] += counts[slot]
+
+    def coverage(self, granularity: str) -> Optional[datetime]:
+        """
+        Get the oldest moment a granularity can still answer for.
+
+        Args:
+            granularity: "minute", "hour" or "day"
+
+        Returns:
+            Start of the oldest retained bucket, or None if nothing was counted
+        """
+        width, slots = GRANULARITIES[granularity]
+        newest = max(self._buckets[granularity])
+        if newest < 0:
+            return None
+        return _EPOCH + timedelta(seconds=(newest - slots + 1) * width)
+
+    def pick_granularity(self, start: datetime, end: datetime) -> str:
+        """
+        Choose the finest granularity that still covers ``start``.
+
+        Args:
+            start: Start of the range
+            end: End of the range
+
+        Returns:
+            Granularity name
+        """
+        for name in GRANULARITIES:
+            oldest = self.coverage(name)
+            width, slots = GRANULARITIES[name]
+            if (oldest is None or oldest <= start) and (end - start).total_seconds() / width <= slots:
+                return name
+        return "day"
+
+    def query(
+        self,
+        start: datetime,
+        end: datetime,
+        granularity: str,
+        tree_name: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Read per-bucket counts for a time range.
+
+        Args:
+            start: Start of the range (inclusive)
+            end: End of the range (exclusive)
+            granularity: "minute", "hour" or "day"
+            tree_name: Only count decisions from this tree
+
+        Returns:
+            One dict per bucket with its start, total, tree usage and
+            decision counts, limited to the buckets this level retains
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown granularity: {granularity}")
+        width, slots = GRANULARITIES[granularity]
+        held = self._buckets[granularity]
+        series = [
+            (key, counts) for key, counts in zip(self.keys, self._counts[granularity])
+            if tree_name is None or key[0] == tree_name
+        ]
+
+        rows = []
+        newest = max(held)
+        if newest < 0:
+            return rows
+        first = max(int(_seconds(start) // width), newest - slots + 1)
+        last = min(int((_seconds(end) - 1) // width), newest)
+        for bucket in range(first, last + 1):
+            slot = bucket % slots
+            tree_usage: Dict[str, int] = {}
+            decision_counts: Dict[str, int] = {}
+            total = 0
+            if held[slot] == bucket:
+                for (tree, decision), counts in series:
+                    count = counts[slot]
+                    if count:
+                        total += count
+                        tree_usage[tree] = tree_usage.get(tree, 0) + count
+                        decision_counts[decision] = decision_counts.get(decision, 0) + count
+            rows.append({
+                "start": (_EPOCH + timedelta(seconds=bucket * width)).isoformat(),
+                "total_decisions": total,
+                "tree_usage": tree_usage,
+                "decision_counts": decision_counts
+            })
+        return rows
+
+    def to_bytes(self) -> bytes:
+        """Serialize the table."""
+        return marshal.dumps({
+            "format": ROLLUP_FORMAT,
+            "slots": {name: slots for name, (_, slots) in GRANULARITIES.items()},
+            "keys": self.keys,
+            "buckets": {name: buckets.tobytes() for name, buckets in self._buckets.items()},
+            "counts": {name: [counts.tobytes() for counts in series] for name, series in self._counts.items()}
+        })
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "RollupTable":
+        """
+        Deserialize a table written by ``to_bytes``.
+
+        Raises:
+            ValueError: If the data was written with a different layout
+        """
+        try:
+            payload = marshal.loads(data)
+        except (EOFError, TypeError) as e:
+            raise ValueError(f"Corrupt rollup data: {e}") from e
+        expected = {name: slots for name, (_, slots) in GRANULARITIES.items()}
+        if payload.get("format") != ROLLUP_FORMAT or payload.get("slots") != expected:
+            raise ValueError("Rollup data has a different layout")
+
+        table = cls()
+        table.keys = [tuple(key) for key in payload["keys"]]
+        table._series = {key: index for index, key in enumerate(table.keys)}
+        for name in GRANULARITIES:
+            table._buckets[name] = array('q', payload["buckets"][name])
+            table._counts[name] = [array('I', counts) for counts in payload["counts"][name]]
+        return table
+
+    @classmethod
+    def load(cls, path: Path) -> "RollupTable":
+        """
+        Load a table from disk, starting empty if it is missing or unreadable.
+
+        Args:
+            path: Rollup file
+        """
+        try:
+            return cls.from_bytes(path.read_bytes())
+        except FileNotFoundError:
+            return cls()
+        except (IOError, ValueError) as e:
+            print(f"Error loading analytics rollups: {e}")
+            return cls()
+
+    def save(self, path: Path) -> bool:
+        """
+        Write the table atomically.
+
+        Args:
+            path: Rollup file
+
+        Returns:
+            False if the file could not be written
+        """
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            tmp_path.write_bytes(self.to_bytes())
+            os.replace(tmp_path, path)
+            return True
+        except IOError as e:
+            print(f"Error saving analytics rollups: {e}")
+            return False
+
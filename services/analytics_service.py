@@ -1,23 +1,101 @@
 """Analytics service for tracking usage statistics."""
+import itertools
 import json
-from datetime import datetime
+import os
+import threading
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Sequence, Union
 from collections import defaultdict
+from models.compiled_tree import CompiledTree
+from services.analytics_funnels import FunnelSet
+from services.analytics_rollups import GRANULARITIES, RollupTable
+from services.analytics_shards import AnalyticsShard, ShardDirectory, compact_shards, shard_name
+from services.analytics_sketches import SketchSet
+from services.write_behind import PeriodicFlusher
 from utils.config import Config
+from utils.file_lock import file_lock
+from utils.metrics import timed
 
 
 class AnalyticsService:
-    """Service for tracking and analyzing usage statistics."""
+    """
+    Service for tracking and analyzing usage statistics.
     
-    def __init__(self):
-        """Initialize analytics service."""
+    Counters live in memory behind a lock, so tracking a decision and
+    reading statistics never touch disk. Counts added since the last flush
+    are merged into the analytics file under an advisory file lock every
+    ``flush_interval`` seconds and at shutdown; the merge also picks up
+    counts flushed by other processes.
+    
+    Alongside the lifetime totals, a RollupTable keeps per-minute, hour and
+    day counts for each tree and decision, so statistics for a time range
+    are answered from buckets instead of individual events, and a SketchSet
+    estimates distinct sessions, distinct answer sets and the top outcomes
+    per tree in fixed memory. A FunnelSet counts how often each node was
+    reached and each option taken, as evaluation cursors advance.
+    
+    In sharded mode each process writes only its own shard file, named by
+    hostname and pid, without any file locking. Reads merge the other
+    shards into the in-memory view, re-reading them only when their mtimes
+    change. At startup the shards of exited processes on the same host are
+    folded into one compacted shard, so the number of files stays bounded.
+    """
+    
+    # Numbers service instances within a process, for their shard names
+    _instances = itertools.count()
+    
+    def __init__(self, flush_interval: Optional[float] = None, sharded: Optional[bool] = None):
+        """
+        Initialize analytics service.
+        
+        Args:
+            flush_interval: Seconds between snapshot flushes; defaults to
+                Config.ANALYTICS_FLUSH_INTERVAL, 0 flushes on every decision
+            sharded: Write a per-process shard instead of the shared files;
+                defaults to Config.ANALYTICS_SHARDED
+        """
         self.analytics_file = Config.DATA_DIR / "analytics.json"
-        self._ensure_analytics_file()
+        self.rollups_file = Config.DATA_DIR / "analytics_rollups.bin"
+        self.sketches_file = Config.DATA_DIR / "analytics_sketches.bin"
+        self.funnels_file = Config.DATA_DIR / "analytics_funnels.bin"
+        if flush_interval is None:
+            flush_interval = Config.ANALYTICS_FLUSH_INTERVAL
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._inflight = self._empty_delta()
+        self._delta = self._empty_delta()
+        self.sharded = Config.ANALYTICS_SHARDED if sharded is None else sharded
+        if self.sharded:
+            self.shard_file = Config.DATA_DIR / "analytics_shards" / f"{shard_name(next(self._instances))}.bin"
+            self.shard_file.parent.mkdir(parents=True, exist_ok=True)
+            compact_shards(self.shard_file.parent, self.shard_file)
+            self._shards = ShardDirectory(self.shard_file.parent, exclude=self.shard_file)
+            self._own = AnalyticsShard.load(self.shard_file)
+            # Counts from before sharding was enabled are read, never written
+            self._legacy = AnalyticsShard(
+                self._load_analytics() if self.analytics_file.exists() else None,
+                RollupTable.load(self.rollups_file),
+                SketchSet.load(self.sketches_file),
+                FunnelSet.load(self.funnels_file)
+            )
+            self._shard_dirty = False
+            self._refresh_shards()
+        else:
+            self._ensure_analytics_file()
+            self._base = self._load_analytics()
+            self._rollups = RollupTable.load(self.rollups_file)
+            self._sketches = SketchSet.load(self.sketches_file)
+            self._funnels = FunnelSet.load(self.funnels_file)
+        self._flusher: Optional[PeriodicFlusher] = None
+        if flush_interval > 0:
+            self._flusher = PeriodicFlusher(self.flush, flush_interval, name="analytics-flusher")
     
     def _ensure_analytics_file(self) -> None:
         """Ensure analytics file exists."""
-        if not self.analytics_file.exists():
+        with file_lock(self.analytics_file):
+            if self.analytics_file.exists():
+                return
             self._save_analytics({
                 "total_decisions": 0,
                 "tree_usage": {},
@@ -46,23 +124,72 @@ class AnalyticsService:
             "last_use": datetime.now().isoformat()
         }
     
-    def _save_analytics(self, analytics: Dict[str, Any]) -> None:
-        """Save analytics to file."""
+    def _save_analytics(self, analytics: Dict[str, Any]) -> bool:
+        """Save analytics to file; return False if it could not be written."""
         try:
             # Convert defaultdict to regular dict for JSON serialization
             data = dict(analytics)
             if "decision_counts" in data and isinstance(data["decision_counts"], defaultdict):
                 data["decision_counts"] = dict(data["decision_counts"])
             
-            with open(self.analytics_file, 'w', encoding='utf-8') as f:
+            # Replace atomically so unlocked readers never see a partial file
+            tmp_file = self.analytics_file.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_file, 'w', encoding='utf-8') as f:
                 json.dump(data, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_file, self.analytics_file)
+            return True
         except IOError as e:
             print(f"Error saving analytics: {e}")
+            return False
+    
+    @staticmethod
+    def _empty_delta() -> Dict[str, Any]:
+        """Create an empty set of counter increments."""
+        return {
+            "total_decisions": 0,
+            "tree_usage": defaultdict(int),
+            "decision_counts": defaultdict(int),
+            "first_use": None,
+            "last_use": None,
+            # (tree, decision, minute) -> count, applied to the rollups on flush
+            "rollups": defaultdict(int),
+            "sketches": SketchSet(),
+            # Cursor steps counted in "funnels"
+            "steps": 0,
+            "funnels": FunnelSet(),
+            # Set when a part failed to save and is carried into the next flush
+            "retry": False
+        }
+    
+    @staticmethod
+    def _merge(analytics: Dict[str, Any], delta: Dict[str, Any]) -> None:
+        """
+        Add counter increments to an analytics snapshot in place.
+        
+        Args:
+            analytics: Snapshot as loaded from the analytics file
+            delta: Increments created by ``_empty_delta``
+        """
+        if not delta["total_decisions"]:
+            return
+        analytics["total_decisions"] = analytics.get("total_decisions", 0) + delta["total_decisions"]
+        tree_usage = analytics.setdefault("tree_usage", {})
+        for tree_name, count in delta["tree_usage"].items():
+            tree_usage[tree_name] = tree_usage.get(tree_name, 0) + count
+        decision_counts = analytics.setdefault("decision_counts", defaultdict(int))
+        for decision, count in delta["decision_counts"].items():
+            decision_counts[decision] = decision_counts.get(decision, 0) + count
+        if not analytics.get("first_use"):
+            analytics["first_use"] = delta["first_use"]
+        analytics["last_use"] = max(analytics.get("last_use") or "", delta["last_use"])
     
+    @timed("track_decision")
     def track_decision(
         self,
         tree_name: str,
-        decision: str
+        decision: str,
+        session_id: Optional[str] = None,
+        answers: Optional[Dict[str, Any]] = None
     ) -> None:
         """
         Track a decision for analytics.
@@ -70,47 +197,312 @@ class AnalyticsService:
         Args:
             tree_name: Name of the decision tree used
             decision: Decision outcome
+            session_id: ID of the user session, for distinct session counts
+            answers: Answers given, for distinct answer set counts
         """
         if not Config.ENABLE_ANALYTICS:
             return
         
-        analytics = self._load_analytics()
+        now = datetime.now()
+        timestamp = now.isoformat()
+        with self._lock:
+            self._rollups.add(tree_name, decision, now)
+            self._sketches.add(tree_name, decision, session_id, answers)
+            delta = self._delta
+            delta["sketches"].add(tree_name, decision, session_id, answers)
+            delta["rollups"][(tree_name, decision, now.replace(second=0, microsecond=0))] += 1
+            delta["total_decisions"] += 1
+            delta["tree_usage"][tree_name] += 1
+            delta["decision_counts"][decision] += 1
+            if delta["first_use"] is None:
+                delta["first_use"] = timestamp
+            delta["last_use"] = timestamp
         
-        analytics["total_decisions"] += 1
-        analytics["last_use"] = datetime.now().isoformat()
+        self._schedule_flush()
+    
+    def track_step(
+        self,
+        tree: CompiledTree,
+        node: int,
+        choice: Optional[int] = None,
+        count: int = 1
+    ) -> None:
+        """
+        Track an evaluation cursor step for funnel analytics.
+        
+        Matches the EvaluationCursor ``on_step`` observer signature.
+        
+        Args:
+            tree: Compiled tree the cursor walks
+            node: Node the cursor reached, or the question it answered
+            choice: Option index taken at ``node``, or None for reaching it
+            count: 1 for a step, -1 for a step taken back
+        """
+        if not Config.ENABLE_ANALYTICS:
+            return
         
-        # Track tree usage
-        if tree_name not in analytics["tree_usage"]:
-            analytics["tree_usage"][tree_name] = 0
-        analytics["tree_usage"][tree_name] += 1
+        with self._lock:
+            self._funnels.step(tree, node, choice, count)
+            self._delta["funnels"].step(tree, node, choice, count)
+            self._delta["steps"] += 1
         
-        # Track decision outcomes
-        analytics["decision_counts"][decision] += 1
+        self._schedule_flush()
+    
+    def _schedule_flush(self) -> None:
+        """Flush now when there is no flusher, otherwise make sure it runs."""
+        if self._flusher is None:
+            self.flush()
+        else:
+            self._flusher.start()
+    
+    def flush(self) -> None:
+        """Merge counts tracked since the last flush into the analytics file or shard."""
+        with self._flush_lock:
+            with self._lock:
+                pending = self._delta["total_decisions"] or self._delta["steps"] or self._delta["retry"]
+                if not pending and not (self.sharded and self._shard_dirty):
+                    return
+                # Keep the increments visible to readers while they are written
+                self._inflight, self._delta = self._delta, self._empty_delta()
+            
+            if self.sharded:
+                self._flush_shard()
+                return
+            
+            with file_lock(self.analytics_file):
+                analytics = self._load_analytics()
+                self._merge(analytics, self._inflight)
+                rollups = RollupTable.load(self.rollups_file)
+                for (tree_name, decision, minute), count in self._inflight["rollups"].items():
+                    rollups.add(tree_name, decision, minute, count)
+                sketches = SketchSet.load(self.sketches_file)
+                sketches.merge(self._inflight["sketches"])
+                funnels = FunnelSet.load(self.funnels_file)
+                funnels.merge(self._inflight["funnels"])
+                # Each file is saved on its own, so a part that was written
+                # must not be retried or its increments would count twice
+                saved = {
+                    "analytics": self._save_analytics(analytics),
+                    "rollups": rollups.save(self.rollups_file),
+                    "sketches": sketches.save(self.sketches_file),
+                    "funnels": funnels.save(self.funnels_file)
+                }
+            
+            with self._lock:
+                # Adopt the merged parts, replaying what was tracked meanwhile
+                if saved["analytics"]:
+                    self._base = analytics
+                if saved["rollups"]:
+                    for (tree_name, decision, minute), count in self._delta["rollups"].items():
+                        rollups.add(tree_name, decision, minute, count)
+                    self._rollups = rollups
+                if saved["sketches"]:
+                    sketches.merge(self._delta["sketches"])
+                    self._sketches = sketches
+                if saved["funnels"]:
+                    funnels.merge(self._delta["funnels"])
+                    self._funnels = funnels
+                
+                failed = [part for part, ok in saved.items() if not ok]
+                if failed:
+                    # Retry only the unsaved parts with the next flush; the newer
+                    # delta is merged last so its funnel layout is kept
+                    retry = self._empty_delta()
+                    self._merge_delta(retry, self._inflight, failed)
+                    self._merge_delta(retry, self._delta)
+                    retry["retry"] = True
+                    self._delta = retry
+                self._inflight = self._empty_delta()
+    
+    def _flush_shard(self) -> None:
+        """Add the in-flight increments to this process's shard and write it."""
+        own, inflight = self._own, self._inflight
+        self._merge(own.analytics, inflight)
+        for (tree_name, decision, minute), count in inflight["rollups"].items():
+            own.rollups.add(tree_name, decision, minute, count)
+        own.sketches.merge(inflight["sketches"])
+        own.funnels.merge(inflight["funnels"])
+        # The shard already holds the increments; a failed write is retried as a whole
+        self._shard_dirty = not own.save(self.shard_file)
         
-        self._save_analytics(analytics)
+        with self._lock:
+            self._merge(self._base, inflight)
+            self._inflight = self._empty_delta()
+    
+    def _refresh_shards(self) -> None:
+        """Rebuild the in-memory view if another process's shard changed."""
+        if not self.sharded:
+            return
+        
+        with self._flush_lock:
+            view = self._shards.refresh()
+            if view is None:
+                return
+            view.merge(self._legacy)
+            view.merge(self._own)
+            
+            # Nothing is in flight outside a flush, so only the delta is replayed
+            with self._lock:
+                self._base = view.analytics
+                for (tree_name, decision, minute), count in self._delta["rollups"].items():
+                    view.rollups.add(tree_name, decision, minute, count)
+                view.sketches.merge(self._delta["sketches"])
+                view.funnels.merge(self._delta["funnels"])
+                self._rollups, self._sketches, self._funnels = view.rollups, view.sketches, view.funnels
     
-    def get_statistics(self) -> Dict[str, Any]:
+    @staticmethod
+    def _merge_delta(
+        target: Dict[str, Any],
+        delta: Dict[str, Any],
+        parts: Sequence[str] = ("analytics", "rollups", "sketches", "funnels")
+    ) -> None:
+        """
+        Fold one set of increments into another.
+        
+        Args:
+            target: Increments to add to
+            delta: Increments to add
+            parts: Parts to fold: "analytics" for the lifetime totals,
+                "rollups", "sketches" and "funnels"
+        """
+        target["retry"] = target["retry"] or delta["retry"]
+        if "funnels" in parts:
+            target["steps"] += delta["steps"]
+            target["funnels"].merge(delta["funnels"])
+        if "rollups" in parts:
+            for key, count in delta["rollups"].items():
+                target["rollups"][key] += count
+        if "sketches" in parts:
+            target["sketches"].merge(delta["sketches"])
+        if "analytics" not in parts or not delta["total_decisions"]:
+            return
+        target["total_decisions"] += delta["total_decisions"]
+        for tree_name, count in delta["tree_usage"].items():
+            target["tree_usage"][tree_name] += count
+        for decision, count in delta["decision_counts"].items():
+            target["decision_counts"][decision] += count
+        target["first_use"] = min(filter(None, [target["first_use"], delta["first_use"]]))
+        target["last_use"] = max(filter(None, [target["last_use"], delta["last_use"]]))
+    
+    def close(self) -> None:
+        """Stop the periodic flusher and write a final snapshot."""
+        if self._flusher is not None:
+            self._flusher.stop()
+        else:
+            self.flush()
+    
+    def get_write_stats(self) -> Dict[str, Any]:
+        """
+        Get snapshot flush counters.
+        
+        Returns:
+            Flush count and latency counters, plus the number of decisions
+            not yet written
+        """
+        stats = self._flusher.stats() if self._flusher is not None else {}
+        with self._lock:
+            stats["pending"] = self._delta["total_decisions"] + self._inflight["total_decisions"]
+        return stats
+    
+    def get_sketch_statistics(self, top: int = 3) -> Dict[str, Any]:
         """
-        Get usage statistics.
+        Get approximate high-cardinality statistics from memory.
         
+        Args:
+            top: Number of top outcomes to list per tree
+            
         Returns:
-            Dictionary of statistics
+            Estimated ``distinct_sessions`` across all trees and, per tree,
+            distinct sessions, distinct answer sets and top outcomes
         """
         if not Config.ENABLE_ANALYTICS:
             return {}
         
-        analytics = self._load_analytics()
+        self._refresh_shards()
+        with self._lock:
+            return self._sketches.summary(top)
+    
+    def get_funnel(self, tree_name: str) -> Optional[Dict[str, Any]]:
+        """
+        Get per-node traversal and drop-off counts for a tree from memory.
         
-        # Convert defaultdict to dict for display
-        decision_counts = dict(analytics["decision_counts"]) if isinstance(
-            analytics["decision_counts"], defaultdict
-        ) else analytics["decision_counts"]
+        Args:
+            tree_name: Name of the decision tree
+            
+        Returns:
+            Funnel report with ``started``, ``completed`` and per-node
+            counts in node table order, or None if nothing was tracked
+        """
+        if not Config.ENABLE_ANALYTICS:
+            return None
+        
+        self._refresh_shards()
+        with self._lock:
+            return self._funnels.report(tree_name)
+    
+    def get_statistics(
+        self,
+        start: Optional[Union[datetime, str]] = None,
+        end: Optional[Union[datetime, str]] = None,
+        granularity: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Get usage statistics from memory.
+        
+        Without arguments, returns lifetime totals. With a range or
+        granularity, answers from the time-bucketed rollups in time
+        proportional to the number of buckets.
+        
+        Args:
+            start: Start of the range (defaults to one day before ``end``)
+            end: End of the range, exclusive (defaults to now)
+            granularity: "minute", "hour" or "day"; defaults to the finest
+                one that still covers ``start``
+            
+        Returns:
+            Dictionary of statistics; ranged queries add the range, the
+            granularity and a ``buckets`` list with per-bucket counts
+        """
+        if not Config.ENABLE_ANALYTICS:
+            return {}
+        
+        self._refresh_shards()
+        if start is None and end is None and granularity is None:
+            with self._lock:
+                analytics = {
+                    "total_decisions": self._base.get("total_decisions", 0),
+                    "tree_usage": dict(self._base.get("tree_usage", {})),
+                    "decision_counts": dict(self._base.get("decision_counts", {})),
+                    "first_use": self._base.get("first_use"),
+                    "last_use": self._base.get("last_use")
+                }
+                self._merge(analytics, self._inflight)
+                self._merge(analytics, self._delta)
+            return analytics
+        
+        if granularity is not None and granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown granularity: {granularity}")
+        end = datetime.fromisoformat(end) if isinstance(end, str) else end or datetime.now()
+        start = datetime.fromisoformat(start) if isinstance(start, str) else start or end - timedelta(days=1)
+        
+        with self._lock:
+            granularity = granularity or self._rollups.pick_granularity(start, end)
+            buckets = self._rollups.query(start, end, granularity)
+        
+        tree_usage: Dict[str, int] = defaultdict(int)
+        decision_counts: Dict[str, int] = defaultdict(int)
+        for bucket in buckets:
+            for tree_name, count in bucket["tree_usage"].items():
+                tree_usage[tree_name] += count
+            for decision, count in bucket["decision_counts"].items():
+                decision_counts[decision] += count
         
         return {
-            "total_decisions": analytics.get("total_decisions", 0),
-            "tree_usage": analytics.get("tree_usage", {}),
-            "decision_counts": decision_counts,
-            "first_use": analytics.get("first_use"),
-            "last_use": analytics.get("last_use")
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "granularity": granularity,
+            "total_decisions": sum(bucket["total_decisions"] for bucket in buckets),
+            "tree_usage": dict(tree_usage),
+            "decision_counts": dict(decision_counts),
+            "buckets": buckets
         }
-
@@ -0,0 +1,301 @@
+"""Per-process analytics shard files and their merged view."""
+import marshal
+import os
+import re
+import socket
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from utils.file_lock import file_lock
+from services.analytics_funnels import FunnelSet
+from services.analytics_rollups import RollupTable
+from services.analytics_sketches import SketchSet
+
+SHARD_FORMAT = 1
+
+SHARD_SUFFIX = ".bin"
+
+# Shards of exited processes are folded into this file
+COMPACTED_SHARD = "compacted" + SHARD_SUFFIX
+
+
+def _host() -> str:
+    """Get the hostname, without the underscore that separates it from the pid."""
+    return re.sub(r"[^A-Za-z0-9.-]", "-", socket.gethostname()) or "host"
+
+
+def shard_name(instance: int = 0) -> str:
+    """
+    Name this process's shard after its hostname and pid.
+
+    Args:
+        instance: Number of the service instance within the process; later
+            instances get a suffix so they do not share a file
+    """
+    name = f"{_host()}_{os.getpid()}"
+    return f"{name}_{instance}" if instance else name
+
+
+def _shard_pid(name: str) -> Optional[int]:
+    """Get the pid in the name of a shard written on this host, or None."""
+    match = re.fullmatch(rf"{re.escape(_host())}_(\d+)(?:_\d+)?{re.escape(SHARD_SUFFIX)}", name)
+    return int(match.group(1)) if match else None
+
+
+def _pid_alive(pid: int) -> bool:
+    """Check whether a process exists, assuming it does where that cannot be told."""
+    if os.name == "nt":
+        # os.kill would terminate the process on Windows
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def _empty_totals() -> Dict[str, Any]:
+    """Lifetime counters of a shard that has tracked nothing."""
+    return {
+        "total_decisions": 0,
+        "tree_usage": {},
+        "decision_counts": {},
+        "first_use": None,
+        "last_use": None
+    }
+
+
+class AnalyticsShard:
+    """Lifetime totals, rollups, sketches and funnels written by one process."""
+
+    def __init__(
+        self,
+        analytics: Optional[Dict[str, Any]] = None,
+        rollups: Optional[RollupTable] = None,
+        sketches: Optional[SketchSet] = None,
+        funnels: Optional[FunnelSet] = None,
+        folded: Optional[Dict[str, Tuple[int, int]]] = None
+    ):
+        """
+        Create a shard, empty unless parts are given.
+
+        Args:
+            analytics: Lifetime totals in the analytics.json layout
+            rollups: Time-bucketed counts
+            sketches: Distinct-count and top-K sketches
+            funnels: Per-node funnel counters
+            folded: For the compacted shard, mtime and size of each shard
+                file already folded into it
+        """
+        self.analytics = analytics if analytics is not None else _empty_totals()
+        self.rollups = rollups if rollups is not None else RollupTable()
+        self.sketches = sketches if sketches is not None else SketchSet()
+        self.funnels = funnels if funnels is not None else FunnelSet()
+        self.folded = folded if folded is not None else {}
+
+    def merge(self, other: "AnalyticsShard") -> None:
+        """
+        Add another shard's counts; the other shard is left untouched.
+
+        Args:
+            other: Shard to fold into this one
+        """
+        totals, theirs = self.analytics, other.analytics
+        totals["total_decisions"] = totals.get("total_decisions", 0) + theirs.get("total_decisions", 0)
+        for key in ("tree_usage", "decision_counts"):
+            counts = totals.setdefault(key, {})
+            for name, count in theirs.get(key, {}).items():
+                counts[name] = counts.get(name, 0) + count
+        first_uses = [use for use in (totals.get("first_use"), theirs.get("first_use")) if use]
+        totals["first_use"] = min(first_uses) if first_uses else None
+        last_uses = [use for use in (totals.get("last_use"), theirs.get("last_use")) if use]
+        totals["last_use"] = max(last_uses) if last_uses else None
+
+        self.rollups.merge(other.rollups)
+        self.sketches.merge(other.sketches)
+        self.funnels.merge(other.funnels)
+
+    def to_bytes(self) -> bytes:
+        """Serialize the shard."""
+        totals = self.analytics
+        return marshal.dumps({
+            "format": SHARD_FORMAT,
+            "analytics": {
+                "total_decisions": totals.get("total_decisions", 0),
+                "tree_usage": dict(totals.get("tree_usage", {})),
+                "decision_counts": dict(totals.get("decision_counts", {})),
+                "first_use": totals.get("first_use"),
+                "last_use": totals.get("last_use")
+            },
+            "rollups": self.rollups.to_bytes(),
+            "sketches": self.sketches.to_bytes(),
+            "funnels": self.funnels.to_bytes(),
+            "folded": dict(self.folded)
+        })
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "AnalyticsShard":
+        """
+        Deserialize a shard written by ``to_bytes``.
+
+        Raises:
+            ValueError: If the data is corrupt or in another format
+        """
+        try:
+            payload = marshal.loads(data)
+        except (EOFError, TypeError) as e:
+            raise ValueError(f"Corrupt analytics shard: {e}") from e
+        if payload.get("format") != SHARD_FORMAT:
+            raise ValueError("Analytics shard has a different format")
+        return cls(
+            payload["analytics"],
+            RollupTable.from_bytes(payload["rollups"]),
+            SketchSet.from_bytes(payload["sketches"]),
+            FunnelSet.from_bytes(payload["funnels"]),
+            {name: tuple(stamp) for name, stamp in payload.get("folded", {}).items()}
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "AnalyticsShard":
+        """Load a shard from disk, starting empty if it is missing or unreadable."""
+        try:
+            return cls.from_bytes(path.read_bytes())
+        except FileNotFoundError:
+            return cls()
+        except (IOError, ValueError) as e:
+            print(f"Error loading analytics shard {path.name}: {e}")
+            return cls()
+
+    def save(self, path: Path) -> bool:
+        """
+        Write the shard atomically.
+
+        Returns:
+            False if the file could not be written
+        """
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            tmp_path.write_bytes(self.to_bytes())
+            os.replace(tmp_path, path)
+            return True
+        except IOError as e:
+            print(f"Error saving analytics shard: {e}")
+            return False
+
+
+class ShardDirectory:
+    """
+    Merged view of the shard files other processes write to a directory.
+
+    Parsed shards are cached by mtime and size, so a refresh costs one
+    directory scan and only re-reads the shards that changed.
+    """
+
+    def __init__(self, directory: Path, exclude: Optional[Path] = None):
+        """
+        Initialize the view; nothing is read until ``refresh``.
+
+        Args:
+            directory: Directory holding the shard files
+            exclude: This process's own shard, which it keeps in memory
+        """
+        self.directory = directory
+        self.exclude = exclude.name if exclude is not None else None
+        self._shards: Dict[str, Tuple[Tuple[int, int], AnalyticsShard]] = {}
+        self._signature: Optional[Tuple[Tuple[str, int, int], ...]] = None
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        """Get the mtime and size of every other shard file."""
+        stamps = {}
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(SHARD_SUFFIX) or entry.name == self.exclude:
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    stamps[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            pass
+        return stamps
+
+    def refresh(self) -> Optional[AnalyticsShard]:
+        """
+        Re-read shards whose files changed since the last refresh.
+
+        Returns:
+            A new shard merging every other shard, or None if no shard file
+            was added, changed or removed
+        """
+        stamps = self._scan()
+        signature = tuple(sorted((name, *stamp) for name, stamp in stamps.items()))
+        if signature == self._signature:
+            return None
+
+        shards = {}
+        for name, stamp in stamps.items():
+            cached = self._shards.get(name)
+            if cached is not None and cached[0] == stamp:
+                shards[name] = cached
+            else:
+                shards[name] = (stamp, AnalyticsShard.load(self.directory / name))
+        self._shards = shards
+        self._signature = signature
+
+        merged = AnalyticsShard()
+        for _, shard in shards.values():
+            merged.merge(shard)
+        return merged
+
+
+def compact_shards(directory: Path, own: Path) -> int:
+    """
+    Fold the shards of exited processes on this host into the compacted shard.
+
+    Every process start creates a new shard file, so without compaction
+    the files a read merges would grow without bound. A shard is folded
+    when no process with its pid is running, or when it has this process's
+    own name and so was left by an exited process with the same pid. The
+    compacted shard records each file it folded, so a crash before the
+    files are removed does not count them twice.
+
+    Args:
+        directory: Directory holding the shard files
+        own: Shard file of the calling service instance, not yet written
+
+    Returns:
+        Number of shard files folded and removed
+    """
+    compacted_path = directory / COMPACTED_SHARD
+    with file_lock(compacted_path):
+        stale = {}
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    pid = _shard_pid(entry.name)
+                    if pid is None:
+                        continue
+                    if entry.name == own.name or (pid != os.getpid() and not _pid_alive(pid)):
+                        stat = entry.stat()
+                        stale[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            return 0
+        if not stale:
+            return 0
+
+        compacted = AnalyticsShard.load(compacted_path)
+        for name, stamp in stale.items():
+            if compacted.folded.get(name) != stamp:
+                compacted.merge(AnalyticsShard.load(directory / name))
+        compacted.folded = stale
+        if not compacted.save(compacted_path):
+            return 0
+        for name in stale:
+            try:
+                (directory / name).unlink()
+            except FileNotFoundError:
+                pass
+        return len(stale)
@@ -0,0 +1,315 @@
+"""Fixed-size probabilistic sketches for high-cardinality analytics."""
+import hashlib
+import json
+import marshal
+import math
+import os
+from array import array
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# 2**12 registers: about 1.6% standard error in 4 KiB
+HLL_PRECISION = 12
+
+# 4 rows of 1024 counters: overestimates by at most ~0.3% of the total with 98% confidence
+CMS_WIDTH = 1024
+CMS_DEPTH = 4
+
+# Outcome candidates kept per tree
+TOP_K = 10
+
+SKETCH_FORMAT = 1
+
+
+def _hash64(value: str) -> int:
+    """Stable 64-bit hash, identical across processes and runs."""
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HyperLogLog:
+    """Distinct-count estimator with a fixed number of registers."""
+
+    def __init__(self, precision: int = HLL_PRECISION, registers: Optional[bytes] = None):
+        """
+        Create an estimator.
+
+        Args:
+            precision: log2 of the number of registers
+            registers: Serialized registers to start from
+        """
+        self.precision = precision
+        size = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(size)
+        if len(self.registers) != size:
+            raise ValueError("HyperLogLog registers do not match the precision")
+
+    def add(self, value: str) -> None:
+        """Add a value."""
+        hashed = _hash64(value)
+        rest_bits = 64 - self.precision
+        index = hashed >> rest_bits
+        rest = hashed & ((1 << rest_bits) - 1)
+        rank = rest_bits - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> None:
+        """Fold in another estimator's values."""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLogs of different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        """Estimate the number of distinct values added."""
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class CountMinSketch:
+    """Frequency estimator that never undercounts, in fixed memory."""
+
+    def __init__(self, width: int = CMS_WIDTH, depth: int = CMS_DEPTH, counters: Optional[bytes] = None):
+        """
+        Create a sketch.
+
+        Args:
+            width: Counters per row
+            depth: Number of rows
+            counters: Serialized counters to start from
+        """
+        self.width = width
+        self.depth = depth
+        self.counters = array('I', counters) if counters is not None else array('I', [0]) * (width * depth)
+        if len(self.counters) != width * depth:
+            raise ValueError("Count-min counters do not match the dimensions")
+        self.total = 0
+
+    def _cells(self, key: str) -> List[int]:
+        """Counter positions of a key, one per row (double hashing)."""
+        hashed = _hash64(key)
+        low, high = hashed & 0xFFFFFFFF, hashed >> 32
+        return [row * self.width + (low + row * high) % self.width for row in range(self.depth)]
+
+    def add(self, key: str, count: int = 1) -> int:
+        """
+        Count a key.
+
+        Returns:
+            The key's estimated count after adding
+        """
+        counters = self.counters
+        estimate = None
+        for cell in self._cells(key):
+            counters[cell] += count
+            if estimate is None or counters[cell] < estimate:
+                estimate = counters[cell]
+        self.total += count
+        return estimate
+
+    def estimate(self, key: str) -> int:
+        """Estimate how often a key was counted."""
+        return min(self.counters[cell] for cell in self._cells(key))
+
+    def merge(self, other: "CountMinSketch") -> None:
+        """Add another sketch's counts."""
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("Cannot merge count-min sketches of different dimensions")
+        self.counters = array('I', map(int.__add__, self.counters, other.counters))
+        self.total += other.total
+
+
+class TreeSketches:
+    """
+    Sketches for one decision tree.
+
+    Holds a HyperLogLog of session IDs, a HyperLogLog of distinct answer
+    sets and a count-min sketch of outcomes with the ``TOP_K`` heaviest
+    candidates, so memory per tree is fixed however much traffic it sees.
+    """
+
+    def __init__(self):
+        """Create empty sketches."""
+        self.sessions = HyperLogLog()
+        self.answer_sets = HyperLogLog()
+        self.outcomes = CountMinSketch()
+        self.top: Dict[str, int] = {}
+
+    def add(self, decision: str, session_id: Optional[str], answers: Optional[Dict[str, Any]]) -> None:
+        """
+        Record one decision.
+
+        Args:
+            decision: Decision outcome
+            session_id: ID of the session that made the decision
+            answers: Answers that led to it
+        """
+        if session_id:
+            self.sessions.add(session_id)
+        if answers is not None:
+            self.answer_sets.add(json.dumps(answers, sort_keys=True, ensure_ascii=False, default=str))
+        self._offer(decision, self.outcomes.add(decision))
+
+    def _offer(self, decision: str, estimate: int) -> None:
+        """Keep ``decision`` among the top candidates if its estimate is high enough."""
+        top = self.top
+        if decision in top or len(top) < TOP_K:
+            top[decision] = estimate
+            return
+        smallest = min(top, key=top.get)
+        if estimate > top[smallest]:
+            del top[smallest]
+            top[decision] = estimate
+
+    def merge(self, other: "TreeSketches") -> None:
+        """Fold in sketches from another worker."""
+        self.sessions.merge(other.sessions)
+        self.answer_sets.merge(other.answer_sets)
+        self.outcomes.merge(other.outcomes)
+        candidates = set(self.top) | set(other.top)
+        ranked = sorted(((self.outcomes.estimate(key), key) for key in candidates), reverse=True)
+        self.top = {key: estimate for estimate, key in ranked[:TOP_K]}
+
+    def summary(self, limit: int = TOP_K) -> Dict[str, Any]:
+        """
+        Summarize the sketches.
+
+        Args:
+            limit: Number of top outcomes to list
+
+        Returns:
+            Estimated distinct sessions and answer sets, and the top
+            outcomes as (decision, estimated count) pairs
+        """
+        top = sorted(self.top.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return {
+            "distinct_sessions": self.sessions.count(),
+            "distinct_answer_sets": self.answer_sets.count(),
+            "top_outcomes": top
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize to marshal-friendly values."""
+        return {
+            "sessions": bytes(self.sessions.registers),
+            "answer_sets": bytes(self.answer_sets.registers),
+            "outcomes": self.outcomes.counters.tobytes(),
+            "outcomes_total": self.outcomes.total,
+            "top": dict(self.top)
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TreeSketches":
+        """Deserialize from ``to_dict`` output."""
+        sketches = cls()
+        sketches.sessions = HyperLogLog(registers=data["sessions"])
+        sketches.answer_sets = HyperLogLog(registers=data["answer_sets"])
+        sketches.outcomes = CountMinSketch(counters=data["outcomes"])
+        sketches.outcomes.total = data["outcomes_total"]
+        sketches.top = dict(data["top"])
+        return sketches
+
+
+class SketchSet:
+    """Per-tree sketches that can be merged and saved as one file."""
+
+    def __init__(self):
+        """Create an empty set."""
+        self.trees: Dict[str, TreeSketches] = {}
+
+    def add(
+        self,
+        tree_name: str,
+        decision: str,
+        session_id: Optional[str] = None,
+        answers: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """Record one decision in its tree's sketches."""
+        sketches = self.trees.get(tree_name)
+        if sketches is None:
+            sketches = self.trees[tree_name] = TreeSketches()
+        sketches.add(decision, session_id, answers)
+
+    def merge(self, other: "SketchSet") -> None:
+        """Fold in another set, e.g. from another worker process."""
+        for tree_name, sketches in other.trees.items():
+            mine = self.trees.get(tree_name)
+            if mine is None:
+                mine = self.trees[tree_name] = TreeSketches()
+            mine.merge(sketches)
+
+    def summary(self, limit: int = TOP_K) -> Dict[str, Any]:
+        """
+        Summarize every tree, plus distinct sessions across all trees.
+
+        Args:
+            limit: Number of top outcomes to list per tree
+
+        Returns:
+            ``distinct_sessions`` overall and a ``trees`` dict of per-tree summaries
+        """
+        overall = HyperLogLog()
+        for sketches in self.trees.values():
+            overall.merge(sketches.sessions)
+        return {
+            "distinct_sessions": overall.count(),
+            "trees": {name: sketches.summary(limit) for name, sketches in sorted(self.trees.items())}
+        }
+
+    def to_bytes(self) -> bytes:
+        """Serialize the set."""
+        return marshal.dumps({
+            "format": SKETCH_FORMAT,
+            "dimensions": (HLL_PRECISION, CMS_WIDTH, CMS_DEPTH),
+            "trees": {name: sketches.to_dict() for name, sketches in self.trees.items()}
+        })
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "SketchSet":
+        """
+        Deserialize a set written by ``to_bytes``.
+
+        Raises:
+            ValueError: If the data was written with different dimensions
+        """
+        try:
+            payload = marshal.loads(data)
+        except (EOFError, TypeError) as e:
+            raise ValueError(f"Corrupt sketch data: {e}") from e
+        if payload.get("format") != SKETCH_FORMAT or payload.get("dimensions") != (HLL_PRECISION, CMS_WIDTH, CMS_DEPTH):
+            raise ValueError("Sketch data has different dimensions")
+        sketch_set = cls()
+        sketch_set.trees = {name: TreeSketches.from_dict(data) for name, data in payload["trees"].items()}
+        return sketch_set
+
+    @classmethod
+    def load(cls, path: Path) -> "SketchSet":
+        """Load a set from disk, starting empty if it is missing or unreadable."""
+        try:
+            return cls.from_bytes(path.read_bytes())
+        except FileNotFoundError:
+            return cls()
+        except (IOError, ValueError) as e:
+            print(f"Error loading analytics sketches: {e}")
+            return cls()
+
+    def save(self, path: Path) -> bool:
+        """
+        Write the set atomically.
+
+        Returns:
+            False if the file could not be written
+        """
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            tmp_path.write_bytes(self.to_bytes())
+            os.replace(tmp_path, path)
+            return True
+        except IOError as e:
+            print(f"Error saving analytics sketches: {e}")
+            return False
@@ -0,0 +1,96 @@
+"""Vectorized evaluation of compiled trees over columnar answers."""
+from itertools import repeat
+from typing import Any, Dict, Mapping, Sequence
+import numpy as np
+from models.compiled_tree import CompiledTree, NodeKind
+from models.decision_tree import BatchDecisionResult
+
+
+def _row_count(answers_table: Mapping[str, Sequence[Any]]) -> int:
+    """Return the common column length of an answers table."""
+    lengths = {len(column) for column in answers_table.values()}
+    if len(lengths) > 1:
+        raise ValueError(f"Answer columns have different lengths: {sorted(lengths)}")
+    return lengths.pop() if lengths else 0
+
+
+def _encode_column(column: Sequence[Any], option_index: Dict[str, int], rows: int) -> np.ndarray:
+    """Map an answer column to option indices, with -1 for unanswered rows."""
+    if column is None:
+        return np.full(rows, -1, dtype=np.int64)
+    return np.fromiter(
+        map(option_index.get, column, repeat(-1)), dtype=np.int64, count=rows
+    )
+
+
+def evaluate_batch(tree: CompiledTree, answers_table: Mapping[str, Sequence[Any]]) -> BatchDecisionResult:
+    """
+    Evaluate a compiled tree for every row of a columnar answers table.
+
+    Rows advance together one tree level per step: for each question node
+    the matching rows gather their option index, add its score and jump to
+    its transition with array operations.
+
+    Args:
+        tree: Compiled tree to evaluate
+        answers_table: Mapping of question IDs to equal-length answer columns
+
+    Returns:
+        BatchDecisionResult with one entry per row
+    """
+    rows = _row_count(answers_table)
+    kinds = np.array(tree.kinds, dtype=np.int8)
+    question_count = int((kinds == NodeKind.QUESTION).sum())
+    integral = all(isinstance(s, int) for scores in tree.scores for s in scores)
+
+    nodes = np.full(rows, tree.start, dtype=np.int64)
+    scores = np.zeros(rows, dtype=np.int64 if integral else np.float64)
+    pending = np.zeros(rows, dtype=bool)
+    codes: Dict[int, np.ndarray] = {}
+
+    # Trees are acyclic, so no row can visit more questions than exist
+    for _ in range(question_count):
+        active = (kinds[nodes] == NodeKind.QUESTION) & ~pending
+        if not active.any():
+            break
+        for node in np.unique(nodes[active]):
+            node = int(node)
+            if node not in codes:
+                codes[node] = _encode_column(
+                    answers_table.get(tree.node_ids[node]), tree.option_index[node], rows
+                )
+            at_node = np.flatnonzero(active & (nodes == node))
+            choice = codes[node][at_node]
+            unanswered = choice < 0
+            pending[at_node[unanswered]] = True
+            at_node = at_node[~unanswered]
+            choice = choice[~unanswered]
+            scores[at_node] += np.asarray(tree.scores[node], dtype=scores.dtype)[choice]
+            nodes[at_node] = np.asarray(tree.transitions[node], dtype=np.int64)[choice]
+
+    if tree.scored:
+        to_score = (kinds[nodes] == NodeKind.SCORE) & ~pending
+        bands = np.searchsorted(np.asarray(tree.band_limits), scores[to_score], side="left")
+        band_nodes = np.asarray(tree.band_nodes, dtype=np.int64)
+        nodes[to_score] = band_nodes[np.minimum(bands, len(band_nodes) - 1)]
+
+    decision_table = np.array(
+        [o.decision if o else None for o in tree.outcomes] + [None], dtype=object
+    )
+    outcome_table = np.array(
+        [o.id if o else None for o in tree.outcomes] + [None], dtype=object
+    )
+    level_table = np.array(
+        [o.metadata.get("level") if o else None for o in tree.outcomes] + [None], dtype=object
+    )
+    # Pending rows read the trailing None entry
+    lookup = np.where(pending, len(tree.outcomes), nodes)
+
+    return BatchDecisionResult(
+        tree_name=tree.name,
+        decisions=decision_table[lookup],
+        outcome_ids=outcome_table[lookup],
+        levels=level_table[lookup],
+        scores=scores,
+        complete=~pending
+    )
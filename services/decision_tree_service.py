@@ -1,33 +1,196 @@
 """Service for managing decision trees."""
 import json
-import streamlit as st
+import sys
+import threading
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple, Any
-from models.decision_tree import DecisionResult, Question, DecisionNode
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple, Any
+from models.decision_tree import BatchDecisionResult, DecisionResult
+from models.compiled_tree import CompiledTree, NodeKind
+from services.tree_compiler import TreeCompilationError, compile_tree
+from services.outcome_table import OutcomeTable
+from services.tree_cache import CompiledTreeCache, cache_namespace
+from services.tree_registry import FileSignature, LoadedTree, LogicDirPoller, TreeRegistry
+from services.evaluation_cursor import EvaluationCursor, StepObserver
 from utils.config import Config
-from utils.validators import validate_radio_selection, safe_int_extract, sanitize_input
-from utils.cache import cache
+from utils.metrics import timed
+
+
+def _report_error(message: str) -> None:
+    """Print a tree load error to stderr, keeping stdout for output."""
+    print(message, file=sys.stderr)
 
 
 class DecisionTreeService:
     """Service for executing decision tree logic."""
     
-    def __init__(self):
-        """Initialize the service."""
-        self.trees: Dict[str, Dict] = {}
-        self._load_trees()
+    def __init__(
+        self,
+        precompute: Optional[bool] = None,
+        error_reporter: Optional[Callable[[str], None]] = None,
+        use_cache: Optional[bool] = None
+    ):
+        """
+        Initialize the service.
+        
+        Args:
+            precompute: Enumerate outcome tables at load time
+                (defaults to Config.PRECOMPUTE_OUTCOMES)
+            error_reporter: Called with a message for each tree that fails
+                to load (defaults to printing to stderr)
+            use_cache: Load unchanged trees from the compiled-tree cache
+                (defaults to Config.ENABLE_TREE_CACHE)
+        """
+        self.precompute = Config.PRECOMPUTE_OUTCOMES if precompute is None else precompute
+        self.error_reporter = error_reporter or _report_error
+        use_cache = Config.ENABLE_TREE_CACHE if use_cache is None else use_cache
+        self.tree_cache = (
+            CompiledTreeCache(Config.TREE_CACHE_DIR / cache_namespace(Config.LOGIC_DIR)) if use_cache else None
+        )
+        self._reload_lock = threading.Lock()
+        self._poller: Optional[LogicDirPoller] = None
+        self._registry = self._build_registry(None)
+    
+    @property
+    def registry(self) -> TreeRegistry:
+        """Current immutable snapshot of the loaded trees."""
+        return self._registry
     
-    def _load_trees(self) -> None:
-        """Load decision trees from JSON files."""
-        logic_dir = Config.LOGIC_DIR
-        for json_file in logic_dir.glob("*.json"):
+    @property
+    def trees(self) -> Dict[str, Dict]:
+        """Raw JSON definitions by tree name."""
+        return self._registry.trees
+    
+    @property
+    def compiled(self) -> Dict[str, CompiledTree]:
+        """Compiled trees by tree name."""
+        return self._registry.compiled
+    
+    @property
+    def outcome_tables(self) -> Dict[str, OutcomeTable]:
+        """Precomputed outcome tables by tree name."""
+        return self._registry.outcome_tables
+    
+    @property
+    def load_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Outcome table statistics by tree name."""
+        return self._registry.load_stats
+    
+    @property
+    def load_errors(self) -> List[str]:
+        """Errors from the most recent load."""
+        return self._registry.load_errors
+    
+    def _build_registry(self, previous: Optional[TreeRegistry]) -> TreeRegistry:
+        """
+        Scan the logic directory and build a registry snapshot.
+        
+        Files whose size and mtime match ``previous`` are reused as they are.
+        A changed file that fails to load keeps its previously loaded version.
+        
+        Args:
+            previous: Snapshot to reuse unchanged trees from
+            
+        Returns:
+            A new TreeRegistry, or ``previous`` itself if nothing changed
+        """
+        files: Dict[str, Tuple[FileSignature, Optional[LoadedTree]]] = {}
+        errors: List[str] = []
+        changed = previous is None
+        
+        for json_file in sorted(Config.LOGIC_DIR.glob("*.json")):
+            key = str(json_file)
+            try:
+                stat = json_file.stat()
+            except OSError:
+                continue
+            signature = (stat.st_mtime_ns, stat.st_size)
+            
+            old = previous.files.get(key) if previous else None
+            if old is not None and old[0] == signature:
+                files[key] = old
+                continue
+            
+            changed = True
             try:
-                with open(json_file, 'r', encoding='utf-8') as f:
-                    tree_data = json.load(f)
-                    tree_name = tree_data.get('tree_name', json_file.stem)
-                    self.trees[tree_name] = tree_data
-            except (json.JSONDecodeError, IOError) as e:
-                st.error(f"Error loading tree from {json_file}: {e}")
+                files[key] = (signature, self._load_tree_file(json_file))
+            except (json.JSONDecodeError, UnicodeDecodeError, IOError, TreeCompilationError) as e:
+                message = f"Error loading tree from {json_file}: {e}"
+                errors.append(message)
+                self.error_reporter(message)
+                files[key] = (signature, old[1] if old else None)
+        
+        if previous is not None and set(files) != set(previous.files):
+            changed = True
+        if not changed:
+            return previous
+        
+        if self.tree_cache:
+            # Drop artifacts of edited, removed and previous-engine trees
+            self.tree_cache.prune({loaded.cache_key for _, loaded in files.values() if loaded is not None})
+        
+        version = previous.version + 1 if previous else 1
+        return TreeRegistry.build(version, files, errors)
+    
+    def _load_tree_file(self, json_file: Path) -> LoadedTree:
+        """Parse, compile and precompute one tree file, using the cache when possible."""
+        content = json_file.read_bytes()
+        key = self.tree_cache.key(content, json_file.stem) if self.tree_cache else None
+        cached = self.tree_cache.load(content, json_file.stem) if self.tree_cache else None
+        if cached is None:
+            tree_data = json.loads(content)
+            compiled = compile_tree(tree_data, default_name=json_file.stem)
+            if self.tree_cache:
+                self.tree_cache.store(content, tree_data, compiled, json_file.stem)
+        else:
+            tree_data, compiled = cached
+        
+        table = None
+        stats: Dict[str, Any] = {"precomputed": False, "slots": 0, "filled": 0, "entries": 0, "bytes": 0}
+        if self.precompute:
+            table = OutcomeTable.build(compiled, self._evaluate, Config.PRECOMPUTE_MAX_ENTRIES)
+            if table is not None:
+                stats = {"precomputed": True, **table.stats()}
+        return LoadedTree(tree_data, compiled, table, stats, key)
+    
+    def reload(self) -> bool:
+        """
+        Recompile changed tree files and publish a new snapshot.
+        
+        Returns:
+            True if a new snapshot was published
+        """
+        with self._reload_lock:
+            registry = self._build_registry(self._registry)
+            if registry is self._registry:
+                return False
+            self._registry = registry
+            return True
+    
+    def start_watching(self, interval: Optional[float] = None) -> None:
+        """
+        Poll the logic directory in the background and reload on changes.
+        
+        Args:
+            interval: Seconds between scans (defaults to Config.RELOAD_INTERVAL)
+        """
+        if self._poller is None:
+            self._poller = LogicDirPoller(self.reload, interval or Config.RELOAD_INTERVAL)
+            self._poller.start()
+    
+    def stop_watching(self) -> None:
+        """Stop the background poller if it is running."""
+        if self._poller is not None:
+            self._poller.stop()
+            self._poller = None
+    
+    def get_load_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get per-tree load statistics.
+        
+        Returns:
+            Dictionary of tree names to outcome table size and memory use
+        """
+        return dict(self.load_stats)
     
     def get_available_trees(self) -> List[str]:
         """
@@ -38,6 +201,7 @@ class DecisionTreeService:
         """
         return list(self.trees.keys())
     
+    @timed("execute_tree")
     def execute_tree(
         self, 
         tree_name: str, 
@@ -53,238 +217,111 @@ class DecisionTreeService:
         Returns:
             DecisionResult object
         """
-        if tree_name not in self.trees:
+        # One snapshot per call, so a concurrent reload cannot mix versions
+        registry = self._registry
+        if tree_name not in registry.trees:
             return DecisionResult(
                 decision=None,
                 explanation=f"Tree '{tree_name}' not found.",
                 path=[]
             )
         
-        # For now, use hardcoded logic for existing trees
-        # This will be replaced with generic JSON engine
-        if tree_name == "Incident Reporting":
-            return self._execute_incident_reporting(answers)
-        elif tree_name == "Vendor Risk Tiering":
-            return self._execute_vendor_classification(answers)
-        elif tree_name == "DPIA Requirement":
-            return self._execute_dpia(answers)
+        table = registry.outcome_tables.get(tree_name)
+        if table is not None:
+            result = table.probe(answers)
+            if result is not None:
+                return result
         
-        return DecisionResult(decision=None, explanation="Tree not implemented.", path=[])
+        return self._evaluate(registry.compiled[tree_name], answers)
     
-    def _execute_incident_reporting(self, answers: Dict[str, Any]) -> DecisionResult:
-        """Execute incident reporting tree logic."""
-        path = []
-        q1 = answers.get("ir_q1", "Select...")
-        path.append(f"Q1 → {q1}")
-        
-        if q1 == "Select...":
-            return DecisionResult(None, None, path)
-        
-        if q1 == "No":
-            return DecisionResult(
-                "ACCEPT",
-                "The vendor does not process personal or sensitive data on your behalf. "
-                "Strict incident notification requirements are not triggered. You can still "
-                "include a generic incident notification clause as good practice.",
-                path,
-                DecisionType.ACCEPT
-            )
-        
-        q2 = answers.get("ir_q2", "Select...")
-        path.append(f"Q2 → {q2}")
-        
-        if q2 == "Select...":
-            return DecisionResult(None, None, path)
-        
-        if q2 == "No":
-            return DecisionResult(
-                "ACCEPT_WITH_MITIGATION",
-                "There is no explicit regulatory or upstream contractual incident notification "
-                "timeframe, but the vendor processes personal or sensitive data. You should "
-                "define a reasonable notification time window in the contract for governance "
-                "and monitoring purposes.",
-                path,
-                DecisionType.ACCEPT_WITH_MITIGATION
-            )
-        
-        q3 = answers.get("ir_q3", "Select...")
-        path.append(f"Q3 → {q3}")
-        
-        if q3 == "Select...":
-            return DecisionResult(None, None, path)
-        
-        # Safe extraction with error handling
-        required_hours = safe_int_extract(q3, 24)
-        
-        q4 = answers.get("ir_q4", "Select...")
-        path.append(f"Q4 → {q4}")
-        
-        if q4 == "Select...":
-            return DecisionResult(None, None, path)
-        
-        if q4 == "Yes":
-            return DecisionResult(
-                "ACCEPT",
-                f"The vendor agrees to a {required_hours}-hour notification window, which "
-                "aligns with your internal standard and regulatory expectations. This supports "
-                "timely internal escalation and external reporting where required.",
-                path,
-                DecisionType.ACCEPT
-            )
-        
-        q5 = answers.get("ir_q5", "Select...")
-        path.append(f"Q5 → {q5}")
-        
-        if q5 == "Select...":
-            return DecisionResult(None, None, path)
-        
-        if q5 == "Yes":
-            return DecisionResult(
-                "ACCEPT_WITH_MITIGATION",
-                "The vendor cannot meet your preferred incident notification timeframe, but "
-                "you can introduce compensating controls such as enhanced monitoring and "
-                "prioritised escalation. The risk is reduced but should be documented and "
-                "periodically reviewed.",
-                path,
-                DecisionType.ACCEPT_WITH_MITIGATION
-            )
+    def execute_tree_batch(
+        self,
+        tree_name: str,
+        answers_table: Mapping[str, Sequence[Any]]
+    ) -> BatchDecisionResult:
+        """
+        Execute a decision tree for many answer sets at once.
+
+        Args:
+            tree_name: Name of the tree to execute
+            answers_table: Mapping of question IDs to equal-length answer columns
+
+        Returns:
+            BatchDecisionResult with decisions, levels and scores per row
+
+        Raises:
+            ValueError: If the tree is not loaded or columns differ in length
+        """
+        tree = self._registry.compiled.get(tree_name)
+        if tree is None:
+            raise ValueError(f"Tree '{tree_name}' not found.")
+
+        # Imported here so single evaluations do not pay for NumPy
+        from services.batch_evaluator import evaluate_batch
+        return evaluate_batch(tree, answers_table)
+
+    def create_cursor(
+        self,
+        tree_name: str,
+        on_step: Optional[StepObserver] = None
+    ) -> Optional[EvaluationCursor]:
+        """
+        Create an incremental evaluation cursor for a tree.
         
-        return DecisionResult(
-            "REJECT",
-            "The vendor cannot meet your required notification timeframe and you cannot put "
-            "effective compensating controls in place. The residual risk remains too high, "
-            "so you should consider alternative vendors or a different solution.",
-            path,
-            DecisionType.REJECT
-        )
+        Args:
+            tree_name: Name of the tree to evaluate
+            on_step: Observer of cursor steps, e.g. AnalyticsService.track_step
+            
+        Returns:
+            EvaluationCursor at the tree's first question, or None if not found
+        """
+        tree = self.compiled.get(tree_name)
+        return EvaluationCursor(tree, on_step) if tree is not None else None
     
-    def _execute_vendor_classification(self, answers: Dict[str, Any]) -> DecisionResult:
-        """Execute vendor classification tree logic."""
-        path = []
-        q1 = answers.get("vc_q1", "Select...")
-        path.append(f"Q1 → {q1}")
-        
-        if q1 == "Select...":
-            return DecisionResult(None, None, path)
-        
-        q2 = answers.get("vc_q2", "Select...")
-        path.append(f"Q2 → {q2}")
-        
-        if q2 == "Select...":
-            return DecisionResult(None, None, path)
-        
-        q3 = answers.get("vc_q3", "Select...")
-        path.append(f"Q3 → {q3}")
+    def get_compiled_tree(self, tree_name: str) -> Optional[CompiledTree]:
+        """
+        Get the compiled node table for a tree.
         
-        if q3 == "Select...":
-            return DecisionResult(None, None, path)
+        Args:
+            tree_name: Name of the tree
+            
+        Returns:
+            CompiledTree or None if the tree is not loaded
+        """
+        return self.compiled.get(tree_name)
+    
+    def _evaluate(self, tree: CompiledTree, answers: Dict[str, Any]) -> DecisionResult:
+        """
+        Walk a compiled tree from its start node.
         
-        # Scoring logic
+        Args:
+            tree: Compiled tree to walk
+            answers: Dictionary of question IDs to answers
+            
+        Returns:
+            DecisionResult object; decision is None while answers are missing
+        """
+        kinds = tree.kinds
+        node = tree.start
         score = 0
-        
-        if q1 == "No data":
-            score += 0
-        elif q1 == "Personal data":
-            score += 2
-        elif q1 == "Special category / highly sensitive data":
-            score += 4
-        
-        if q2 == "Small (few records, low volume)":
-            score += 1
-        elif q2 == "Medium":
-            score += 2
-        elif q2 == "Large (high volume / continuous)":
-            score += 3
-        
-        if q3 == "Yes":
-            score += 2
-        
-        # Map score to risk level
-        if score <= 2:
-            level = "LOW"
-            explanation = (
-                "The vendor has limited exposure to personal or sensitive data and does not "
-                "present significant integration risk. Standard due diligence and basic "
-                "controls should be sufficient."
-            )
-        elif 3 <= score <= 5:
-            level = "MEDIUM"
-            explanation = (
-                "The vendor processes personal data or has moderate integration with your "
-                "environment. A more detailed security and privacy review is appropriate, and "
-                "contractual controls should be clearly defined."
-            )
-        elif 6 <= score <= 7:
-            level = "HIGH"
-            explanation = (
-                "The vendor processes a meaningful volume of personal or sensitive data and/or "
-                "connects to core systems. Enhanced due diligence, stronger controls, and "
-                "ongoing monitoring are recommended."
-            )
-        else:
-            level = "CRITICAL"
-            explanation = (
-                "The vendor processes highly sensitive or special category data at scale and/or "
-                "is tightly integrated with critical systems. Treat this as a critical vendor: "
-                "require comprehensive assessment, senior sign-off, and continuous monitoring."
-            )
-        
-        return DecisionResult(
-            f"RISK TIER: {level}",
-            explanation,
-            path,
-            DecisionType.RISK_TIER,
-            {"score": score, "level": level}
-        )
-    
-    def _execute_dpia(self, answers: Dict[str, Any]) -> DecisionResult:
-        """Execute DPIA requirement tree logic."""
+        values = {} if tree.templated else None
         path = []
-        q1 = answers.get("dp_q1", "Select...")
-        path.append(f"Q1 → {q1}")
-        
-        if q1 == "Select...":
-            return DecisionResult(None, None, path)
-        
-        q2 = answers.get("dp_q2", "Select...")
-        path.append(f"Q2 → {q2}")
-        
-        if q2 == "Select...":
-            return DecisionResult(None, None, path)
         
-        q3 = answers.get("dp_q3", "Select...")
-        path.append(f"Q3 → {q3}")
-        
-        if q3 == "Select...":
-            return DecisionResult(None, None, path)
+        while kinds[node] == NodeKind.QUESTION:
+            question_id = tree.node_ids[node]
+            answer = answers.get(question_id, "Select...")
+            path.append(f"{tree.labels[node]} → {answer}")
+            
+            choice = tree.option_index[node].get(answer)
+            if choice is None:
+                return DecisionResult(None, None, path)
+            
+            score += tree.scores[node][choice]
+            if values is not None:
+                values[question_id] = tree.values[node][choice]
+            node = tree.transitions[node][choice]
         
-        yes_count = sum(1 for ans in [q1, q2, q3] if ans == "Yes")
+        if kinds[node] == NodeKind.SCORE:
+            node = tree.band_for(score)
         
-        if yes_count == 0:
-            return DecisionResult(
-                "DPIA NOT REQUIRED (LIKELY)",
-                "None of the high-risk indicators are triggered. A full DPIA is unlikely to be "
-                "mandatory, but you should document this assessment and keep it under review "
-                "if the scope changes.",
-                path,
-                DecisionType.DPIA_NOT_REQUIRED
-            )
-        elif yes_count == 1:
-            return DecisionResult(
-                "DPIA RECOMMENDED",
-                "At least one high-risk characteristic is present. A DPIA may not be strictly "
-                "mandatory in all jurisdictions, but completing one is recommended to document "
-                "risk analysis and controls.",
-                path,
-                DecisionType.DPIA_RECOMMENDED
-            )
-        else:
-            return DecisionResult(
-                "DPIA REQUIRED",
-                "Multiple high-risk characteristics are present. A DPIA should be treated as "
-                "mandatory to assess and document privacy risks and mitigating controls before "
-                "proceeding.",
-                path,
-                DecisionType.DPIA_REQUIRED
-            )
-
+        return tree.make_result(node, path, score, values)
@@ -0,0 +1,215 @@
+"""Incremental evaluation of a compiled decision tree."""
+from typing import Any, Callable, Dict, List, Optional
+from models.compiled_tree import CompiledTree, NodeKind, TemplateValues
+from models.decision_tree import DecisionResult, Question
+
+# Called as on_step(tree, node, choice, count): choice is None when the
+# cursor reaches ``node``, and count is -1 when a step is taken back
+StepObserver = Callable[[CompiledTree, int, Optional[int], int], None]
+
+
+class EvaluationCursor:
+    """
+    Position in a compiled tree that advances one answer at a time.
+
+    The cursor keeps the answered path, so answering the current question
+    advances by one node and changing an earlier answer truncates the path
+    back to that question instead of re-walking from the start.
+
+    An optional ``on_step`` observer is told about every node reached and
+    option taken as the cursor moves, and about the steps it takes back.
+    """
+
+    def __init__(self, tree: CompiledTree, on_step: Optional[StepObserver] = None):
+        """
+        Initialize a cursor at the start of a tree.
+
+        Args:
+            tree: Compiled tree to evaluate
+            on_step: Observer of cursor steps, e.g. funnel analytics
+        """
+        self.tree = tree
+        self.node = tree.start
+        self._nodes: List[int] = []
+        self._answers: List[str] = []
+        self._scores: List[float] = []
+        self._steps: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._values: Dict[str, Any] = {}
+        self._pending: Any = "Select..."
+        self._on_step = on_step
+        if on_step is not None:
+            on_step(tree, self.node, None, 1)
+
+    @property
+    def tree_name(self) -> str:
+        """Name of the tree being evaluated."""
+        return self.tree.name
+
+    @property
+    def score(self) -> float:
+        """Score accumulated along the answered path."""
+        return self._scores[-1] if self._scores else 0
+
+    @property
+    def depth(self) -> int:
+        """Number of answered questions on the current path."""
+        return len(self._nodes)
+
+    @property
+    def progress(self) -> float:
+        """
+        Percentage of the longest remaining path already answered.
+
+        Uses the compiled ``remaining_depth`` of the current node, so it is
+        exact for the branch taken and costs O(1).
+        """
+        total = len(self._nodes) + self.tree.remaining_depth[self.node]
+        return 100.0 * len(self._nodes) / total if total else 100.0
+
+    @property
+    def complete(self) -> bool:
+        """Whether the cursor has reached an outcome."""
+        return self.tree.kinds[self.node] == NodeKind.OUTCOME
+
+    def answer(self, question_id: str, answer: Any) -> bool:
+        """
+        Record an answer and move the cursor.
+
+        Answers to questions that are neither on the path nor current are
+        ignored. An invalid answer leaves the cursor waiting at that question.
+
+        Args:
+            question_id: ID of the answered question
+            answer: Selected option
+
+        Returns:
+            True if the cursor state changed
+        """
+        position = self._positions.get(question_id)
+        if position is not None:
+            if self._answers[position] == answer:
+                return False
+            self._truncate(position)
+        elif self.complete or self.tree.node_ids[self.node] != question_id:
+            return False
+
+        tree = self.tree
+        node = self.node
+        choice = tree.option_index[node].get(answer)
+        if choice is None:
+            changed = self._pending != answer or position is not None
+            self._pending = answer
+            return changed
+
+        score = self.score + tree.scores[node][choice]
+        self._positions[question_id] = len(self._nodes)
+        self._nodes.append(node)
+        self._answers.append(answer)
+        self._scores.append(score)
+        self._steps.append(f"{tree.labels[node]} → {answer}")
+        self._values[question_id] = tree.values[node][choice]
+        self._pending = "Select..."
+
+        node = tree.transitions[node][choice]
+        if tree.kinds[node] == NodeKind.SCORE:
+            node = tree.band_for(score)
+        if self._on_step is not None:
+            self._on_step(tree, self.node, choice, 1)
+            self._on_step(tree, node, None, 1)
+        self.node = node
+        return True
+
+    def sync(self, answers: Dict[str, Any]) -> DecisionResult:
+        """
+        Bring the cursor in line with a full answers dictionary.
+
+        Args:
+            answers: Dictionary of question IDs to answers
+
+        Returns:
+            DecisionResult for the synchronized position
+        """
+        position = 0
+        while True:
+            question = self.question_at(position)
+            if question is None:
+                break
+            self.answer(question.id, answers.get(question.id, "Select..."))
+            if position >= len(self._nodes):
+                break
+            position += 1
+        return self.result()
+
+    def question_at(self, position: int) -> Optional[Question]:
+        """
+        Get the question shown at a position of the current path.
+
+        Args:
+            position: Zero-based step on the path
+
+        Returns:
+            The answered question at that step, the next question to show
+            when ``position`` equals the depth, or None past the end
+        """
+        if position < len(self._nodes):
+            return self._question(self._nodes[position])
+        if position == len(self._nodes) and not self.complete:
+            return self._question(self.node)
+        return None
+
+    def next_question(self) -> Optional[Question]:
+        """
+        Get the next question to show.
+
+        Returns:
+            Question, or None once an outcome has been reached
+        """
+        return self.question_at(len(self._nodes))
+
+    def result(self) -> DecisionResult:
+        """
+        Build the result for the current position.
+
+        Returns:
+            DecisionResult object; decision is None until an outcome is reached
+        """
+        tree = self.tree
+        if not self.complete:
+            pending = f"{tree.labels[self.node]} → {self._pending}"
+            return DecisionResult(None, None, self._steps + [pending])
+
+        values = self._values if tree.templated else None
+        return tree.make_result(self.node, list(self._steps), self.score, values)
+
+    def _question(self, node: int) -> Question:
+        """Describe a question node with its text filled from earlier answers."""
+        tree = self.tree
+        text = tree.texts[node]
+        if tree.templated:
+            text = text.format_map(TemplateValues(self._values))
+        return Question(
+            id=tree.node_ids[node],
+            text=text,
+            options=list(tree.options[node]),
+            help_text=tree.help_texts[node]
+        )
+
+    def _truncate(self, position: int) -> None:
+        """Drop the path from ``position`` onwards and move back to that question."""
+        if self._on_step is not None:
+            tree = self.tree
+            for node, answer in zip(self._nodes[position:], self._answers[position:]):
+                self._on_step(tree, node, tree.option_index[node][answer], -1)
+            for node in self._nodes[position + 1:] + [self.node]:
+                self._on_step(tree, node, None, -1)
+        self.node = self._nodes[position]
+        for node in self._nodes[position:]:
+            question_id = self.tree.node_ids[node]
+            del self._positions[question_id]
+            self._values.pop(question_id, None)
+        del self._nodes[position:]
+        del self._answers[position:]
+        del self._scores[position:]
+        del self._steps[position:]
+        self._pending = "Select..."
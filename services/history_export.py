@@ -0,0 +1,133 @@
+"""Streaming export of decision history to CSV and columnar NumPy bundles."""
+import csv
+import json
+from array import array
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, Iterable, List, TextIO, Union
+
+import numpy as np
+
+EXPORT_FORMATS = ("csv", "npz")
+
+CSV_FIELDS = ["timestamp", "tree_name", "decision", "explanation", "path", "answers", "metadata"]
+
+# Separator for path steps in CSV output
+PATH_SEPARATOR = " | "
+
+# Prefix of the per-question answer code arrays in an npz bundle
+ANSWER_PREFIX = "answer:"
+
+
+class _Dictionary:
+    """Dictionary encoder mapping values to dense integer codes."""
+
+    def __init__(self):
+        self.codes: Dict[Any, int] = {}
+        self.values: List[Any] = []
+
+    def encode(self, value: Any) -> int:
+        """Get the code of a value, adding it on first sight."""
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+def write_csv(entries: Iterable[Dict[str, Any]], handle: TextIO) -> int:
+    """
+    Write history entries as CSV rows, one row at a time.
+
+    Args:
+        entries: History entries, in the order to write
+        handle: Open text file
+
+    Returns:
+        Number of rows written
+    """
+    writer = csv.writer(handle)
+    writer.writerow(CSV_FIELDS)
+    count = 0
+    for entry in entries:
+        writer.writerow([
+            entry.get("timestamp", ""),
+            entry.get("tree_name", ""),
+            entry.get("decision") or "",
+            entry.get("explanation") or "",
+            PATH_SEPARATOR.join(entry.get("path") or []),
+            json.dumps(entry.get("answers") or {}, ensure_ascii=False),
+            json.dumps(entry.get("metadata") or {}, ensure_ascii=False)
+        ])
+        count += 1
+    return count
+
+
+def write_npz(entries: Iterable[Dict[str, Any]], target: Union[str, BinaryIO]) -> int:
+    """
+    Write history entries as a compressed columnar ``.npz`` bundle.
+
+    Entries are consumed one at a time and only integer codes are kept per
+    row. The bundle holds:
+
+    - ``timestamp``: datetime64[us] per row
+    - ``tree``/``tree_values``: tree codes and their names
+    - ``decision``/``decision_values``: decision codes and their texts
+    - ``questions``: answered question IDs, in first-seen order
+    - ``answer:<question id>``: answer codes per row, -1 when unanswered
+    - ``answer_values``: answer texts shared by every answer column
+
+    Args:
+        entries: History entries, in the order to write
+        target: Output path or binary file
+
+    Returns:
+        Number of rows written
+    """
+    timestamps = array('q')
+    trees, tree_codes = _Dictionary(), array('i')
+    decisions, decision_codes = _Dictionary(), array('i')
+    answers_dict = _Dictionary()
+    answer_codes: Dict[str, array] = {}
+
+    count = 0
+    for entry in entries:
+        timestamps.append(_microseconds(entry.get("timestamp")))
+        tree_codes.append(trees.encode(entry.get("tree_name", "")))
+        decision_codes.append(decisions.encode(entry.get("decision") or ""))
+
+        answers = entry.get("answers") or {}
+        for question_id, answer in answers.items():
+            column = answer_codes.get(question_id)
+            if column is None:
+                # Earlier rows did not answer this question
+                column = answer_codes[question_id] = array('i', [-1]) * count
+            column.append(answers_dict.encode(str(answer)))
+        count += 1
+        for question_id, column in answer_codes.items():
+            if len(column) < count:
+                column.append(-1)
+
+    arrays = {
+        "timestamp": np.frombuffer(timestamps, dtype=np.int64).astype("datetime64[us]"),
+        "tree": np.frombuffer(tree_codes, dtype=np.int32),
+        "tree_values": np.array(trees.values, dtype=str),
+        "decision": np.frombuffer(decision_codes, dtype=np.int32),
+        "decision_values": np.array(decisions.values, dtype=str),
+        "questions": np.array(list(answer_codes), dtype=str),
+        "answer_values": np.array(answers_dict.values, dtype=str)
+    }
+    for question_id, column in answer_codes.items():
+        arrays[ANSWER_PREFIX + question_id] = np.frombuffer(column, dtype=np.int32)
+
+    np.savez_compressed(target, **arrays)
+    return count
+
+
+def _microseconds(timestamp: Any) -> int:
+    """Convert an ISO timestamp to microseconds since the epoch (NaT when missing)."""
+    try:
+        moment = datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return np.iinfo(np.int64).min
+    delta = moment.replace(tzinfo=None) - datetime(1970, 1, 1)
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
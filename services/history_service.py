@@ -1,43 +1,127 @@
 """Service for managing decision history."""
 import json
+import threading
+from collections import deque
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Optional, Any
+from typing import IO, List, Dict, Optional, Any, Union
 from models.decision_tree import DecisionResult
+from models.history import HistoryPage
+from services.history_stores import (
+    JsonHistoryStore,
+    JsonlHistoryStore,
+    SegmentedJsonlHistoryStore,
+    SqliteHistoryStore
+)
+from services.write_behind import WriteBehindQueue
 from utils.config import Config
+from utils.file_lock import file_lock
+from utils.metrics import timed
 
 
 class HistoryService:
-    """Service for storing and retrieving decision history."""
+    """
+    Service for storing and retrieving decision history.
     
-    def __init__(self):
-        """Initialize history service."""
-        self.history_file = Config.DATA_DIR / "decision_history.json"
-        self._ensure_history_file()
+    The most recent entries are kept in a process-wide ring buffer so that
+    ``get_history`` is served from memory. The buffer is updated by our own
+    saves and reloaded when the store's signature shows that another
+    process has written to it.
     
-    def _ensure_history_file(self) -> None:
-        """Ensure history file exists."""
-        if not self.history_file.exists():
-            self._save_history([])
+    With write-behind enabled, saves are queued and a background thread
+    writes them in batches under an advisory file lock.
+    """
     
-    def _load_history(self) -> List[Dict[str, Any]]:
-        """Load history from file."""
-        try:
-            if self.history_file.exists():
-                with open(self.history_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-        except (json.JSONDecodeError, IOError):
-            pass
-        return []
+    def __init__(self, backend: Optional[str] = None, write_behind: Optional[bool] = None):
+        """
+        Initialize history service.
+        
+        Args:
+            backend: Storage backend, "jsonl", "sqlite" or "json";
+                defaults to Config.HISTORY_BACKEND
+            write_behind: Queue saves for a background writer;
+                defaults to Config.WRITE_BEHIND
+        """
+        self.backend = backend or Config.HISTORY_BACKEND
+        if write_behind is None:
+            write_behind = Config.WRITE_BEHIND
+        self._writer: Optional[WriteBehindQueue] = None
+        if write_behind:
+            self._writer = WriteBehindQueue(
+                self._write,
+                Config.WRITE_BEHIND_INTERVAL,
+                Config.WRITE_BEHIND_BATCH_SIZE,
+                Config.WRITE_BEHIND_MAX_PENDING,
+                name="history-writer"
+            )
+        
+        cache_size = Config.HISTORY_CACHE_SIZE
+        if Config.HISTORY_MAX_ENTRIES:
+            cache_size = min(cache_size, Config.HISTORY_MAX_ENTRIES)
+        self._recent: deque = deque(maxlen=cache_size)
+        self._recent_signature: Any = None
+        self._recent_valid = False
+        self._recent_lock = threading.RLock()
+        # Store writes started but not yet reconciled with the ring buffer
+        self._writes_in_flight = 0
+        
+        if self.backend == "json":
+            self.history_file = Config.DATA_DIR / "decision_history.json"
+            self._store = JsonHistoryStore(self.history_file, Config.HISTORY_MAX_ENTRIES)
+            return
+        
+        if self.backend == "jsonl":
+            self.history_file = Config.DATA_DIR / "decision_history.jsonl"
+            legacy_files = ["decision_history.json"]
+        elif self.backend == "sqlite":
+            self.history_file = Config.DATA_DIR / "decision_history.db"
+            legacy_files = ["decision_history.jsonl", "decision_history.json"]
+        else:
+            raise ValueError(f"Unknown history backend: {self.backend}")
+        
+        is_new = not self.history_file.exists()
+        if self.backend == "jsonl" and (Config.HISTORY_SEGMENT_BYTES or Config.HISTORY_SEGMENT_DAYS):
+            self._store = SegmentedJsonlHistoryStore(
+                self.history_file,
+                Config.HISTORY_MAX_ENTRIES,
+                Config.DATA_DIR / "history_segments",
+                Config.HISTORY_SEGMENT_BYTES,
+                Config.HISTORY_SEGMENT_DAYS,
+                Config.HISTORY_RETENTION_DAYS
+            )
+        elif self.backend == "jsonl":
+            self._store = JsonlHistoryStore(self.history_file, Config.HISTORY_MAX_ENTRIES)
+        else:
+            self._store = SqliteHistoryStore(
+                self.history_file,
+                Config.HISTORY_MAX_ENTRIES,
+                Config.HISTORY_RETENTION_DAYS
+            )
+        if is_new:
+            self._import_history(legacy_files)
     
-    def _save_history(self, history: List[Dict[str, Any]]) -> None:
-        """Save history to file."""
-        try:
-            with open(self.history_file, 'w', encoding='utf-8') as f:
-                json.dump(history, f, indent=2, ensure_ascii=False)
-        except IOError as e:
-            print(f"Error saving history: {e}")
+    def _import_history(self, legacy_files: List[str]) -> None:
+        """Seed a new store from the first existing history file of another backend."""
+        for name in legacy_files:
+            legacy_file = Config.DATA_DIR / name
+            if not legacy_file.exists():
+                continue
+            
+            try:
+                with open(legacy_file, 'r', encoding='utf-8') as f:
+                    if legacy_file.suffix == ".jsonl":
+                        history = [json.loads(line) for line in f if line.strip()]
+                    else:
+                        history = json.load(f)
+            except (json.JSONDecodeError, IOError) as e:
+                print(f"Error migrating history: {e}")
+                return
+            
+            if history:
+                self._store.extend(history)
+            return
     
+    @timed("save_decision")
     def save_decision(
         self,
         tree_name: str,
@@ -55,26 +139,83 @@ class HistoryService:
         if not Config.ENABLE_HISTORY:
             return
         
-        history = self._load_history()
-        
         entry = {
             "timestamp": datetime.now().isoformat(),
             "tree_name": tree_name,
             "decision": result.decision,
             "explanation": result.explanation,
-            "path": result.path,
-            "answers": answers,
-            "metadata": result.metadata or {}
+            "path": list(result.path),
+            "answers": dict(answers),
+            "metadata": dict(result.metadata or {})
         }
         
-        history.append(entry)
+        if self._writer is None:
+            self._write([entry], remember=True)
+            return
+        
+        with self._recent_lock:
+            if self._recent_valid:
+                self._recent.append(entry)
+        self._writer.submit(entry)
+    
+    def _write(self, entries: List[Dict[str, Any]], remember: bool = False) -> bool:
+        """
+        Write entries to the store under the history file lock.
+        
+        The ring buffer lock is only taken after the write, so readers are
+        never blocked behind disk I/O.
+        
+        Args:
+            entries: History entries, oldest first
+            remember: Also add the entries to the ring buffer
+            
+        Returns:
+            True if the ring buffer is still in step with the store
+        """
+        with self._recent_lock:
+            self._writes_in_flight += 1
+        try:
+            with file_lock(self.history_file):
+                before = self._store.signature()
+                self._store.extend(entries)
+                after = self._store.signature()
+        except BaseException:
+            with self._recent_lock:
+                self._writes_in_flight -= 1
+            raise
         
-        # Keep only last 100 entries
-        if len(history) > 100:
-            history = history[-100:]
+        with self._recent_lock:
+            self._writes_in_flight -= 1
+            if self._recent_valid and before == self._recent_signature:
+                self._recent_signature = after
+                if remember:
+                    self._recent.extend(entries)
+                return True
+            # Another write got in between; the next read reloads the buffer
+            self._recent_valid = False
+            return False
+    
+    def flush(self) -> None:
+        """Block until queued saves have been written."""
+        if self._writer is not None:
+            self._writer.join()
+    
+    def close(self) -> None:
+        """Write queued saves and stop the background writer."""
+        if self._writer is not None:
+            self._writer.stop()
+    
+    def get_write_stats(self) -> Dict[str, Any]:
+        """
+        Get background writer counters.
         
-        self._save_history(history)
+        Returns:
+            Queue depth and flush latency counters, or an empty dict when
+            saves are written synchronously
+        """
+        return self._writer.stats() if self._writer is not None else {}
     
+    @timed("get_history")
     def get_history(self, limit: int = 10) -> List[Dict[str, Any]]:
         """
         Get recent decision history.
@@ -88,10 +229,102 @@ class HistoryService:
         if not Config.ENABLE_HISTORY:
             return []
         
-        history = self._load_history()
-        return list(reversed(history[-limit:]))
+        if limit > self._recent.maxlen:
+            self.flush()
+            return self._store.recent(limit)
+        
+        with self._recent_lock:
+            signature = self._store.signature()
+            # While our own write is in flight the store is ahead of the
+            # buffer's signature; reloading then would drop queued entries
+            stale = signature != self._recent_signature and not self._writes_in_flight
+            if not self._recent_valid or stale:
+                self._recent.clear()
+                self._recent.extend(reversed(self._store.recent(self._recent.maxlen)))
+                self._recent_signature = signature
+                self._recent_valid = True
+            return list(reversed(self._recent))[:limit]
+    
+    def query_history(
+        self,
+        tree_name: Optional[str] = None,
+        decision: Optional[str] = None,
+        start: Optional[Union[datetime, str]] = None,
+        end: Optional[Union[datetime, str]] = None,
+        limit: int = 50,
+        cursor: Optional[str] = None
+    ) -> HistoryPage:
+        """
+        Query decision history, most recent first.
+        
+        The sqlite backend answers this from its indexes; the file backends
+        scan their entries.
+        
+        Args:
+            tree_name: Only entries for this tree
+            decision: Only entries with this decision
+            start: Only entries at or after this time
+            end: Only entries before this time
+            limit: Maximum number of entries per page
+            cursor: ``next_cursor`` of the previous page
+            
+        Returns:
+            HistoryPage with the entries and the cursor of the next page, if any
+        """
+        if not Config.ENABLE_HISTORY:
+            return HistoryPage([])
+        
+        self.flush()
+        return self._store.query(tree_name, decision, start, end, limit, cursor)
+    
+    def export(
+        self,
+        fmt: str,
+        filters: Optional[Dict[str, Any]] = None,
+        target: Union[str, Path, IO, None] = None
+    ) -> int:
+        """
+        Stream history entries, oldest first, to CSV or a columnar npz bundle.
+        
+        Entries are read lazily from the store, so the export does not hold
+        the whole history in memory.
+        
+        Args:
+            fmt: "csv" or "npz"
+            filters: Optional tree_name, decision, start and end, as for
+                ``query_history``
+            target: Output path, or an open text (csv) or binary (npz) file
+            
+        Returns:
+            Number of exported entries
+        """
+        from services.history_export import EXPORT_FORMATS, write_csv, write_npz
+        
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        filters = dict(filters or {})
+        unknown = set(filters) - {"tree_name", "decision", "start", "end"}
+        if unknown:
+            raise ValueError(f"Unknown history filters: {', '.join(sorted(unknown))}")
+        if target is None:
+            raise ValueError("An export target is required")
+        
+        self.flush()
+        entries = self._store.iter_entries(**filters)
+        if fmt == "npz":
+            return write_npz(entries, str(target) if isinstance(target, Path) else target)
+        if isinstance(target, (str, Path)):
+            with open(target, 'w', encoding='utf-8', newline='') as f:
+                return write_csv(entries, f)
+        return write_csv(entries, target)
     
     def clear_history(self) -> None:
         """Clear all history."""
-        self._save_history([])
-
+        self.flush()
+        with file_lock(self.history_file):
+            self._store.clear()
+            signature = self._store.signature()
+        with self._recent_lock:
+            self._recent.clear()
+            self._recent_signature = signature
+            self._recent_valid = True
@@ -0,0 +1,769 @@
+"""Storage backends for decision history."""
+import gzip
+import json
+import os
+import time
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from itertools import chain, islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from models.history import HistoryPage
+
+# Bytes read per step when scanning a log backwards
+TAIL_BLOCK_SIZE = 8192
+
+Timestamp = Union[datetime, str, None]
+
+
+def _timestamp(value: Timestamp) -> Optional[str]:
+    """Normalize a query bound to the ISO format used in entries."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _parse_lines(lines: Iterable[bytes]) -> Iterator[Dict[str, Any]]:
+    """Parse JSONL lines, skipping blank and torn ones."""
+    for line in lines:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def _filter_entries(
+    entries: Iterable[Dict[str, Any]],
+    tree_name: Optional[str],
+    decision: Optional[str],
+    start: Timestamp,
+    end: Timestamp
+) -> Iterator[Dict[str, Any]]:
+    """Lazily keep the entries that match every given filter."""
+    start, end = _timestamp(start), _timestamp(end)
+    return (
+        entry for entry in entries
+        if (tree_name is None or entry.get("tree_name") == tree_name)
+        and (decision is None or entry.get("decision") == decision)
+        and (start is None or entry.get("timestamp", "") >= start)
+        and (end is None or entry.get("timestamp", "") < end)
+    )
+
+
+def _filter_page(
+    entries: Iterable[Dict[str, Any]],
+    tree_name: Optional[str],
+    decision: Optional[str],
+    start: Timestamp,
+    end: Timestamp,
+    limit: int,
+    cursor: Optional[str]
+) -> HistoryPage:
+    """Filter and page entries given newest first, using an offset cursor."""
+    if limit <= 0:
+        return HistoryPage([])
+    matches = _filter_entries(entries, tree_name, decision, start, end)
+    offset = int(cursor) if cursor else 0
+    page = list(islice(matches, offset, offset + limit + 1))
+    next_cursor = str(offset + limit) if len(page) > limit else None
+    return HistoryPage(page[:limit], next_cursor)
+
+
+class JsonHistoryStore:
+    """History kept as a single JSON array, rewritten on every save."""
+
+    def __init__(self, path: Path, max_entries: int):
+        """
+        Initialize the store.
+
+        Args:
+            path: JSON file holding the history array
+            max_entries: Number of most recent entries to keep
+        """
+        self.path = path
+        self.max_entries = max_entries
+        if not self.path.exists():
+            self._save([])
+
+    def _load(self) -> List[Dict[str, Any]]:
+        """Load history from file."""
+        try:
+            if self.path.exists():
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except (json.JSONDecodeError, IOError):
+            pass
+        return []
+
+    def _save(self, history: List[Dict[str, Any]]) -> None:
+        """Save history to file."""
+        try:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(history, f, indent=2, ensure_ascii=False)
+        except IOError as e:
+            print(f"Error saving history: {e}")
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        """Add an entry, keeping only the most recent ``max_entries``."""
+        self.extend([entry])
+
+    def extend(self, entries: List[Dict[str, Any]]) -> None:
+        """Add several entries with one rewrite of the file."""
+        history = self._load()
+        history.extend(entries)
+        if self.max_entries and len(history) > self.max_entries:
+            history = history[-self.max_entries:]
+        self._save(history)
+
+    def recent(self, limit: int) -> List[Dict[str, Any]]:
+        """Return up to ``limit`` entries, most recent first."""
+        return list(reversed(self._load()[-limit:])) if limit > 0 else []
+
+    def query(self, tree_name=None, decision=None, start=None, end=None, limit=50, cursor=None) -> HistoryPage:
+        """Filter entries by scanning the whole array; see ``HistoryService.query_history``."""
+        return _filter_page(reversed(self._load()), tree_name, decision, start, end, limit, cursor)
+
+    def iter_entries(self, tree_name=None, decision=None, start=None, end=None) -> Iterator[Dict[str, Any]]:
+        """Yield matching entries oldest first; this backend loads the whole array."""
+        return _filter_entries(self._load(), tree_name, decision, start, end)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        self._save([])
+
+    def signature(self) -> Optional[tuple]:
+        """Return the file's modification time and size, or None if missing."""
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+
+class JsonlHistoryStore:
+    """
+    Append-only history log with one JSON object per line.
+
+    Saving is a single append. Reading the last entries scans the file
+    backwards in blocks, so it does not parse the whole log. The log is
+    compacted to ``max_entries`` once it holds twice that many lines
+    (never when ``max_entries`` is 0).
+    """
+
+    def __init__(self, path: Path, max_entries: int):
+        """
+        Initialize the store.
+
+        Args:
+            path: JSONL log file
+            max_entries: Number of most recent entries to keep
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self._lines = self._count_lines()
+
+    def _count_lines(self) -> int:
+        """Count entries in the log once at startup."""
+        try:
+            with open(self.path, 'rb') as f:
+                return sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 16), b""))
+        except FileNotFoundError:
+            return 0
+        except IOError as e:
+            print(f"Error reading history: {e}")
+            return 0
+
+    def _tail(self, limit: int) -> List[bytes]:
+        """Return the last ``limit`` complete lines, oldest first."""
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                position = f.tell()
+                data = b""
+                # One extra newline so the first kept line is complete
+                while position > 0 and data.count(b"\n") <= limit:
+                    step = min(TAIL_BLOCK_SIZE, position)
+                    position -= step
+                    f.seek(position)
+                    data = f.read(step) + data
+        except FileNotFoundError:
+            return []
+        except IOError as e:
+            print(f"Error reading history: {e}")
+            return []
+
+        lines = data.split(b"\n")
+        if position > 0:
+            lines = lines[1:]
+        return [line for line in lines if line.strip()][-limit:]
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        """Append an entry with a single write."""
+        self.extend([entry])
+
+    def extend(self, entries: List[Dict[str, Any]]) -> None:
+        """Append several entries with a single write."""
+        if self._write_lines(entries) and self.max_entries and self._lines >= 2 * self.max_entries:
+            self._compact()
+
+    def _write_lines(self, entries: List[Dict[str, Any]]) -> bool:
+        """Append entries to the log; return False if the write failed."""
+        data = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries)
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(data)
+        except IOError as e:
+            print(f"Error saving history: {e}")
+            return False
+        self._lines += len(entries)
+        return True
+
+    def _compact(self) -> None:
+        """Rewrite the log with only the most recent entries."""
+        lines = self._tail(self.max_entries)
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(b"".join(line + b"\n" for line in lines))
+            os.replace(tmp_path, self.path)
+            self._lines = len(lines)
+        except IOError as e:
+            print(f"Error compacting history: {e}")
+
+    def recent(self, limit: int) -> List[Dict[str, Any]]:
+        """Return up to ``limit`` entries, most recent first."""
+        if limit <= 0:
+            return []
+        entries = []
+        for line in reversed(self._tail(limit)):
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                # A torn final line from an interrupted write
+                continue
+        return entries
+
+    def query(self, tree_name=None, decision=None, start=None, end=None, limit=50, cursor=None) -> HistoryPage:
+        """Filter entries by scanning the whole log; see ``HistoryService.query_history``."""
+        return _filter_page(self._newest_first(), tree_name, decision, start, end, limit, cursor)
+
+    def _newest_first(self) -> Iterator[Dict[str, Any]]:
+        """Yield the log's entries newest first, parsing them lazily."""
+        try:
+            with open(self.path, 'rb') as f:
+                lines = f.read().split(b"\n")
+        except FileNotFoundError:
+            return
+        except IOError as e:
+            print(f"Error reading history: {e}")
+            return
+        yield from _parse_lines(reversed(lines))
+
+    def iter_entries(self, tree_name=None, decision=None, start=None, end=None) -> Iterator[Dict[str, Any]]:
+        """Yield matching entries oldest first, reading the log line by line."""
+        return _filter_entries(self._oldest_first(), tree_name, decision, start, end)
+
+    def _oldest_first(self) -> Iterator[Dict[str, Any]]:
+        """Stream the log's entries in the order they were written."""
+        try:
+            with open(self.path, 'rb') as f:
+                yield from _parse_lines(f)
+        except FileNotFoundError:
+            return
+        except IOError as e:
+            print(f"Error reading history: {e}")
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        try:
+            with open(self.path, 'w', encoding='utf-8'):
+                pass
+            self._lines = 0
+        except IOError as e:
+            print(f"Error clearing history: {e}")
+
+    def signature(self) -> Optional[tuple]:
+        """Return the file's modification time and size, or None if missing."""
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+
+class SegmentedJsonlHistoryStore(JsonlHistoryStore):
+    """
+    JSONL history log rotated into gzip-compressed segments.
+
+    The active log is closed once it reaches ``segment_bytes`` or its first
+    entry is older than ``segment_days``. Closed segments are gzipped into
+    ``segments_dir`` and listed in a manifest with their time range, entry
+    count and tree names, so queries open only the segments that can match
+    and read them lazily, newest first.
+
+    Retention drops whole segments: the oldest one goes once the newer ones
+    still hold ``max_entries`` entries, or once it ends before the
+    ``retention_days`` cutoff.
+    """
+
+    MANIFEST = "manifest.json"
+
+    def __init__(
+        self,
+        path: Path,
+        max_entries: int,
+        segments_dir: Path,
+        segment_bytes: int = 0,
+        segment_days: float = 0,
+        retention_days: int = 0
+    ):
+        """
+        Initialize the store.
+
+        Args:
+            path: Active JSONL log file
+            max_entries: Number of most recent entries to keep, 0 for no limit
+            segments_dir: Directory for closed segments and the manifest
+            segment_bytes: Size at which the active log is closed, 0 for no limit
+            segment_days: Age at which the active log is closed, 0 for no limit
+            retention_days: Age in days after which segments are dropped, 0 for no limit
+        """
+        super().__init__(path, max_entries)
+        self.segments_dir = segments_dir
+        self.segment_bytes = segment_bytes
+        self.segment_days = segment_days
+        self.retention_days = retention_days
+        self.segments_dir.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def manifest_path(self) -> Path:
+        """Path of the segment manifest."""
+        return self.segments_dir / self.MANIFEST
+
+    def segments(self) -> List[Dict[str, Any]]:
+        """
+        Get the closed segments, oldest first.
+
+        Returns:
+            Manifest records with file, start, end, count, bytes and trees
+        """
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)["segments"]
+        except FileNotFoundError:
+            return []
+        except (json.JSONDecodeError, KeyError, IOError) as e:
+            print(f"Error reading history manifest: {e}")
+            return []
+
+    def _save_segments(self, segments: List[Dict[str, Any]]) -> None:
+        """Replace the manifest atomically."""
+        tmp_path = self.manifest_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"segments": segments}, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+
+    def extend(self, entries: List[Dict[str, Any]]) -> None:
+        """Append entries, closing the active log when it is too old or too big."""
+        if self.segment_days and self._active_expired():
+            self.rotate()
+        if not self._write_lines(entries):
+            return
+        if self.segment_bytes and self.signature()[1] >= self.segment_bytes:
+            self.rotate()
+
+    def _first_entry(self) -> Optional[Dict[str, Any]]:
+        """Read the oldest entry of the active log."""
+        try:
+            with open(self.path, 'rb') as f:
+                return next(_parse_lines(iter(f.readline, b"")), None)
+        except FileNotFoundError:
+            return None
+
+    def _active_expired(self) -> bool:
+        """Whether the first entry of the active log is older than ``segment_days``."""
+        first = self._first_entry()
+        if not first or "timestamp" not in first:
+            return False
+        cutoff = datetime.now() - timedelta(days=self.segment_days)
+        return first["timestamp"] < cutoff.isoformat()
+
+    def rotate(self) -> Optional[Dict[str, Any]]:
+        """
+        Close the active log into a compressed segment.
+
+        Callers must hold the history file lock.
+
+        Returns:
+            Manifest record of the new segment, or None if the log was empty
+        """
+        try:
+            data = self.path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+        timestamps, trees, count = [], set(), 0
+        for entry in _parse_lines(data.split(b"\n")):
+            count += 1
+            if entry.get("timestamp"):
+                timestamps.append(entry["timestamp"])
+            trees.add(entry.get("tree_name", ""))
+        if not count:
+            return None
+
+        start = min(timestamps) if timestamps else ""
+        name = f"history-{start[:19].replace(':', '')}-{time.time_ns()}.jsonl.gz"
+        segment_path = self.segments_dir / name
+        tmp_path = segment_path.with_suffix(".tmp")
+        try:
+            with gzip.open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, segment_path)
+        except IOError as e:
+            print(f"Error archiving history segment: {e}")
+            return None
+
+        record = {
+            "file": name,
+            "start": start,
+            "end": max(timestamps) if timestamps else "",
+            "count": count,
+            "bytes": segment_path.stat().st_size,
+            "trees": sorted(trees)
+        }
+        segments = self.segments() + [record]
+        dropped = self._expired_segments(segments)
+        self._save_segments(segments[len(dropped):])
+
+        # Truncate only once the segment is recorded, so no entry is ever missing
+        with open(self.path, 'w', encoding='utf-8'):
+            pass
+        self._lines = 0
+        for segment in dropped:
+            (self.segments_dir / segment["file"]).unlink(missing_ok=True)
+        return record
+
+    def _expired_segments(self, segments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Get the leading segments that fall outside count and age retention."""
+        cutoff = None
+        if self.retention_days:
+            cutoff = (datetime.now() - timedelta(days=self.retention_days)).isoformat()
+        remaining = sum(segment["count"] for segment in segments)
+
+        dropped = []
+        for segment in segments[:-1] if segments else []:
+            over_count = self.max_entries and remaining - segment["count"] >= self.max_entries
+            too_old = cutoff is not None and segment["end"] < cutoff
+            if not (over_count or too_old):
+                break
+            dropped.append(segment)
+            remaining -= segment["count"]
+        return dropped
+
+    def _read_segment(self, segment: Dict[str, Any]) -> List[bytes]:
+        """Read the lines of one compressed segment."""
+        try:
+            with gzip.open(self.segments_dir / segment["file"], 'rb') as f:
+                return f.read().split(b"\n")
+        except (IOError, EOFError) as e:
+            print(f"Error reading history segment: {e}")
+            return []
+
+    def _archived_newest_first(
+        self,
+        tree_name: Optional[str] = None,
+        start: Timestamp = None,
+        end: Timestamp = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Yield archived entries newest first from segments that can match."""
+        start, end = _timestamp(start), _timestamp(end)
+        for segment in reversed(self.segments()):
+            if start is not None and segment["end"] < start:
+                # Segments are in time order, so nothing older can match
+                break
+            if end is not None and segment["start"] >= end:
+                continue
+            if tree_name is not None and tree_name not in segment["trees"]:
+                continue
+            yield from _parse_lines(reversed(self._read_segment(segment)))
+
+    def recent(self, limit: int) -> List[Dict[str, Any]]:
+        """Return up to ``limit`` entries, most recent first, reaching into segments if needed."""
+        entries = super().recent(limit)
+        if len(entries) < limit:
+            entries.extend(islice(self._archived_newest_first(), limit - len(entries)))
+        return entries
+
+    def query(self, tree_name=None, decision=None, start=None, end=None, limit=50, cursor=None) -> HistoryPage:
+        """Filter entries, opening only overlapping segments; see ``HistoryService.query_history``."""
+        entries = self._archived_newest_first(tree_name, start, end)
+        first = self._first_entry()
+        if first is not None and (end is None or first.get("timestamp", "") < _timestamp(end)):
+            entries = chain(self._newest_first(), entries)
+        return _filter_page(entries, tree_name, decision, start, end, limit, cursor)
+
+    def iter_entries(self, tree_name=None, decision=None, start=None, end=None) -> Iterator[Dict[str, Any]]:
+        """Yield matching entries oldest first, decompressing overlapping segments as a stream."""
+        return _filter_entries(
+            chain(self._archived_oldest_first(tree_name, start, end), self._oldest_first()),
+            tree_name, decision, start, end
+        )
+
+    def _archived_oldest_first(
+        self,
+        tree_name: Optional[str] = None,
+        start: Timestamp = None,
+        end: Timestamp = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Stream archived entries oldest first from segments that can match."""
+        start, end = _timestamp(start), _timestamp(end)
+        for segment in self.segments():
+            if start is not None and segment["end"] < start:
+                continue
+            if end is not None and segment["start"] >= end:
+                break
+            if tree_name is not None and tree_name not in segment["trees"]:
+                continue
+            try:
+                with gzip.open(self.segments_dir / segment["file"], 'rb') as f:
+                    yield from _parse_lines(f)
+            except (IOError, EOFError) as e:
+                print(f"Error reading history segment: {e}")
+
+    def clear(self) -> None:
+        """Remove all entries, including closed segments."""
+        super().clear()
+        for segment in self.segments():
+            (self.segments_dir / segment["file"]).unlink(missing_ok=True)
+        self._save_segments([])
+
+
+class SqliteHistoryStore:
+    """
+    History kept in a SQLite database in WAL mode.
+
+    Filters on tree, decision and date range are answered from indexes, and
+    pages are addressed by a ``(timestamp, id)`` keyset cursor so deep pages
+    cost the same as the first one. Retention by count and by age is applied
+    when the store opens and every ``PRUNE_EVERY`` saves.
+    """
+
+    PRUNE_EVERY = 100
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS history (
+            id INTEGER PRIMARY KEY,
+            timestamp TEXT NOT NULL,
+            tree_name TEXT NOT NULL,
+            decision TEXT,
+            explanation TEXT,
+            path TEXT NOT NULL,
+            answers TEXT NOT NULL,
+            metadata TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_history_tree_time ON history (tree_name, timestamp);
+        CREATE INDEX IF NOT EXISTS idx_history_decision ON history (decision, timestamp);
+        CREATE INDEX IF NOT EXISTS idx_history_time ON history (timestamp);
+    """
+
+    COLUMNS = "id, timestamp, tree_name, decision, explanation, path, answers, metadata"
+
+    def __init__(self, path: Path, max_entries: int = 0, retention_days: int = 0):
+        """
+        Open or create the database.
+
+        Args:
+            path: SQLite database file
+            max_entries: Number of most recent entries to keep, 0 for no limit
+            retention_days: Age in days after which entries are dropped, 0 for no limit
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._saves = 0
+        # One shared connection; the lock serializes use across Streamlit threads
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+        self.prune()
+
+    @staticmethod
+    def _row(entry: Dict[str, Any]) -> tuple:
+        """Convert an entry to column values."""
+        return (
+            entry.get("timestamp") or datetime.now().isoformat(),
+            entry.get("tree_name", ""),
+            entry.get("decision"),
+            entry.get("explanation"),
+            json.dumps(entry.get("path") or [], ensure_ascii=False),
+            json.dumps(entry.get("answers") or {}, ensure_ascii=False),
+            json.dumps(entry.get("metadata") or {}, ensure_ascii=False)
+        )
+
+    @staticmethod
+    def _entry(row: tuple) -> Dict[str, Any]:
+        """Convert a result row to an entry."""
+        return {
+            "timestamp": row[1],
+            "tree_name": row[2],
+            "decision": row[3],
+            "explanation": row[4],
+            "path": json.loads(row[5]),
+            "answers": json.loads(row[6]),
+            "metadata": json.loads(row[7])
+        }
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        """Insert an entry."""
+        self.extend([entry])
+
+    def extend(self, entries: List[Dict[str, Any]]) -> None:
+        """Insert several entries in one transaction."""
+        try:
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "INSERT INTO history (timestamp, tree_name, decision, explanation, path, answers, metadata) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [self._row(entry) for entry in entries]
+                )
+        except sqlite3.Error as e:
+            print(f"Error saving history: {e}")
+            return
+
+        self._saves += len(entries)
+        if self._saves >= self.PRUNE_EVERY:
+            self.prune()
+
+    def prune(self) -> int:
+        """
+        Apply count and age retention.
+
+        Returns:
+            Number of entries removed
+        """
+        removed = 0
+        try:
+            with self._lock, self._conn:
+                if self.retention_days > 0:
+                    cutoff = (datetime.now() - timedelta(days=self.retention_days)).isoformat()
+                    removed += self._conn.execute(
+                        "DELETE FROM history WHERE timestamp < ?", (cutoff,)
+                    ).rowcount
+                if self.max_entries > 0:
+                    removed += self._conn.execute(
+                        "DELETE FROM history WHERE id <= "
+                        "(SELECT id FROM history ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                        (self.max_entries,)
+                    ).rowcount
+                self._saves = 0
+        except sqlite3.Error as e:
+            print(f"Error pruning history: {e}")
+        return removed
+
+    def recent(self, limit: int) -> List[Dict[str, Any]]:
+        """Return up to ``limit`` entries, most recent first."""
+        return self.query(limit=limit).entries if limit > 0 else []
+
+    @staticmethod
+    def _where(tree_name, decision, start, end) -> Tuple[List[str], List[Any]]:
+        """Build WHERE clauses and parameters for the common filters."""
+        clauses, params = [], []
+        if tree_name is not None:
+            clauses.append("tree_name = ?")
+            params.append(tree_name)
+        if decision is not None:
+            clauses.append("decision = ?")
+            params.append(decision)
+        if start is not None:
+            clauses.append("timestamp >= ?")
+            params.append(_timestamp(start))
+        if end is not None:
+            clauses.append("timestamp < ?")
+            params.append(_timestamp(end))
+        return clauses, params
+
+    def query(self, tree_name=None, decision=None, start=None, end=None, limit=50, cursor=None) -> HistoryPage:
+        """Filter entries with an indexed query; see ``HistoryService.query_history``."""
+        if limit <= 0:
+            return HistoryPage([])
+        clauses, params = self._where(tree_name, decision, start, end)
+        if cursor:
+            row_id, timestamp = cursor.split(":", 1)
+            clauses.append("(timestamp, id) < (?, ?)")
+            params.extend([timestamp, int(row_id)])
+
+        sql = f"SELECT {self.COLUMNS} FROM history"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        try:
+            with self._lock:
+                rows = self._conn.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            print(f"Error reading history: {e}")
+            return HistoryPage([])
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = f"{rows[-1][0]}:{rows[-1][1]}"
+        return HistoryPage([self._entry(row) for row in rows], next_cursor)
+
+    def iter_entries(self, tree_name=None, decision=None, start=None, end=None) -> Iterator[Dict[str, Any]]:
+        """
+        Yield matching entries oldest first.
+
+        Uses its own connection, so a long export neither holds the store
+        lock nor blocks writers (WAL readers see a consistent snapshot).
+        """
+        clauses, params = self._where(tree_name, decision, start, end)
+        sql = f"SELECT {self.COLUMNS} FROM history"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY timestamp, id"
+
+        conn = sqlite3.connect(str(self.path))
+        try:
+            rows = conn.execute(sql, params)
+            while True:
+                batch = rows.fetchmany(1000)
+                if not batch:
+                    break
+                for row in batch:
+                    yield self._entry(row)
+        except sqlite3.Error as e:
+            print(f"Error reading history: {e}")
+        finally:
+            conn.close()
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        try:
+            with self._lock, self._conn:
+                self._conn.execute("DELETE FROM history")
+        except sqlite3.Error as e:
+            print(f"Error clearing history: {e}")
+
+    def signature(self) -> Optional[int]:
+        """
+        Return a token that changes when another connection commits.
+
+        SQLite's ``data_version`` plays the role of the file stores'
+        mtime/size check, which WAL mode would otherwise hide.
+        """
+        try:
+            with self._lock:
+                return self._conn.execute("PRAGMA data_version").fetchone()[0]
+        except sqlite3.Error:
+            return None
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,149 @@
+"""Precomputed outcome tables for finite-option decision trees."""
+import json
+import sys
+from array import array
+from itertools import product
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from models.compiled_tree import CompiledTree
+from models.decision_tree import DecisionResult
+
+# (decision, explanation, path, decision_type, metadata) of a complete result
+_Entry = Tuple[str, str, Tuple[str, ...], Any, Tuple[Tuple[str, Any], ...]]
+
+
+class OutcomeTable:
+    """
+    Perfect-hash table of every complete answer combination of a tree.
+
+    Each question contributes one mixed-radix digit: 0 when unanswered and
+    ``option_index + 1`` otherwise. The digits form a dense slot number, so
+    a probe is one dict lookup per question and one array read.
+    """
+
+    def __init__(
+        self,
+        tree_name: str,
+        digits: List[Tuple[str, Dict[str, int], int]],
+        slots: array,
+        entries: List[_Entry]
+    ):
+        """
+        Initialize the table.
+
+        Args:
+            tree_name: Name of the tree the table was built from
+            digits: Per question (question ID, answer -> digit, stride)
+            slots: Entry index per slot, -1 where no decision is reached
+            entries: Distinct complete results
+        """
+        self.tree_name = tree_name
+        self._digits = digits
+        self._slots = slots
+        self._entries = entries
+
+    @classmethod
+    def build(
+        cls,
+        tree: CompiledTree,
+        evaluate: Callable[[CompiledTree, Dict[str, Any]], DecisionResult],
+        max_entries: int
+    ) -> Optional["OutcomeTable"]:
+        """
+        Enumerate the full answer space of a tree.
+
+        Args:
+            tree: Compiled tree to enumerate
+            evaluate: Walker used to compute each slot's result
+            max_entries: Size budget in slots
+
+        Returns:
+            OutcomeTable, or None if the answer space exceeds the budget
+        """
+        questions = tree.question_nodes()
+        size = 1
+        for node in questions:
+            size *= len(tree.options[node]) + 1
+            if size > max_entries:
+                return None
+
+        digits = []
+        stride = 1
+        for node in reversed(questions):
+            answers = {answer: i + 1 for i, answer in enumerate(tree.options[node])}
+            digits.append((tree.node_ids[node], answers, stride))
+            stride *= len(answers) + 1
+        digits.reverse()
+
+        slots = array("i", [-1]) * size
+        entries: List[_Entry] = []
+        entry_index: Dict[Tuple[Any, ...], int] = {}
+        choices = [(None,) + tree.options[node] for node in questions]
+        question_ids = [tree.node_ids[node] for node in questions]
+
+        for slot, combination in enumerate(product(*choices)):
+            answers = {
+                question_id: answer
+                for question_id, answer in zip(question_ids, combination)
+                if answer is not None
+            }
+            result = evaluate(tree, answers)
+            if result.decision is None:
+                continue
+            entry = (
+                result.decision,
+                result.explanation,
+                tuple(result.path),
+                result.decision_type,
+                tuple(sorted(result.metadata.items()))
+            )
+            # Metadata values may be lists or dicts, so dedupe on their JSON form
+            key = entry[:4] + (json.dumps(result.metadata, sort_keys=True, default=repr),)
+            if key not in entry_index:
+                entry_index[key] = len(entries)
+                entries.append(entry)
+            slots[slot] = entry_index[key]
+
+        return cls(tree.name, digits, slots, entries)
+
+    def probe(self, answers: Dict[str, Any]) -> Optional[DecisionResult]:
+        """
+        Look up the result for a set of answers.
+
+        Args:
+            answers: Dictionary of question IDs to answers
+
+        Returns:
+            DecisionResult, or None if the answers do not reach a decision
+        """
+        slot = 0
+        for question_id, digits, stride in self._digits:
+            slot += digits.get(answers.get(question_id), 0) * stride
+
+        index = self._slots[slot]
+        if index < 0:
+            return None
+
+        decision, explanation, path, decision_type, metadata = self._entries[index]
+        return DecisionResult(decision, explanation, list(path), decision_type, dict(metadata))
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Report table size and approximate memory use.
+
+        Returns:
+            Dictionary with slot, filled slot, entry and byte counts
+        """
+        entry_bytes = sum(
+            sys.getsizeof(entry)
+            + sys.getsizeof(entry[0])
+            + sys.getsizeof(entry[1])
+            + sys.getsizeof(entry[2])
+            + sum(sys.getsizeof(step) for step in entry[2])
+            for entry in self._entries
+        )
+        return {
+            "slots": len(self._slots),
+            "filled": sum(1 for index in self._slots if index >= 0),
+            "entries": len(self._entries),
+            "bytes": self._slots.itemsize * len(self._slots) + entry_bytes
+        }
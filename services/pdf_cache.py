@@ -0,0 +1,210 @@
+"""Content-addressed cache of rendered PDF reports."""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, Optional
+from models.decision_tree import DecisionResult
+from utils.config import Config
+from utils.metrics import REGISTRY
+
+
+def cache_key(result: DecisionResult, tree_name: str, generated: date) -> str:
+    """
+    Address a report by the content it is rendered from.
+
+    Args:
+        result: Decision result shown in the report
+        tree_name: Name of the decision tree used
+        generated: Date printed on the report
+
+    Returns:
+        Hex SHA-256 of the tree name, date, decision, explanation and path
+    """
+    content = json.dumps(
+        [tree_name, generated.isoformat(), result.decision, result.explanation, list(result.path or [])],
+        ensure_ascii=False,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class PDFCache:
+    """
+    LRU cache of rendered PDFs bounded by total bytes.
+
+    Entries evicted from memory are spilled to ``spill_dir`` when one is
+    given, itself bounded by ``max_disk_bytes`` and evicted oldest first,
+    and a disk hit moves the entry back into memory.
+    """
+
+    def __init__(
+        self,
+        max_bytes: Optional[int] = None,
+        spill_dir: Optional[Path] = None,
+        max_disk_bytes: Optional[int] = None
+    ):
+        """
+        Initialize the cache, indexing any PDFs already spilled to disk.
+
+        Args:
+            max_bytes: Memory budget (defaults to Config.PDF_CACHE_BYTES)
+            spill_dir: Directory for evicted entries; None keeps them in memory only
+            max_disk_bytes: Disk budget (defaults to Config.PDF_CACHE_DISK_BYTES)
+        """
+        self.max_bytes = max_bytes if max_bytes is not None else Config.PDF_CACHE_BYTES
+        self.max_disk_bytes = max_disk_bytes if max_disk_bytes is not None else Config.PDF_CACHE_DISK_BYTES
+        self.spill_dir = spill_dir
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._requests = {
+            outcome: REGISTRY.counter(
+                "decisionguide_pdf_cache_requests_total",
+                "PDF cache lookups by outcome.",
+                {"result": outcome}
+            )
+            for outcome in ("hit", "disk_hit", "miss")
+        }
+        if spill_dir is not None:
+            self._index_disk()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Look up a rendered PDF.
+
+        Args:
+            key: Key from ``cache_key``
+
+        Returns:
+            PDF bytes, or None on a miss
+        """
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                self._count("hit")
+                return data
+
+            data = self._read_spilled(key)
+            if data is None:
+                self._stats["misses"] += 1
+                self._count("miss")
+                return None
+            self._stats["disk_hits"] += 1
+            self._count("disk_hit")
+            self._store(key, data)
+            return data
+
+    def put(self, key: str, data: bytes) -> None:
+        """
+        Cache a rendered PDF, evicting least recently used entries to fit.
+
+        Args:
+            key: Key from ``cache_key``
+            data: PDF bytes
+        """
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            self._store(key, data)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache counters.
+
+        Returns:
+            Dictionary with hit, disk hit, miss and eviction counts, plus
+            entries and bytes held in memory and on disk
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update(
+                entries=len(self._entries),
+                bytes=self._bytes,
+                disk_entries=len(self._disk),
+                disk_bytes=self._disk_bytes
+            )
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def clear(self) -> None:
+        """Drop every entry from memory and disk."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            for key in list(self._disk):
+                self._drop_spilled(key)
+
+    def _store(self, key: str, data: bytes) -> None:
+        """Insert an entry and evict to the memory budget; call with the lock held."""
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= len(previous)
+        self._entries[key] = data
+        self._bytes += len(data)
+        while self._bytes > self.max_bytes and self._entries:
+            evicted_key, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self._stats["evictions"] += 1
+            self._spill(evicted_key, evicted)
+
+    def _spill(self, key: str, data: bytes) -> None:
+        """Write an evicted entry to disk and evict old spilled files; call with the lock held."""
+        if self.spill_dir is None or key in self._disk or len(data) > self.max_disk_bytes:
+            return
+        path = self.spill_dir / f"{key}.pdf"
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except IOError as e:
+            print(f"Error spilling PDF to cache: {e}")
+            return
+        self._disk[key] = len(data)
+        self._disk_bytes += len(data)
+        while self._disk_bytes > self.max_disk_bytes:
+            self._drop_spilled(next(iter(self._disk)))
+
+    def _read_spilled(self, key: str) -> Optional[bytes]:
+        """Read a spilled entry and remove its file; call with the lock held."""
+        if key not in self._disk:
+            return None
+        try:
+            data = (self.spill_dir / f"{key}.pdf").read_bytes()
+        except IOError:
+            data = None
+        self._drop_spilled(key)
+        return data
+
+    def _drop_spilled(self, key: str) -> None:
+        """Delete a spilled entry; call with the lock held."""
+        self._disk_bytes -= self._disk.pop(key)
+        try:
+            (self.spill_dir / f"{key}.pdf").unlink()
+        except FileNotFoundError:
+            pass
+
+    def _index_disk(self) -> None:
+        """Pick up PDFs spilled by an earlier run, oldest first."""
+        self.spill_dir.mkdir(parents=True, exist_ok=True)
+        files = sorted(self.spill_dir.glob("*.pdf"), key=lambda path: path.stat().st_mtime)
+        for path in files:
+            size = path.stat().st_size
+            self._disk[path.stem] = size
+            self._disk_bytes += size
+        while self._disk_bytes > self.max_disk_bytes:
+            self._drop_spilled(next(iter(self._disk)))
+
+    def _count(self, outcome: str) -> None:
+        """Count a lookup in the metrics registry."""
+        if Config.ENABLE_METRICS:
+            self._requests[outcome].inc()
@@ -0,0 +1,247 @@
+"""Bounded background queue for PDF rendering."""
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+from models.decision_tree import DecisionResult
+from models.pdf_job import JobStatus, PDFJob
+from services.pdf_service import PDFService
+from utils.config import Config
+from utils.metrics import REGISTRY
+
+
+class PDFJobRejected(Exception):
+    """Raised when a PDF job would exceed the queue or per-session limit."""
+
+
+class PDFJobQueue:
+    """
+    Renders PDFs on a small thread pool and hands out job handles.
+
+    At most ``max_queued`` jobs wait or render at once across all sessions,
+    and each session may have at most ``per_session`` unfinished jobs, so a
+    burst of exports cannot grow the backlog without bound or be taken over
+    by one user. Finished jobs are kept for ``job_ttl`` seconds so the UI
+    can pick up the result when it next polls.
+    """
+
+    def __init__(
+        self,
+        pdf_service: PDFService,
+        workers: Optional[int] = None,
+        max_queued: Optional[int] = None,
+        per_session: Optional[int] = None,
+        job_ttl: Optional[float] = None,
+        output: Optional[str] = None
+    ):
+        """
+        Initialize the queue; worker threads start with the first job.
+
+        Args:
+            pdf_service: Service that renders the reports
+            workers: Rendering threads (defaults to Config.PDF_WORKERS)
+            max_queued: Unfinished jobs allowed in total (defaults to Config.PDF_MAX_QUEUED)
+            per_session: Unfinished jobs allowed per session (defaults to Config.PDF_JOBS_PER_SESSION)
+            job_ttl: Seconds a finished job is kept (defaults to Config.PDF_JOB_TTL)
+            output: "memory" to keep the PDF bytes on the job, "file" to
+                write them to the data directory (defaults to Config.PDF_OUTPUT)
+        """
+        self.pdf_service = pdf_service
+        self.max_queued = max_queued if max_queued is not None else Config.PDF_MAX_QUEUED
+        self.per_session = per_session if per_session is not None else Config.PDF_JOBS_PER_SESSION
+        self.job_ttl = job_ttl if job_ttl is not None else Config.PDF_JOB_TTL
+        self.output = output or Config.PDF_OUTPUT
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, workers if workers is not None else Config.PDF_WORKERS),
+            thread_name_prefix="pdf-render"
+        )
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, PDFJob] = {}
+        self._unfinished: Dict[str, int] = defaultdict(int)
+        self._stats = {
+            "submitted": 0,
+            "cached": 0,
+            "done": 0,
+            "failed": 0,
+            "rejected": 0,
+            "total_wait_ms": 0.0,
+            "total_run_ms": 0.0,
+            "max_depth": 0
+        }
+        self._depth_gauge = REGISTRY.gauge(
+            "decisionguide_pdf_queue_depth",
+            "PDF jobs waiting or rendering."
+        )
+        self._wait_histogram = REGISTRY.histogram(
+            "decisionguide_pdf_job_wait_seconds",
+            "Time PDF jobs spent queued before rendering started."
+        )
+        self._run_histogram = REGISTRY.histogram(
+            "decisionguide_pdf_job_run_seconds",
+            "Time spent rendering PDF jobs."
+        )
+        self._outcomes = {
+            status: REGISTRY.counter(
+                "decisionguide_pdf_jobs_total",
+                "PDF jobs by final status.",
+                {"status": status}
+            )
+            for status in ("done", "failed", "rejected")
+        }
+
+    @property
+    def depth(self) -> int:
+        """Number of jobs waiting or rendering."""
+        return sum(self._unfinished.values())
+
+    def submit(self, session_id: str, result: DecisionResult, tree_name: str) -> PDFJob:
+        """
+        Queue a PDF render.
+
+        Args:
+            session_id: ID of the requesting session, for its job limit
+            result: Decision result to render
+            tree_name: Name of the decision tree used
+
+        Returns:
+            Handle whose status changes as the job runs; already done when
+            the report was cached
+
+        Raises:
+            PDFJobRejected: If the session or the queue is at its limit
+        """
+        now = time.monotonic()
+        if self.output != "file":
+            data = self.pdf_service.cached_pdf(result, tree_name)
+            if data is not None:
+                job = PDFJob(
+                    id=uuid.uuid4().hex,
+                    session_id=session_id,
+                    tree_name=tree_name,
+                    submitted_at=now,
+                    status=JobStatus.DONE,
+                    started_at=now,
+                    finished_at=now,
+                    file_name=PDFService.report_filename(),
+                    data=data
+                )
+                with self._lock:
+                    self._prune(now)
+                    self._jobs[job.id] = job
+                    self._stats["cached"] += 1
+                return job
+
+        with self._lock:
+            self._prune(now)
+            reason = None
+            unfinished = self._unfinished.get(session_id, 0)
+            if unfinished >= self.per_session:
+                reason = f"You already have {unfinished} PDF export(s) in progress."
+            elif self.depth >= self.max_queued:
+                reason = "The PDF export queue is full. Please try again shortly."
+            if reason is not None:
+                self._stats["rejected"] += 1
+                self._record("rejected")
+                raise PDFJobRejected(reason)
+
+            job = PDFJob(id=uuid.uuid4().hex, session_id=session_id, tree_name=tree_name, submitted_at=now)
+            self._jobs[job.id] = job
+            self._unfinished[session_id] += 1
+            self._stats["submitted"] += 1
+            depth = self.depth
+            self._stats["max_depth"] = max(self._stats["max_depth"], depth)
+            if Config.ENABLE_METRICS:
+                self._depth_gauge.set(depth)
+
+        self._executor.submit(self._run, job, result)
+        return job
+
+    def get(self, job_id: str) -> Optional[PDFJob]:
+        """
+        Look up a job.
+
+        Args:
+            job_id: ID from the handle returned by ``submit``
+
+        Returns:
+            The job, or None if it is unknown or expired
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get queue counters.
+
+        Returns:
+            Dictionary with current depth, job counts by outcome and average
+            wait and render time in milliseconds
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["queue_depth"] = self.depth
+        started = stats["done"] + stats["failed"]
+        stats["avg_wait_ms"] = stats["total_wait_ms"] / started if started else 0.0
+        stats["avg_run_ms"] = stats["total_run_ms"] / started if started else 0.0
+        return stats
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop accepting work and optionally wait for queued jobs."""
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job: PDFJob, result: DecisionResult) -> None:
+        """Render one job on a worker thread."""
+        started = time.monotonic()
+        with self._lock:
+            job.status = JobStatus.RUNNING
+            job.started_at = started
+
+        path, data, error = None, None, None
+        try:
+            if self.output == "file":
+                path = self.pdf_service.generate_pdf(result, job.tree_name)
+            else:
+                # submit already looked the report up in the cache
+                data = self.pdf_service.render_pdf(result, job.tree_name, lookup=False)
+            if path is None and data is None:
+                error = "PDF generation failed."
+        except Exception as e:
+            error = f"PDF generation failed: {e}"
+
+        finished = time.monotonic()
+        with self._lock:
+            job.path = path
+            job.data = data
+            job.file_name = path.name if path is not None else PDFService.report_filename()
+            job.error = error
+            job.finished_at = finished
+            job.status = JobStatus.FAILED if error else JobStatus.DONE
+            self._unfinished[job.session_id] -= 1
+            if not self._unfinished[job.session_id]:
+                del self._unfinished[job.session_id]
+            self._stats[job.status.value] += 1
+            self._stats["total_wait_ms"] += (started - job.submitted_at) * 1000
+            self._stats["total_run_ms"] += (finished - started) * 1000
+            depth = self.depth
+
+        self._record(job.status.value)
+        if Config.ENABLE_METRICS:
+            self._depth_gauge.set(depth)
+            self._wait_histogram.observe(started - job.submitted_at)
+            self._run_histogram.observe(finished - started)
+
+    def _record(self, outcome: str) -> None:
+        """Count a job outcome in the metrics registry."""
+        if Config.ENABLE_METRICS:
+            self._outcomes[outcome].inc()
+
+    def _prune(self, now: float) -> None:
+        """Forget jobs that finished more than ``job_ttl`` seconds ago; call with the lock held."""
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished and now - job.finished_at > self.job_ttl
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
@@ -1,9 +1,12 @@
 """PDF export service for decision results."""
-from typing import Optional
-from datetime import datetime
+import io
+from typing import BinaryIO, Optional, Union
+from datetime import date, datetime
 from pathlib import Path
 from models.decision_tree import DecisionResult
+from services.pdf_cache import PDFCache, cache_key
 from utils.config import Config
+from utils.metrics import timed
 
 try:
     from reportlab.lib.pagesizes import letter
@@ -17,14 +20,34 @@ except ImportError:
 
 
 class PDFService:
-    """Service for generating PDF reports from decision results."""
+    """
+    Service for generating PDF reports from decision results.
     
-    def __init__(self):
-        """Initialize PDF service."""
+    Reports are rendered into memory with ``render_pdf``, or written to a
+    file with ``generate_pdf``. In-memory renders are cached by content, so
+    exporting the same result again skips the layout. Cached reports carry
+    the date they were generated rather than the time, so a cached report
+    is only reused on the day it was rendered; all other reports carry the
+    full timestamp.
+    """
+    
+    def __init__(self, cache: Optional[PDFCache] = None):
+        """
+        Initialize PDF service.
+        
+        Args:
+            cache: Render cache; defaults to one sized by Config.PDF_CACHE_BYTES,
+                or none when that is 0
+        """
         self.available = REPORTLAB_AVAILABLE and Config.ENABLE_PDF_EXPORT
         if not REPORTLAB_AVAILABLE:
             print("Warning: reportlab not installed. PDF export disabled.")
+        if cache is None and Config.PDF_CACHE_BYTES > 0:
+            spill_dir = Path(Config.PDF_CACHE_DIR) if Config.PDF_CACHE_DIR else None
+            cache = PDFCache(spill_dir=spill_dir)
+        self.cache = cache
     
+    @timed("generate_pdf")
     def generate_pdf(
         self, 
         result: DecisionResult, 
@@ -46,70 +69,149 @@ class PDFService:
             return None
         
         if output_path is None:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"decision_report_{timestamp}.pdf"
-            output_path = Config.DATA_DIR / filename
+            output_path = Config.DATA_DIR / self.report_filename()
         
         try:
-            doc = SimpleDocTemplate(str(output_path), pagesize=letter)
-            story = []
-            styles = getSampleStyleSheet()
-            
-            # Title
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Heading1'],
-                fontSize=24,
-                textColor='#1f77b4',
-                spaceAfter=30,
-                alignment=TA_CENTER
-            )
-            story.append(Paragraph("DecisionGuide Report", title_style))
-            story.append(Spacer(1, 0.2*inch))
-            
-            # Metadata
-            meta_style = ParagraphStyle(
-                'Meta',
-                parent=styles['Normal'],
-                fontSize=10,
-                textColor='#666666'
-            )
-            story.append(Paragraph(f"<b>Tree:</b> {tree_name}", meta_style))
-            story.append(Paragraph(
-                f"<b>Generated:</b> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-                meta_style
-            ))
-            story.append(Spacer(1, 0.3*inch))
-            
-            # Decision
-            if result.decision:
-                decision_style = ParagraphStyle(
-                    'Decision',
-                    parent=styles['Heading2'],
-                    fontSize=16,
-                    textColor='#2ca02c',
-                    spaceAfter=12
-                )
-                story.append(Paragraph("<b>Decision:</b>", decision_style))
-                story.append(Paragraph(result.decision, styles['Normal']))
-                story.append(Spacer(1, 0.2*inch))
-            
-            # Explanation
-            if result.explanation:
-                story.append(Paragraph("<b>Explanation:</b>", styles['Heading3']))
-                story.append(Paragraph(result.explanation, styles['Normal']))
-                story.append(Spacer(1, 0.2*inch))
-            
-            # Path
-            if result.path:
-                story.append(Paragraph("<b>Decision Path:</b>", styles['Heading3']))
-                for step in result.path:
-                    story.append(Paragraph(f"• {step}", styles['Normal']))
-            
-            doc.build(story)
+            self._build(str(output_path), result, tree_name, self._timestamp())
             return output_path
+        except Exception as e:
+            print(f"Error generating PDF: {e}")
+            return None
+    
+    @timed("render_pdf")
+    def render_pdf(self, result: DecisionResult, tree_name: str, lookup: bool = True) -> Optional[bytes]:
+        """
+        Render a PDF report into memory, without touching the data directory.
+        
+        Args:
+            result: DecisionResult object
+            tree_name: Name of the decision tree used
+            lookup: Return a cached report if there is one; pass False when
+                ``cached_pdf`` already missed, so the miss is counted once.
+                The render is cached either way.
             
+        Returns:
+            PDF bytes or None if generation failed
+        """
+        if not self.available:
+            return None
+        
+        generated = self._timestamp()
+        key = None
+        if self.cache is not None:
+            today = date.today()
+            generated = today.isoformat()
+            key = cache_key(result, tree_name, today)
+            data = self.cache.get(key) if lookup else None
+            if data is not None:
+                return data
+        
+        buffer = io.BytesIO()
+        try:
+            self._build(buffer, result, tree_name, generated)
         except Exception as e:
             print(f"Error generating PDF: {e}")
             return None
+        data = buffer.getvalue()
+        if key is not None:
+            self.cache.put(key, data)
+        return data
+    
+    def cached_pdf(self, result: DecisionResult, tree_name: str) -> Optional[bytes]:
+        """
+        Get a previously rendered report without rendering.
+        
+        Args:
+            result: DecisionResult object
+            tree_name: Name of the decision tree used
+            
+        Returns:
+            PDF bytes, or None if the report is not cached
+        """
+        if not self.available or self.cache is None:
+            return None
+        return self.cache.get(cache_key(result, tree_name, date.today()))
+    
+    @staticmethod
+    def report_filename() -> str:
+        """Name a report after the current time, unique to the microsecond."""
+        return f"decision_report_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.pdf"
+    
+    @staticmethod
+    def _timestamp() -> str:
+        """Format the current time for reports that are not cached."""
+        return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    
+    def _build(
+        self,
+        target: Union[str, BinaryIO],
+        result: DecisionResult,
+        tree_name: str,
+        generated: str
+    ) -> None:
+        """
+        Lay out the report and write it to a file name or binary stream.
+        
+        Args:
+            target: Output file name or writable binary stream
+            result: DecisionResult object
+            tree_name: Name of the decision tree used
+            generated: Generation time or date printed on the report
+        """
+        doc = SimpleDocTemplate(target, pagesize=letter)
+        story = []
+        styles = getSampleStyleSheet()
+        
+        # Title
+        title_style = ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=24,
+            textColor='#1f77b4',
+            spaceAfter=30,
+            alignment=TA_CENTER
+        )
+        story.append(Paragraph("DecisionGuide Report", title_style))
+        story.append(Spacer(1, 0.2*inch))
+        
+        # Metadata
+        meta_style = ParagraphStyle(
+            'Meta',
+            parent=styles['Normal'],
+            fontSize=10,
+            textColor='#666666'
+        )
+        story.append(Paragraph(f"<b>Tree:</b> {tree_name}", meta_style))
+        story.append(Paragraph(
+            f"<b>Generated:</b> {generated}",
+            meta_style
+        ))
+        story.append(Spacer(1, 0.3*inch))
+        
+        # Decision
+        if result.decision:
+            decision_style = ParagraphStyle(
+                'Decision',
+                parent=styles['Heading2'],
+                fontSize=16,
+                textColor='#2ca02c',
+                spaceAfter=12
+            )
+            story.append(Paragraph("<b>Decision:</b>", decision_style))
+            story.append(Paragraph(result.decision, styles['Normal']))
+            story.append(Spacer(1, 0.2*inch))
+        
+        # Explanation
+        if result.explanation:
+            story.append(Paragraph("<b>Explanation:</b>", styles['Heading3']))
+            story.append(Paragraph(result.explanation, styles['Normal']))
+            story.append(Spacer(1, 0.2*inch))
+        
+        # Path
+        if result.path:
+            story.append(Paragraph("<b>Decision Path:</b>", styles['Heading3']))
+            for step in result.path:
+                story.append(Paragraph(f"• {step}", styles['Normal']))
+        
+        doc.build(story)
 
@@ -0,0 +1,214 @@
+"""On-disk cache of compiled trees keyed by source content hash."""
+import hashlib
+import marshal
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Set, Tuple
+from models.compiled_tree import CompiledOutcome, CompiledTree, NodeKind
+from models.decision_tree import DecisionType
+from services.tree_compiler import ENGINE_VERSION
+
+
+def _dump_tree(tree: CompiledTree) -> Dict[str, Any]:
+    """Convert a compiled tree to builtins that marshal can store."""
+    return {
+        "name": tree.name,
+        "title": tree.title,
+        "description": tree.description,
+        "start": tree.start,
+        "node_ids": tree.node_ids,
+        "kinds": [int(kind) for kind in tree.kinds],
+        "labels": tree.labels,
+        "texts": tree.texts,
+        "help_texts": tree.help_texts,
+        "options": tree.options,
+        "option_index": tree.option_index,
+        "transitions": tree.transitions,
+        "scores": tree.scores,
+        "values": tree.values,
+        "outcomes": [
+            None if outcome is None else (
+                outcome.id,
+                outcome.decision,
+                outcome.explanation,
+                outcome.decision_type.value if outcome.decision_type else None,
+                outcome.metadata,
+                outcome.templated
+            )
+            for outcome in tree.outcomes
+        ],
+        "band_limits": tree.band_limits,
+        "band_nodes": tree.band_nodes,
+        "templated": tree.templated,
+        "remaining_depth": tree.remaining_depth,
+        "reachable_outcomes": tree.reachable_outcomes,
+        "question_counts": tree.question_counts
+    }
+
+
+def _load_tree(data: Dict[str, Any]) -> CompiledTree:
+    """Rebuild a compiled tree from its marshalled form."""
+    data = dict(data)
+    data["kinds"] = [NodeKind(kind) for kind in data["kinds"]]
+    data["outcomes"] = [
+        None if outcome is None else CompiledOutcome(
+            id=outcome[0],
+            decision=outcome[1],
+            explanation=outcome[2],
+            decision_type=DecisionType(outcome[3]) if outcome[3] else None,
+            metadata=outcome[4],
+            templated=outcome[5]
+        )
+        for outcome in data["outcomes"]
+    ]
+    return CompiledTree(**data)
+
+
+# Seconds after which a temporary file is taken to be left by an interrupted store
+TMP_MAX_AGE = 300
+
+
+def cache_namespace(logic_dir: Path) -> str:
+    """
+    Name the cache subdirectory for a logic directory.
+
+    Services loading different logic directories get separate
+    subdirectories, so pruning one never deletes the other's artifacts.
+
+    Args:
+        logic_dir: Directory the trees are loaded from
+
+    Returns:
+        Short hex digest of the resolved directory path
+    """
+    return hashlib.sha256(str(Path(logic_dir).resolve()).encode("utf-8")).hexdigest()[:16]
+
+
+class CompiledTreeCache:
+    """
+    Directory of compiled tree artifacts.
+
+    Each artifact is named by a hash of the source bytes and the engine
+    version, so edited files and compiler upgrades miss automatically.
+    """
+
+    def __init__(self, directory: Path):
+        """
+        Initialize the cache.
+
+        Args:
+            directory: Directory holding the artifacts
+        """
+        self.directory = Path(directory)
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, content: bytes, default_name: str = "") -> str:
+        """
+        Compute the cache key for a tree file.
+
+        Args:
+            content: Raw bytes of the JSON file
+            default_name: Tree name used when the file has none
+
+        Returns:
+            Hex digest of the engine version, default name and content
+        """
+        digest = hashlib.sha256(f"{ENGINE_VERSION}\0{default_name}\0".encode("utf-8"))
+        digest.update(content)
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.bin"
+
+    def load(
+        self,
+        content: bytes,
+        default_name: str = ""
+    ) -> Optional[Tuple[Dict[str, Any], CompiledTree]]:
+        """
+        Load the compiled artifact for a tree file.
+
+        Args:
+            content: Raw bytes of the JSON file
+            default_name: Tree name used when the file has none
+
+        Returns:
+            Tuple of (raw tree data, compiled tree), or None on a miss
+        """
+        try:
+            tree_data, tree = marshal.loads(self._path(self.key(content, default_name)).read_bytes())
+            compiled = _load_tree(tree)
+        except (OSError, EOFError, ValueError, TypeError, KeyError, IndexError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return tree_data, compiled
+
+    def store(
+        self,
+        content: bytes,
+        tree_data: Dict[str, Any],
+        tree: CompiledTree,
+        default_name: str = ""
+    ) -> None:
+        """
+        Write the compiled artifact for a tree file.
+
+        The artifact is written to a temporary file and renamed into place,
+        so readers never see a partial file.
+
+        Args:
+            content: Raw bytes of the JSON file
+            tree_data: Parsed JSON tree
+            tree: Compiled tree
+            default_name: Tree name used when the file has none
+        """
+        path = self._path(self.key(content, default_name))
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_bytes(marshal.dumps((tree_data, _dump_tree(tree))))
+            os.replace(tmp_path, path)
+        except (OSError, ValueError) as e:
+            print(f"Error writing tree cache: {e}", file=sys.stderr)
+            tmp_path.unlink(missing_ok=True)
+
+    def prune(self, keep: Set[str]) -> int:
+        """
+        Delete every artifact except the given ones.
+
+        Artifacts of edited files never hit again, so the service prunes
+        its own cache directory to the keys of the files it currently has
+        loaded. Temporary files older than TMP_MAX_AGE, left by interrupted
+        stores, are deleted too.
+
+        Args:
+            keep: Keys of the artifacts still in use
+
+        Returns:
+            Number of files deleted
+        """
+        removed = 0
+        cutoff = time.time() - TMP_MAX_AGE
+        stale = [path for path in self.directory.glob("*.bin") if path.stem not in keep]
+        stale += [path for path in self.directory.glob("*.tmp") if self._older_than(path, cutoff)]
+        for path in stale:
+            try:
+                path.unlink()
+                removed += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Error pruning tree cache: {e}", file=sys.stderr)
+        return removed
+
+    @staticmethod
+    def _older_than(path: Path, cutoff: float) -> bool:
+        """Check whether a file was last modified before the cutoff."""
+        try:
+            return path.stat().st_mtime < cutoff
+        except FileNotFoundError:
+            return False
@@ -0,0 +1,305 @@
+"""Compiler from JSON tree definitions to flat node tables."""
+from typing import Any, Dict, List, Optional, Tuple
+from models.compiled_tree import CompiledOutcome, CompiledTree, NodeKind
+from models.decision_tree import DecisionType
+
+# Bump when the compiled layout changes so cached artifacts are rebuilt
+ENGINE_VERSION = "2"
+
+# Option target that hands the accumulated score to the tree's score bands
+SCORE_TARGET = "$score"
+
+
+class TreeCompilationError(ValueError):
+    """Raised when a tree definition cannot be compiled."""
+
+
+def _normalize_options(question_id: str, question: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Normalize the option spec of a question.
+
+    Supports both the ``options`` mapping and the shorthand ``yes``/``no`` keys.
+    """
+    if "options" in question:
+        raw = question["options"]
+    elif "yes" in question or "no" in question:
+        raw = {"Yes": question.get("yes"), "No": question.get("no")}
+    else:
+        raise TreeCompilationError(f"Question '{question_id}' has no options")
+
+    if not isinstance(raw, dict) or not raw:
+        raise TreeCompilationError(f"Question '{question_id}' has no options")
+
+    options = {}
+    for answer, spec in raw.items():
+        if isinstance(spec, dict):
+            options[str(answer)] = spec
+        else:
+            options[str(answer)] = {"next": spec}
+    return options
+
+
+def _compile_outcome(outcome_id: str, spec: Any) -> CompiledOutcome:
+    """Compile an outcome given either as plain text or as an object."""
+    if isinstance(spec, str):
+        return CompiledOutcome(
+            id=outcome_id,
+            decision=outcome_id.upper(),
+            explanation=spec,
+            templated="{" in spec
+        )
+
+    if not isinstance(spec, dict):
+        raise TreeCompilationError(f"Outcome '{outcome_id}' must be a string or object")
+
+    explanation = spec.get("explanation", "")
+    decision_type = spec.get("type")
+    try:
+        decision_type = DecisionType(decision_type) if decision_type else None
+    except ValueError:
+        raise TreeCompilationError(
+            f"Outcome '{outcome_id}' has unknown type '{decision_type}'"
+        )
+
+    return CompiledOutcome(
+        id=outcome_id,
+        decision=spec.get("decision", outcome_id.upper()),
+        explanation=explanation,
+        decision_type=decision_type,
+        metadata=dict(spec.get("metadata", {})),
+        templated="{" in explanation
+    )
+
+
+def _check_structure(
+    name: str,
+    node_ids: List[str],
+    successors: List[Tuple[int, ...]],
+    start: int
+) -> List[int]:
+    """
+    Reject cycles and unreachable nodes.
+
+    Args:
+        name: Tree name for error messages
+        node_ids: Node identifiers
+        successors: Distinct next nodes per node
+        start: Start node index
+
+    Returns:
+        Reachable nodes in post-order (every node after all its successors)
+
+    Raises:
+        TreeCompilationError: If the tree has a cycle or unreachable nodes
+    """
+    # 0 = unvisited, 1 = on the current DFS path, 2 = finished
+    state = [0] * len(node_ids)
+    order: List[int] = []
+    stack = [(start, 0)]
+    state[start] = 1
+    while stack:
+        node, child = stack[-1]
+        if child < len(successors[node]):
+            stack[-1] = (node, child + 1)
+            target = successors[node][child]
+            if state[target] == 1:
+                raise TreeCompilationError(
+                    f"Tree '{name}' has a cycle through '{node_ids[target]}'"
+                )
+            if state[target] == 0:
+                state[target] = 1
+                stack.append((target, 0))
+        else:
+            state[node] = 2
+            order.append(node)
+            stack.pop()
+
+    unreachable = [node_ids[node] for node in range(len(node_ids)) if state[node] == 0]
+    if unreachable:
+        raise TreeCompilationError(f"Tree '{name}' has unreachable nodes: {unreachable}")
+    return order
+
+
+def _node_metrics(
+    kinds: List[NodeKind],
+    successors: List[Tuple[int, ...]],
+    order: List[int]
+) -> Tuple[List[int], List[Tuple[int, ...]], List[int]]:
+    """
+    Compute per-node metrics bottom-up over an acyclic tree.
+
+    Returns:
+        Tuple of (questions left on the longest path, reachable outcome
+        nodes, distinct questions reachable including the node itself)
+    """
+    count = len(kinds)
+    depth = [0] * count
+    outcomes: List[frozenset] = [frozenset()] * count
+    questions: List[frozenset] = [frozenset()] * count
+
+    for node in order:
+        if kinds[node] == NodeKind.OUTCOME:
+            outcomes[node] = frozenset((node,))
+            continue
+        children = successors[node]
+        outcomes[node] = frozenset().union(*(outcomes[c] for c in children))
+        questions[node] = frozenset().union(*(questions[c] for c in children))
+        if kinds[node] == NodeKind.QUESTION:
+            depth[node] = 1 + max(depth[c] for c in children)
+            questions[node] = questions[node] | {node}
+
+    return (
+        depth,
+        [tuple(sorted(reachable)) for reachable in outcomes],
+        [len(reachable) for reachable in questions]
+    )
+
+
+def compile_tree(tree_data: Dict[str, Any], default_name: Optional[str] = None) -> CompiledTree:
+    """
+    Compile a JSON tree definition into a flat node table.
+
+    Args:
+        tree_data: Parsed JSON tree (``start`` / ``questions`` / ``outcomes``)
+        default_name: Tree name to use when the definition has none
+
+    Returns:
+        CompiledTree ready for evaluation
+
+    Raises:
+        TreeCompilationError: If the definition is malformed
+    """
+    name = tree_data.get("tree_name", default_name)
+    if not name:
+        raise TreeCompilationError("Tree has no name")
+
+    questions = tree_data.get("questions") or {}
+    outcomes = tree_data.get("outcomes") or {}
+    if not questions:
+        raise TreeCompilationError(f"Tree '{name}' has no questions")
+
+    overlap = set(questions) & set(outcomes)
+    if overlap:
+        raise TreeCompilationError(
+            f"Tree '{name}' reuses ids for questions and outcomes: {sorted(overlap)}"
+        )
+
+    scoring = tree_data.get("scoring")
+
+    # Assign node indices: questions, then the score node, then outcomes
+    node_ids: List[str] = list(questions)
+    kinds: List[NodeKind] = [NodeKind.QUESTION] * len(questions)
+    if scoring:
+        node_ids.append(SCORE_TARGET)
+        kinds.append(NodeKind.SCORE)
+    node_ids.extend(outcomes)
+    kinds.extend([NodeKind.OUTCOME] * len(outcomes))
+    index = {node_id: i for i, node_id in enumerate(node_ids)}
+
+    def resolve(target: Any, source: str) -> int:
+        if target not in index:
+            raise TreeCompilationError(
+                f"Tree '{name}': '{source}' points to unknown node '{target}'"
+            )
+        return index[target]
+
+    labels: List[str] = []
+    texts: List[str] = []
+    help_texts: List[Optional[str]] = []
+    options: List[Tuple[str, ...]] = []
+    option_index: List[Dict[str, int]] = []
+    transitions: List[Tuple[int, ...]] = []
+    scores: List[Tuple[int, ...]] = []
+    values: List[Tuple[Any, ...]] = []
+    templated = False
+
+    for position, (question_id, question) in enumerate(questions.items()):
+        spec = _normalize_options(question_id, question)
+        answers = tuple(spec)
+        text = question.get("text", "")
+        labels.append(question.get("label", f"Q{position + 1}"))
+        texts.append(text)
+        help_texts.append(question.get("help"))
+        options.append(answers)
+        option_index.append({answer: i for i, answer in enumerate(answers)})
+        transitions.append(tuple(
+            resolve(spec[answer].get("next"), f"{question_id} → {answer}")
+            for answer in answers
+        ))
+        scores.append(tuple(spec[answer].get("score", 0) for answer in answers))
+        values.append(tuple(spec[answer].get("value", answer) for answer in answers))
+        templated = templated or "{" in text
+
+    band_limits: Tuple[float, ...] = ()
+    band_nodes: Tuple[int, ...] = ()
+    if scoring:
+        bands = scoring.get("bands") or []
+        if not bands:
+            raise TreeCompilationError(f"Tree '{name}' has scoring but no bands")
+        band_limits = tuple(float(band.get("max", float("inf"))) for band in bands)
+        if list(band_limits) != sorted(band_limits):
+            raise TreeCompilationError(f"Tree '{name}' score bands are not ascending")
+        band_nodes = tuple(
+            resolve(band.get("outcome"), f"{SCORE_TARGET} band") for band in bands
+        )
+        if any(kinds[node] != NodeKind.OUTCOME for node in band_nodes):
+            raise TreeCompilationError(f"Tree '{name}' score bands must point to outcomes")
+        # Placeholder entries keep the per-node lists aligned with node_ids
+        labels.append("")
+        texts.append("")
+        help_texts.append(None)
+        options.append(())
+        option_index.append({})
+        transitions.append(())
+        scores.append(())
+        values.append(())
+
+    compiled_outcomes: List[Optional[CompiledOutcome]] = [None] * (len(node_ids) - len(outcomes))
+    for outcome_id, spec in outcomes.items():
+        outcome = _compile_outcome(outcome_id, spec)
+        templated = templated or outcome.templated
+        compiled_outcomes.append(outcome)
+        labels.append("")
+        texts.append("")
+        help_texts.append(None)
+        options.append(())
+        option_index.append({})
+        transitions.append(())
+        scores.append(())
+        values.append(())
+
+    start = tree_data.get("start", node_ids[0])
+    start_index = resolve(start, "start")
+    if kinds[start_index] != NodeKind.QUESTION:
+        raise TreeCompilationError(f"Tree '{name}' must start at a question")
+
+    successors = [
+        band_nodes if kinds[node] == NodeKind.SCORE else tuple(set(transitions[node]))
+        for node in range(len(node_ids))
+    ]
+    order = _check_structure(name, node_ids, successors, start_index)
+    remaining_depth, reachable_outcomes, question_counts = _node_metrics(kinds, successors, order)
+
+    return CompiledTree(
+        name=name,
+        title=tree_data.get("title", name),
+        description=tree_data.get("description", ""),
+        start=start_index,
+        node_ids=node_ids,
+        kinds=kinds,
+        labels=labels,
+        texts=texts,
+        help_texts=help_texts,
+        options=options,
+        option_index=option_index,
+        transitions=transitions,
+        scores=scores,
+        values=values,
+        outcomes=compiled_outcomes,
+        band_limits=band_limits,
+        band_nodes=band_nodes,
+        templated=templated,
+        remaining_depth=remaining_depth,
+        reachable_outcomes=reachable_outcomes,
+        question_counts=question_counts
+    )
@@ -0,0 +1,101 @@
+"""Immutable snapshots of the loaded trees and the logic directory poller."""
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from models.compiled_tree import CompiledTree
+from services.outcome_table import OutcomeTable
+
+# (mtime_ns, size) of a tree file
+FileSignature = Tuple[int, int]
+
+
+@dataclass(frozen=True)
+class LoadedTree:
+    """Everything built from one tree file."""
+    data: Dict[str, Any]
+    compiled: CompiledTree
+    outcome_table: Optional[OutcomeTable]
+    stats: Dict[str, Any]
+    cache_key: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class TreeRegistry:
+    """
+    Snapshot of all loaded trees.
+
+    A registry is never modified after it is published; reloading builds a
+    new one and swaps the service's reference, so readers need no locks and
+    anyone holding an older snapshot keeps a consistent view of it.
+    """
+    version: int
+    files: Dict[str, Tuple[FileSignature, Optional[LoadedTree]]]
+    load_errors: List[str] = field(default_factory=list)
+    trees: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    compiled: Dict[str, CompiledTree] = field(default_factory=dict)
+    outcome_tables: Dict[str, OutcomeTable] = field(default_factory=dict)
+    load_stats: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+    @classmethod
+    def build(
+        cls,
+        version: int,
+        files: Dict[str, Tuple[FileSignature, Optional[LoadedTree]]],
+        load_errors: List[str]
+    ) -> "TreeRegistry":
+        """
+        Index the loaded files by tree name.
+
+        Args:
+            version: Monotonic snapshot number
+            files: Per file path, its signature and what was loaded from it
+            load_errors: Messages for files that failed to load
+
+        Returns:
+            TreeRegistry
+        """
+        registry = cls(version, files, load_errors)
+        for _, loaded in files.values():
+            if loaded is None:
+                continue
+            name = loaded.compiled.name
+            registry.trees[name] = loaded.data
+            registry.compiled[name] = loaded.compiled
+            registry.load_stats[name] = loaded.stats
+            if loaded.outcome_table is not None:
+                registry.outcome_tables[name] = loaded.outcome_table
+        return registry
+
+
+class LogicDirPoller:
+    """Background thread that calls ``reload`` on a fixed interval."""
+
+    def __init__(self, reload: Callable[[], bool], interval: float):
+        """
+        Initialize the poller.
+
+        Args:
+            reload: Callable that rescans the logic directory
+            interval: Seconds between scans
+        """
+        self._reload = reload
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="logic-dir-poller", daemon=True)
+
+    def start(self) -> None:
+        """Start polling."""
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop polling and wait for the thread to exit."""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self._reload()
+            except Exception as e:
+                print(f"Error reloading trees: {e}")
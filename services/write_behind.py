@@ -0,0 +1,325 @@
+"""Background batching and periodic flushing of history and analytics writes."""
+import atexit
+import queue
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Marks the end of the queue on shutdown
+_STOP = object()
+
+# Seconds before a failed batch is retried, doubled per failure up to the maximum
+RETRY_DELAY = 0.5
+MAX_RETRY_DELAY = 30.0
+
+
+def _report_error(message: str) -> None:
+    """Print a background write error to stderr."""
+    print(message, file=sys.stderr)
+
+
+class WriteBehindQueue:
+    """
+    Bounded queue drained by a writer thread that flushes records in batches.
+
+    A batch is flushed once ``batch_size`` records are pending or
+    ``flush_interval`` seconds after its first record arrived, whichever
+    comes first. When the queue stays full the caller writes its record
+    itself instead of dropping it. A batch whose flush raises is kept and
+    retried, with a growing delay, ahead of the records queued after it.
+    Pending records are drained on ``stop`` and at interpreter exit.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[List[Any]], None],
+        flush_interval: float,
+        batch_size: int,
+        max_pending: int,
+        name: str = "write-behind",
+        error_reporter: Optional[Callable[[str], None]] = None
+    ):
+        """
+        Initialize the queue; the writer thread starts on first use.
+
+        Args:
+            flush: Called from the writer thread with each batch of records
+            flush_interval: Maximum seconds a record waits before being flushed
+            batch_size: Maximum number of records per flush
+            max_pending: Queue capacity
+            name: Writer thread name
+            error_reporter: Called with a message when a flush fails
+                (defaults to printing to stderr)
+        """
+        self._flush = flush
+        self.error_reporter = error_reporter or _report_error
+        self.flush_interval = flush_interval
+        self.batch_size = max(1, batch_size)
+        self.name = name
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, max_pending))
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        # Records of failed flushes, oldest first, written before newer ones
+        self._failed: List[Any] = []
+        self._failed_lock = threading.Lock()
+        self._retry_delay = 0.0
+        self._stats = {
+            "max_depth": 0,
+            "records": 0,
+            "batches": 0,
+            "inline_writes": 0,
+            "errors": 0,
+            "lost": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0
+        }
+
+    def submit(self, record: Any, timeout: float = 1.0) -> None:
+        """
+        Queue a record for writing.
+
+        Args:
+            record: Record passed to the flush callable
+            timeout: Seconds to wait for space before writing inline
+        """
+        self._ensure_started()
+        try:
+            self._queue.put(record, timeout=timeout)
+        except queue.Full:
+            with self._stats_lock:
+                self._stats["inline_writes"] += 1
+            self._write_batch([record])
+            return
+
+        depth = self._queue.qsize()
+        if depth > self._stats["max_depth"]:
+            with self._stats_lock:
+                self._stats["max_depth"] = max(self._stats["max_depth"], depth)
+
+    def join(self) -> None:
+        """Block until every queued record has been flushed or kept for a retry."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def stop(self) -> None:
+        """Flush pending records and stop the writer thread."""
+        with self._start_lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get queue and flush counters.
+
+        Returns:
+            Dictionary with current queue depth, record and batch counts and
+            flush latency in milliseconds
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        with self._failed_lock:
+            stats["retry_pending"] = len(self._failed)
+        stats["queue_depth"] = self._queue.qsize()
+        batches = stats["batches"]
+        stats["avg_flush_ms"] = stats["total_flush_ms"] / batches if batches else 0.0
+        return stats
+
+    def _ensure_started(self) -> None:
+        """Start the writer thread if it is not running."""
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def _run(self) -> None:
+        """Writer loop: collect a batch, flush it, repeat until stopped."""
+        while True:
+            try:
+                # Wake up to retry failed records even when nothing new arrives
+                first = self._queue.get(timeout=self._retry_delay or None)
+            except queue.Empty:
+                self._write_batch([])
+                continue
+            if first is _STOP:
+                self._queue.task_done()
+                self._write_batch([])
+                self._give_up()
+                return
+
+            batch = [first]
+            stopping = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    record = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is _STOP:
+                    stopping = True
+                    break
+                batch.append(record)
+
+            self._write_batch(batch)
+            for _ in range(len(batch) + stopping):
+                self._queue.task_done()
+            if stopping:
+                # Records queued after the stop marker are drained inline
+                self._drain()
+                return
+
+    def _drain(self) -> None:
+        """Flush whatever is left in the queue without waiting."""
+        batch = []
+        while True:
+            try:
+                record = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._queue.task_done()
+            if record is not _STOP:
+                batch.append(record)
+        self._write_batch(batch)
+        self._give_up()
+
+    def _write_batch(self, batch: List[Any]) -> None:
+        """Flush earlier failed records and a new batch, keeping them for a retry on failure."""
+        with self._failed_lock:
+            batch, self._failed = self._failed + batch, []
+        if not batch:
+            return
+        if self._run_flush(batch):
+            self._retry_delay = 0.0
+            return
+        with self._failed_lock:
+            # Records that failed inline meanwhile are newer than this batch
+            self._failed = batch + self._failed
+        self._retry_delay = min(max(self._retry_delay * 2, RETRY_DELAY), MAX_RETRY_DELAY)
+
+    def _give_up(self) -> None:
+        """Report records that still could not be written at shutdown."""
+        with self._failed_lock:
+            lost, self._failed = len(self._failed), []
+        if lost:
+            with self._stats_lock:
+                self._stats["lost"] += lost
+            self.error_reporter(f"Error flushing {self.name} queue: {lost} records could not be written")
+
+    def _run_flush(self, batch: List[Any]) -> bool:
+        """Flush a batch and record its latency; return False if the flush raised."""
+        started = time.perf_counter()
+        try:
+            self._flush(batch)
+        except Exception as e:
+            with self._stats_lock:
+                self._stats["errors"] += 1
+            self.error_reporter(f"Error flushing {self.name} queue: {e}")
+            return False
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            stats = self._stats
+            stats["records"] += len(batch)
+            stats["batches"] += 1
+            stats["last_flush_ms"] = elapsed_ms
+            stats["total_flush_ms"] += elapsed_ms
+            stats["max_flush_ms"] = max(stats["max_flush_ms"], elapsed_ms)
+        return True
+
+
+class PeriodicFlusher:
+    """
+    Background thread that calls ``flush`` on a fixed interval.
+
+    ``stop`` runs one last flush, and the flusher stops itself at
+    interpreter exit, so state kept in memory reaches disk on shutdown.
+    """
+
+    def __init__(self, flush: Callable[[], Any], interval: float, name: str = "flusher"):
+        """
+        Initialize the flusher; call ``start`` to begin.
+
+        Args:
+            flush: Called from the thread every ``interval`` seconds
+            interval: Seconds between flushes
+            name: Thread name
+        """
+        self._flush = flush
+        self.interval = interval
+        self.name = name
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "flushes": 0,
+            "errors": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0
+        }
+
+    def start(self) -> None:
+        """Start the thread if it is not running."""
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """Stop the thread and run a final flush."""
+        with self._start_lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+        self.run_once()
+
+    def run_once(self) -> None:
+        """Flush now on the calling thread and record its latency."""
+        started = time.perf_counter()
+        try:
+            self._flush()
+        except Exception as e:
+            with self._stats_lock:
+                self._stats["errors"] += 1
+            _report_error(f"Error running {self.name}: {e}")
+            return
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            stats = self._stats
+            stats["flushes"] += 1
+            stats["last_flush_ms"] = elapsed_ms
+            stats["total_flush_ms"] += elapsed_ms
+            stats["max_flush_ms"] = max(stats["max_flush_ms"], elapsed_ms)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get flush counters.
+
+        Returns:
+            Dictionary with flush count, error count and latency in milliseconds
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        flushes = stats["flushes"]
+        stats["avg_flush_ms"] = stats["total_flush_ms"] / flushes if flushes else 0.0
+        return stats
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.run_once()
@@ -6,3 +6,13 @@ from pathlib import Path
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from utils.config import Config
+
+
+@pytest.fixture(autouse=True)
+def tree_cache_dir(tmp_path_factory, monkeypatch):
+    """Keep compiled-tree artifacts out of the repository's data directory."""
+    path = tmp_path_factory.mktemp("tree_cache")
+    monkeypatch.setattr(Config, "TREE_CACHE_DIR", path)
+    return path
+
@@ -0,0 +1,409 @@
+"""Tests for usage analytics."""
+import json
+import os
+import threading
+import pytest
+from services.analytics_service import AnalyticsService
+from services.analytics_rollups import RollupTable
+from services.analytics_shards import COMPACTED_SHARD, AnalyticsShard, shard_name
+from services.analytics_sketches import HyperLogLog, SketchSet
+from services.decision_tree_service import DecisionTreeService
+from services.evaluation_cursor import EvaluationCursor
+from services.tree_compiler import compile_tree
+from utils.config import Config
+
+
+class TestAnalyticsService:
+    """Test analytics service."""
+
+    @pytest.fixture
+    def data_dir(self, tmp_path, monkeypatch):
+        """Enable analytics in a temporary directory."""
+        monkeypatch.setattr(Config, "DATA_DIR", tmp_path)
+        monkeypatch.setattr(Config, "ENABLE_ANALYTICS", True)
+        return tmp_path
+
+    def test_statistics_served_from_memory(self, data_dir, monkeypatch):
+        """Test that tracking and reading do not touch the analytics file."""
+        service = AnalyticsService(flush_interval=60)
+        monkeypatch.setattr(service, "_load_analytics", lambda: pytest.fail("analytics file read"))
+        service.track_decision("Tree", "ACCEPT")
+        service.track_decision("Tree", "REJECT")
+
+        stats = service.get_statistics()
+        assert stats["total_decisions"] == 2
+        assert stats["tree_usage"] == {"Tree": 2}
+        assert stats["decision_counts"] == {"ACCEPT": 1, "REJECT": 1}
+        assert service.get_write_stats()["pending"] == 2
+
+    def test_snapshot_written_on_close(self, data_dir):
+        """Test that pending counts reach disk at shutdown without temp files left behind."""
+        service = AnalyticsService(flush_interval=60)
+        service.track_decision("Tree", "ACCEPT")
+        assert json.loads(service.analytics_file.read_text(encoding="utf-8"))["total_decisions"] == 0
+
+        service.close()
+        saved = json.loads(service.analytics_file.read_text(encoding="utf-8"))
+        assert saved["total_decisions"] == 1
+        assert saved["decision_counts"] == {"ACCEPT": 1}
+        assert list(data_dir.glob("*.tmp")) == []
+
+    def test_concurrent_services_lose_nothing(self, data_dir):
+        """Test that services sharing the analytics file merge their counts."""
+        services = [AnalyticsService(flush_interval=0.01) for _ in range(4)]
+
+        def track(service):
+            for _ in range(50):
+                service.track_decision("Tree", "ACCEPT")
+
+        threads = [threading.Thread(target=track, args=(service,)) for service in services]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for service in services:
+            service.close()
+
+        stats = AnalyticsService().get_statistics()
+        assert stats["total_decisions"] == 200
+        assert stats["decision_counts"] == {"ACCEPT": 200}
+
+    def test_failed_save_retries_only_unsaved_parts(self, data_dir, monkeypatch):
+        """Test that a part saved before another failed is not written twice."""
+        service = AnalyticsService(flush_interval=60)
+        service.track_decision("Tree", "ACCEPT", session_id="a")
+        service.track_decision("Tree", "REJECT", session_id="b")
+        save = RollupTable.save
+        calls = []
+
+        def fail_once(table, path):
+            calls.append(path)
+            return len(calls) > 1 and save(table, path)
+
+        monkeypatch.setattr(RollupTable, "save", fail_once)
+        service.flush()
+        service.close()
+
+        reader = AnalyticsService(flush_interval=0)
+        stats = reader.get_statistics()
+        assert stats["total_decisions"] == 2
+        assert stats["decision_counts"] == {"ACCEPT": 1, "REJECT": 1}
+        assert reader.get_statistics(granularity="hour")["total_decisions"] == 2
+        assert dict(reader.get_sketch_statistics()["trees"]["Tree"]["top_outcomes"]) == {"ACCEPT": 1, "REJECT": 1}
+
+class TestAnalyticsRollups:
+    """Test time-bucketed analytics."""
+
+    @pytest.fixture
+    def service(self, tmp_path, monkeypatch):
+        """Create an analytics service in a temporary directory."""
+        monkeypatch.setattr(Config, "DATA_DIR", tmp_path)
+        monkeypatch.setattr(Config, "ENABLE_ANALYTICS", True)
+        return AnalyticsService(flush_interval=60)
+
+    def _seed(self, rollups):
+        """Count decisions over three days."""
+        from datetime import datetime
+
+        for day, hour, tree, decision in [
+            (1, 9, "Vendor", "HIGH"), (1, 9, "Vendor", "LOW"), (1, 17, "DPIA", "REQUIRED"),
+            (2, 10, "Vendor", "HIGH"), (3, 8, "Vendor", "HIGH")
+        ]:
+            rollups.add(tree, decision, datetime(2026, 3, day, hour, 30))
+
+    def test_range_by_hour_and_day(self, service):
+        """Test that ranged statistics are summed from buckets."""
+        self._seed(service._rollups)
+        daily = service.get_statistics("2026-03-01", "2026-03-03", "day")
+        assert [bucket["total_decisions"] for bucket in daily["buckets"]] == [3, 1]
+        assert daily["tree_usage"] == {"Vendor": 3, "DPIA": 1}
+        assert daily["decision_counts"]["HIGH"] == 2
+
+        hourly = service.get_statistics("2026-03-01T09:00", "2026-03-01T18:00", "hour")
+        assert len(hourly["buckets"]) == 9
+        assert hourly["buckets"][0]["decision_counts"] == {"HIGH": 1, "LOW": 1}
+        assert hourly["buckets"][-1]["start"] == "2026-03-01T17:00:00"
+
+    def test_old_minutes_survive_in_coarser_buckets(self, service):
+        """Test that recycled minute buckets are still counted by hour and day."""
+        from datetime import datetime
+
+        self._seed(service._rollups)
+        service._rollups.add("Vendor", "LOW", datetime(2026, 3, 5, 12, 0))
+        minutes = service.get_statistics("2026-03-01", "2026-03-02", "minute")
+        assert minutes["total_decisions"] == 0
+        assert service.get_statistics("2026-03-01", "2026-03-02", "hour")["total_decisions"] == 3
+        assert service.get_statistics("2026-03-01", "2026-03-02")["granularity"] == "hour"
+
+    def test_rollups_persist_and_merge(self, service):
+        """Test that flushed rollups merge with other processes' counts."""
+        from datetime import datetime
+
+        other = AnalyticsService(flush_interval=60)
+        service.track_decision("Vendor", "HIGH")
+        other.track_decision("Vendor", "HIGH")
+        service.close()
+        other.close()
+
+        now = datetime.now()
+        stats = AnalyticsService().get_statistics(now.replace(hour=0, minute=0), None, "day")
+        assert stats["decision_counts"] == {"HIGH": 2}
+
+
+class TestAnalyticsSketches:
+    """Test approximate distinct counts and top outcomes."""
+
+    @pytest.fixture
+    def service(self, tmp_path, monkeypatch):
+        """Create an analytics service in a temporary directory."""
+        monkeypatch.setattr(Config, "DATA_DIR", tmp_path)
+        monkeypatch.setattr(Config, "ENABLE_ANALYTICS", True)
+        return AnalyticsService(flush_interval=60)
+
+    def test_distinct_count_accuracy(self):
+        """Test that HyperLogLog stays within a few percent."""
+        sketch = HyperLogLog()
+        for i in range(20000):
+            sketch.add(f"session-{i % 10000}")
+        assert abs(sketch.count() - 10000) < 500
+
+    def test_top_outcomes_never_undercount(self):
+        """Test that count-min estimates are upper bounds and keep the heavy hitters."""
+        sketches = SketchSet()
+        for i in range(2000):
+            sketches.add("Vendor", f"RARE {i}")
+        for _ in range(300):
+            sketches.add("Vendor", "HIGH")
+        for _ in range(100):
+            sketches.add("Vendor", "LOW")
+
+        top = sketches.summary(2)["trees"]["Vendor"]["top_outcomes"]
+        assert [decision for decision, _ in top] == ["HIGH", "LOW"]
+        assert top[0][1] >= 300 and top[1][1] >= 100
+
+    def test_merge_matches_combined(self):
+        """Test that merging two workers' sketches equals recording everything in one."""
+        first, second, combined = SketchSet(), SketchSet(), SketchSet()
+        for i in range(500):
+            target = first if i % 2 else second
+            for sketch_set in (target, combined):
+                sketch_set.add("Vendor", f"TIER {i % 3}", f"s{i % 50}", {"q1": i % 7})
+        first.merge(second)
+        assert first.summary() == combined.summary()
+
+    def test_sketches_persist_across_services(self, service):
+        """Test that flushed sketches merge with other processes' sketches."""
+        other = AnalyticsService(flush_interval=60)
+        service.track_decision("Vendor", "HIGH", session_id="a", answers={"q1": "yes"})
+        other.track_decision("Vendor", "HIGH", session_id="b", answers={"q1": "yes"})
+        other.track_decision("DPIA", "REQUIRED", session_id="b", answers={"q1": "no"})
+        service.close()
+        other.close()
+
+        stats = AnalyticsService().get_sketch_statistics()
+        assert stats["distinct_sessions"] == 2
+        assert stats["trees"]["Vendor"]["distinct_sessions"] == 2
+        assert stats["trees"]["Vendor"]["distinct_answer_sets"] == 1
+        assert stats["trees"]["Vendor"]["top_outcomes"] == [("HIGH", 2)]
+
+
+class TestAnalyticsFunnels:
+    """Test per-node funnel counters fed by evaluation cursors."""
+
+    @pytest.fixture
+    def service(self, tmp_path, monkeypatch):
+        """Create an analytics service in a temporary directory."""
+        monkeypatch.setattr(Config, "DATA_DIR", tmp_path)
+        monkeypatch.setattr(Config, "ENABLE_ANALYTICS", True)
+        return AnalyticsService(flush_interval=60)
+
+    @pytest.fixture
+    def trees(self):
+        """Create a tree service."""
+        return DecisionTreeService(precompute=False)
+
+    def _walk(self, trees, service, answers):
+        """Answer questions in order with a tracked cursor."""
+        cursor = trees.create_cursor("Incident Reporting", service.track_step)
+        for question_id, answer in answers:
+            cursor.answer(question_id, answer)
+        return cursor
+
+    def _nodes(self, service):
+        """Index the funnel report by node id."""
+        return {node["id"]: node for node in service.get_funnel("Incident Reporting")["nodes"]}
+
+    def test_traversal_and_drop_off(self, trees, service):
+        """Test that abandoned and completed cursors are counted per node."""
+        self._walk(trees, service, [])
+        self._walk(trees, service, [("ir_q1", "Yes")])
+        self._walk(trees, service, [("ir_q1", "Yes"), ("ir_q2", "No")])
+
+        funnel = service.get_funnel("Incident Reporting")
+        assert funnel["started"] == 3
+        assert funnel["completed"] == 1
+        nodes = self._nodes(service)
+        assert nodes["ir_q1"]["dropped"] == 1
+        assert nodes["ir_q1"]["branches"] == {"Yes": 2, "No": 0}
+        assert nodes["ir_q2"]["reached"] == 2
+        assert nodes["ir_q2"]["drop_rate"] == 0.5
+        assert nodes["define_window"]["reached"] == 1
+
+    def test_changed_answer_takes_steps_back(self, trees, service):
+        """Test that a truncated path no longer counts."""
+        cursor = self._walk(trees, service, [("ir_q1", "Yes"), ("ir_q2", "Yes"), ("ir_q3", "48 hours")])
+        cursor.answer("ir_q2", "No")
+
+        nodes = self._nodes(service)
+        assert nodes["ir_q2"]["branches"] == {"Yes": 0, "No": 1}
+        assert nodes["ir_q3"]["reached"] == 0
+        assert nodes["ir_q4"]["reached"] == 0
+        assert nodes["define_window"]["reached"] == 1
+
+    def test_funnels_persist_and_merge(self, trees, service):
+        """Test that flushed funnels merge with other processes' counts."""
+        other = AnalyticsService(flush_interval=60)
+        self._walk(trees, service, [("ir_q1", "No")])
+        self._walk(trees, other, [("ir_q1", "Yes")])
+        service.close()
+        other.close()
+
+        funnel = AnalyticsService().get_funnel("Incident Reporting")
+        assert funnel["started"] == 2
+        assert funnel["nodes"][0]["branches"] == {"Yes": 1, "No": 1}
+
+    def test_edited_tree_keeps_new_nodes(self, trees, service):
+        """Test that counts for a node added by a tree edit survive a flush."""
+        self._walk(trees, service, [("ir_q1", "Yes")])
+        service.flush()
+
+        with open(Config.LOGIC_DIR / "incident_reporting.json", encoding="utf-8") as f:
+            tree_data = json.load(f)
+        tree_data["questions"]["ir_q0"] = {"text": "Is this a new incident?", "options": {"Yes": "ir_q1", "No": "ir_q1"}}
+        tree_data["start"] = "ir_q0"
+        cursor = EvaluationCursor(compile_tree(tree_data), service.track_step)
+        cursor.answer("ir_q0", "Yes")
+        service.close()
+
+        nodes = self._nodes(AnalyticsService())
+        assert nodes["ir_q0"]["reached"] == 1
+        assert nodes["ir_q0"]["branches"] == {"Yes": 1, "No": 0}
+        assert nodes["ir_q1"]["reached"] == 2
+
+
+class TestAnalyticsShards:
+    """Test per-process analytics shards merged on read."""
+
+    @pytest.fixture
+    def service(self, tmp_path, monkeypatch):
+        """Create a sharded analytics service in a temporary directory."""
+        monkeypatch.setattr(Config, "DATA_DIR", tmp_path)
+        monkeypatch.setattr(Config, "ENABLE_ANALYTICS", True)
+        return AnalyticsService(flush_interval=60, sharded=True)
+
+    def test_shards_merge_exactly(self, service, tmp_path):
+        """Test that every process writes its own shard and reads see the sum."""
+        other = AnalyticsService(flush_interval=60, sharded=True)
+        for _ in range(3):
+            service.track_decision("Vendor", "HIGH", session_id="a")
+        other.track_decision("Vendor", "LOW", session_id="b")
+        service.close()
+        other.close()
+
+        assert len(list((tmp_path / "analytics_shards").glob("*.bin"))) == 2
+        assert not (tmp_path / "analytics.json").exists()
+
+        reader = AnalyticsService(sharded=True)
+        stats = reader.get_statistics()
+        assert stats["total_decisions"] == 4
+        assert stats["decision_counts"] == {"HIGH": 3, "LOW": 1}
+        assert reader.get_statistics(granularity="hour")["total_decisions"] == 4
+        assert reader.get_sketch_statistics()["distinct_sessions"] == 2
+
+    def test_view_refreshes_on_shard_change(self, service, monkeypatch):
+        """Test that shards are only re-read after a shard file changes."""
+        other = AnalyticsService(flush_interval=60, sharded=True)
+        loads = []
+        original = AnalyticsShard.load.__func__
+
+        def counting_load(cls, path):
+            loads.append(path)
+            return original(cls, path)
+
+        monkeypatch.setattr(AnalyticsShard, "load", classmethod(counting_load))
+
+        other.track_decision("Vendor", "HIGH")
+        other.flush()
+        assert service.get_statistics()["total_decisions"] == 1
+        assert service.get_statistics()["total_decisions"] == 1
+        assert len(loads) == 1
+
+        service.track_decision("Vendor", "LOW")
+        service.flush()
+        assert service.get_statistics()["total_decisions"] == 2
+        assert len(loads) == 1
+
+    def test_legacy_counts_are_included(self, tmp_path, monkeypatch):
+        """Test that counts written before sharding stay in the totals."""
+        monkeypatch.setattr(Config, "DATA_DIR", tmp_path)
+        monkeypatch.setattr(Config, "ENABLE_ANALYTICS", True)
+        legacy = AnalyticsService(flush_interval=0)
+        legacy.track_decision("Vendor", "HIGH")
+
+        sharded = AnalyticsService(flush_interval=0, sharded=True)
+        sharded.track_decision("Vendor", "HIGH")
+        assert sharded.get_statistics()["total_decisions"] == 2
+        assert AnalyticsService(sharded=True).get_statistics()["total_decisions"] == 2
+
+    @pytest.fixture
+    def shard_dir(self, tmp_path, monkeypatch):
+        """Create an empty shard directory."""
+        monkeypatch.setattr(Config, "DATA_DIR", tmp_path)
+        monkeypatch.setattr(Config, "ENABLE_ANALYTICS", True)
+        shard_dir = tmp_path / "analytics_shards"
+        shard_dir.mkdir()
+        return shard_dir
+
+    def _dead_pid(self):
+        """Find a pid that no running process has."""
+        for pid in range(4194000, 0, -1):
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                return pid
+            except OSError:
+                continue
+
+    def _write_shard(self, path, count, folded=None):
+        """Write a shard holding ``count`` LOW decisions."""
+        totals = {"total_decisions": count, "tree_usage": {"Vendor": count}, "decision_counts": {"LOW": count}}
+        AnalyticsShard(totals, folded=folded).save(path)
+
+    @pytest.mark.skipif(os.name == "nt", reason="exited processes are not detected on Windows")
+    def test_exited_process_shards_are_compacted(self, shard_dir):
+        """Test that shards of exited processes on this host are folded into one file."""
+        host = shard_name().split("_", 1)[0]
+        dead_pid = self._dead_pid()
+        self._write_shard(shard_dir / f"{host}_{dead_pid}.bin", 2)
+        self._write_shard(shard_dir / f"{host}_{dead_pid}_1.bin", 3)
+        self._write_shard(shard_dir / f"{host}_{os.getppid()}.bin", 1)
+        self._write_shard(shard_dir / f"otherhost_{dead_pid}.bin", 4)
+
+        service = AnalyticsService(flush_interval=0, sharded=True)
+        names = {path.name for path in shard_dir.glob("*.bin")}
+        assert names == {COMPACTED_SHARD, f"{host}_{os.getppid()}.bin", f"otherhost_{dead_pid}.bin"}
+        assert service.get_statistics()["total_decisions"] == 10
+        assert AnalyticsService(sharded=True).get_statistics()["total_decisions"] == 10
+        compacted = AnalyticsShard.load(shard_dir / COMPACTED_SHARD)
+        assert compacted.analytics["decision_counts"] == {"LOW": 5}
+
+    @pytest.mark.skipif(os.name == "nt", reason="exited processes are not detected on Windows")
+    def test_compaction_skips_already_folded_shards(self, shard_dir):
+        """Test that a shard left behind after it was folded is not counted twice."""
+        stale = shard_dir / f"{shard_name().split('_', 1)[0]}_{self._dead_pid()}.bin"
+        self._write_shard(stale, 2)
+        stat = stale.stat()
+        self._write_shard(shard_dir / COMPACTED_SHARD, 2, folded={stale.name: (stat.st_mtime_ns, stat.st_size)})
+
+        assert AnalyticsService(sharded=True).get_statistics()["total_decisions"] == 2
+        assert not stale.exists()
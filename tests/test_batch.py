@@ -0,0 +1,91 @@
+"""Tests for the bulk decision CLI."""
+import csv
+import io
+import json
+import shutil
+import time
+import pytest
+from decisionguide import batch
+from utils.config import Config
+
+
+class TestBatchCli:
+    """Test offline batch evaluation."""
+
+    @pytest.fixture
+    def jsonl_input(self, tmp_path):
+        """Write a small JSONL answers file."""
+        path = tmp_path / "answers.jsonl"
+        records = [
+            {"id": 1, "vc_q1": "No data", "vc_q2": "Medium", "vc_q3": "No"},
+            {"id": 2, "vc_q1": "Personal data", "vc_q2": "Medium", "vc_q3": "Yes"},
+            {"id": 3, "vc_q1": "Personal data", "vc_q2": "Select..."}
+        ]
+        path.write_text("".join(json.dumps(r) + "\n" for r in records), encoding="utf-8")
+        return path
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_jsonl_round_trip(self, jsonl_input, tmp_path, workers):
+        """Test that decisions and paths are written in input order."""
+        output = tmp_path / "out.jsonl"
+        code = batch.main([
+            str(jsonl_input), "-o", str(output),
+            "--tree", "Vendor Risk Tiering",
+            "--workers", str(workers), "--chunk-size", "1"
+        ])
+        assert code == 0
+
+        rows = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+        assert [row["id"] for row in rows] == [1, 2, 3]
+        assert rows[0]["decision"] == "RISK TIER: LOW"
+        assert rows[1]["decision"] == "RISK TIER: HIGH"
+        assert rows[2]["decision"] is None
+        assert rows[1]["path"][0] == "Q1 → Personal data"
+
+    def test_load_errors_stay_off_stdout(self, jsonl_input, tmp_path, monkeypatch, capsys):
+        """Test that a broken tree is reported on stderr, not in the records."""
+        logic_dir = tmp_path / "logic"
+        shutil.copytree(Config.LOGIC_DIR, logic_dir)
+        (logic_dir / "broken.json").write_text("{", encoding="utf-8")
+        monkeypatch.setattr(Config, "LOGIC_DIR", logic_dir)
+        monkeypatch.setattr(batch, "_worker_service", None)
+
+        code = batch.main([str(jsonl_input), "-o", "-", "--tree", "Vendor Risk Tiering", "--workers", "1"])
+        assert code == 0
+
+        captured = capsys.readouterr()
+        rows = [json.loads(line) for line in captured.out.splitlines()]
+        assert [row["id"] for row in rows] == [1, 2, 3]
+        assert "broken.json" in captured.err
+
+    def test_csv_output_per_record_tree(self, tmp_path):
+        """Test CSV input that names its tree per record."""
+        source = tmp_path / "answers.csv"
+        with open(source, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["tree_name", "dp_q1", "dp_q2", "dp_q3"])
+            writer.writerow(["DPIA Requirement", "Yes", "No", "No"])
+        output = tmp_path / "out.csv"
+
+        assert batch.main([str(source), "-o", str(output), "--workers", "1"]) == 0
+
+        with open(output, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        assert rows[0]["decision"] == "DPIA RECOMMENDED"
+        assert rows[0]["path"] == "Q1 → Yes | Q2 → No | Q3 → No"
+
+    def test_stream_jsonl_through_slow_writer(self, jsonl_input):
+        """Test that the streaming pipeline writes every record despite backpressure."""
+        class SlowOutput(io.StringIO):
+            def write(self, text):
+                time.sleep(0.01)
+                return super().write(text)
+
+        target = SlowOutput()
+        with open(jsonl_input, encoding="utf-8") as source:
+            count = batch.stream_jsonl(
+                source, target, "Vendor Risk Tiering", chunk_size=1, max_pending=1
+            )
+        assert count == 3
+        decisions = [json.loads(line)["decision"] for line in target.getvalue().splitlines()]
+        assert decisions == ["RISK TIER: LOW", "RISK TIER: HIGH", None]
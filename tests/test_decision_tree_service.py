@@ -1,7 +1,9 @@
 """Tests for decision tree service."""
+import json
 import pytest
 from services.decision_tree_service import DecisionTreeService
 from models.decision_tree import DecisionType
+from utils.config import Config
 
 
 class TestDecisionTreeService:
@@ -71,3 +73,96 @@ class TestDecisionTreeService:
         assert "REQUIRED" in result.decision
         assert result.decision_type == DecisionType.DPIA_REQUIRED
 
+    
+    def test_incident_reporting_uses_answer_value(self, service):
+        """Test that outcome explanations are filled from option values."""
+        answers = {
+            "ir_q1": "Yes",
+            "ir_q2": "Yes",
+            "ir_q3": "72 hours",
+            "ir_q4": "Yes"
+        }
+        result = service.execute_tree("Incident Reporting", answers)
+        assert "72-hour" in result.explanation
+    
+    def test_partial_answers_return_pending(self, service):
+        """Test that unanswered questions stop the walk without a decision."""
+        answers = {"vc_q1": "Personal data", "vc_q2": "Select..."}
+        result = service.execute_tree("Vendor Risk Tiering", answers)
+        assert result.decision is None
+        assert result.path == ["Q1 → Personal data", "Q2 → Select..."]
+    
+    def test_batch_matches_single_execution(self, service):
+        """Test that columnar batch results agree with execute_tree per row."""
+        table = {
+            "vc_q1": ["No data", "Personal data", "Special category / highly sensitive data"],
+            "vc_q2": ["Small (few records, low volume)", "Medium", "Large (high volume / continuous)"],
+            "vc_q3": ["No", "Select...", "Yes"]
+        }
+        batch = service.execute_tree_batch("Vendor Risk Tiering", table)
+        assert len(batch) == 3
+        for i in range(3):
+            row = {question: column[i] for question, column in table.items()}
+            result = service.execute_tree("Vendor Risk Tiering", row)
+            assert batch.decisions[i] == result.decision
+            assert batch.levels[i] == result.metadata.get("level")
+        assert list(batch.complete) == [True, False, True]
+        assert batch.scores[2] == 9
+    
+    def test_outcome_table_matches_walker(self, service):
+        """Test that precomputed probes agree with walking the tree."""
+        stats = service.get_load_stats()["Vendor Risk Tiering"]
+        assert stats["precomputed"] is True
+        assert stats["filled"] == 18
+        
+        answers = {
+            "vc_q1": "Personal data",
+            "vc_q2": "Medium",
+            "vc_q3": "Yes"
+        }
+        tree = service.get_compiled_tree("Vendor Risk Tiering")
+        assert service.execute_tree("Vendor Risk Tiering", answers) == service._evaluate(tree, answers)
+    
+    def test_precompute_disabled(self):
+        """Test that the walker is used when precomputation is off."""
+        service = DecisionTreeService(precompute=False)
+        assert service.outcome_tables == {}
+        result = service.execute_tree("DPIA Requirement", {"dp_q1": "Yes", "dp_q2": "No", "dp_q3": "No"})
+        assert result.decision == "DPIA RECOMMENDED"
+    
+    def test_load_errors_reported(self, tmp_path, monkeypatch):
+        """Test that broken tree files go to the error reporter."""
+        (tmp_path / "broken.json").write_text("{not json", encoding="utf-8")
+        monkeypatch.setattr(Config, "LOGIC_DIR", tmp_path)
+        messages = []
+        service = DecisionTreeService(error_reporter=messages.append)
+        assert service.get_available_trees() == []
+        assert len(messages) == 1 and "broken.json" in messages[0]
+        assert service.load_errors == messages
+    
+    def test_load_errors_default_to_stderr(self, tmp_path, monkeypatch, capsys):
+        """Test that load errors stay off stdout without a reporter."""
+        (tmp_path / "broken.json").write_text("{not json", encoding="utf-8")
+        monkeypatch.setattr(Config, "LOGIC_DIR", tmp_path)
+        DecisionTreeService()
+        captured = capsys.readouterr()
+        assert captured.out == ""
+        assert "broken.json" in captured.err
+    
+    def test_outcome_table_allows_nested_metadata(self, tmp_path, monkeypatch):
+        """Test that outcomes with list or dict metadata are precomputed."""
+        (tmp_path / "tree.json").write_text(json.dumps({
+            "tree_name": "Nested",
+            "questions": {"q1": {"yes": "a", "no": "b"}},
+            "outcomes": {
+                "a": {"explanation": "A.", "metadata": {"controls": ["MFA", "SSO"]}},
+                "b": {"explanation": "B.", "metadata": {"owner": {"team": "security"}}}
+            }
+        }), encoding="utf-8")
+        monkeypatch.setattr(Config, "LOGIC_DIR", tmp_path)
+        messages = []
+        service = DecisionTreeService(precompute=True, error_reporter=messages.append)
+        assert messages == []
+        assert "Nested" in service.outcome_tables
+        result = service.execute_tree("Nested", {"q1": "Yes"})
+        assert result.metadata == {"controls": ["MFA", "SSO"]}
@@ -0,0 +1,58 @@
+"""Tests for incremental tree evaluation."""
+import pytest
+from services.decision_tree_service import DecisionTreeService
+
+
+class TestEvaluationCursor:
+    """Test evaluation cursor."""
+
+    @pytest.fixture
+    def service(self):
+        """Create service instance."""
+        return DecisionTreeService(precompute=False)
+
+    def test_advances_one_question_at_a_time(self, service):
+        """Test that answering the current question moves to the next one."""
+        cursor = service.create_cursor("Incident Reporting")
+        assert cursor.next_question().id == "ir_q1"
+
+        assert cursor.answer("ir_q1", "Yes") is True
+        assert cursor.next_question().id == "ir_q2"
+        assert cursor.depth == 1
+
+        # Answers for questions that are not reached yet are ignored
+        assert cursor.answer("ir_q4", "Yes") is False
+        assert cursor.depth == 1
+
+    def test_changing_earlier_answer_truncates(self, service):
+        """Test that changing an earlier answer drops the later path."""
+        cursor = service.create_cursor("Incident Reporting")
+        for question_id, answer in [("ir_q1", "Yes"), ("ir_q2", "Yes"), ("ir_q3", "48 hours")]:
+            cursor.answer(question_id, answer)
+        assert "48 hours" in cursor.next_question().text
+
+        cursor.answer("ir_q2", "No")
+        assert cursor.depth == 2
+        assert cursor.complete
+        assert cursor.result().decision == "ACCEPT_WITH_MITIGATION"
+
+    def test_sync_matches_execute_tree(self, service):
+        """Test that syncing a full answer set gives the walker's result."""
+        answers = {"vc_q1": "Personal data", "vc_q2": "Large (high volume / continuous)", "vc_q3": "Yes"}
+        cursor = service.create_cursor("Vendor Risk Tiering")
+        assert cursor.sync(answers) == service.execute_tree("Vendor Risk Tiering", answers)
+
+        answers["vc_q2"] = "Select..."
+        assert cursor.sync(answers) == service.execute_tree("Vendor Risk Tiering", answers)
+        assert cursor.score == 2
+
+    def test_progress_follows_branch(self, service):
+        """Test that progress is exact for the branch taken."""
+        cursor = service.create_cursor("Incident Reporting")
+        assert cursor.progress == 0
+
+        cursor.answer("ir_q1", "Yes")
+        assert cursor.progress == pytest.approx(20.0)
+
+        cursor.answer("ir_q2", "No")
+        assert cursor.progress == 100.0
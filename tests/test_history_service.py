@@ -0,0 +1,465 @@
+"""Tests for decision history storage."""
+import json
+from datetime import datetime, timedelta
+import pytest
+from models.decision_tree import DecisionResult
+from services.history_service import HistoryService
+from utils.config import Config
+
+
+def _result(decision):
+    """Build a minimal decision result."""
+    return DecisionResult(decision, f"{decision} explanation", ["Q1 → Yes"])
+
+
+class TestHistoryService:
+    """Test history service."""
+
+    @pytest.fixture
+    def data_dir(self, tmp_path, monkeypatch):
+        """Point history storage at a temporary directory."""
+        monkeypatch.setattr(Config, "DATA_DIR", tmp_path)
+        monkeypatch.setattr(Config, "ENABLE_HISTORY", True)
+        monkeypatch.setattr(Config, "WRITE_BEHIND", False)
+        monkeypatch.setattr(Config, "HISTORY_SEGMENT_BYTES", 0)
+        monkeypatch.setattr(Config, "HISTORY_SEGMENT_DAYS", 0)
+        return tmp_path
+
+    @pytest.fixture
+    def service(self, data_dir):
+        """Create service instance."""
+        return HistoryService(backend="jsonl")
+
+    def test_save_appends_one_line(self, service):
+        """Test that each save adds a single JSON line."""
+        service.save_decision("Tree", _result("A"), {"q1": "Yes"})
+        service.save_decision("Tree", _result("B"), {"q1": "No"})
+        lines = service.history_file.read_text(encoding="utf-8").splitlines()
+        assert [json.loads(line)["decision"] for line in lines] == ["A", "B"]
+
+    def test_get_history_reads_from_end(self, service, monkeypatch):
+        """Test that recent entries come back newest first across read blocks."""
+        monkeypatch.setattr("services.history_stores.TAIL_BLOCK_SIZE", 64)
+        for index in range(30):
+            service.save_decision("Tree", _result(f"D{index}"), {})
+        assert [entry["decision"] for entry in service.get_history(limit=3)] == ["D29", "D28", "D27"]
+        assert len(service.get_history(limit=500)) == 30
+
+    def test_torn_line_skipped(self, service):
+        """Test that a partially written last line is ignored."""
+        service.save_decision("Tree", _result("A"), {})
+        with open(service.history_file, "a", encoding="utf-8") as f:
+            f.write('{"decision": "B"')
+        assert [entry["decision"] for entry in service.get_history()] == ["A"]
+
+    def test_log_compacted_to_max_entries(self, service):
+        """Test that the log is trimmed once it grows past twice the cap."""
+        service._store.max_entries = 5
+        for index in range(10):
+            service.save_decision("Tree", _result(f"D{index}"), {})
+        lines = service.history_file.read_text(encoding="utf-8").splitlines()
+        assert len(lines) == 5
+        assert service.get_history(limit=1)[0]["decision"] == "D9"
+
+    def test_query_pages_with_filters(self, service):
+        """Test that the file backend filters and pages like the SQLite one."""
+        for index in range(5):
+            service.save_decision("Tree" if index % 2 else "Other", _result(f"D{index}"), {})
+        first = service.query_history(tree_name="Other", limit=2)
+        assert [entry["decision"] for entry in first.entries] == ["D4", "D2"]
+        second = service.query_history(tree_name="Other", limit=2, cursor=first.next_cursor)
+        assert [entry["decision"] for entry in second.entries] == ["D0"]
+        assert second.next_cursor is None
+
+    def test_legacy_json_history_migrated(self, data_dir):
+        """Test that an existing JSON history seeds the JSONL log."""
+        legacy = [{"decision": "OLD", "tree_name": "Tree"}]
+        (data_dir / "decision_history.json").write_text(json.dumps(legacy), encoding="utf-8")
+        service = HistoryService(backend="jsonl")
+        assert service.get_history()[0]["decision"] == "OLD"
+
+    def test_json_backend(self, data_dir):
+        """Test that the whole-file JSON backend is still available."""
+        service = HistoryService(backend="json")
+        service.save_decision("Tree", _result("A"), {})
+        service.clear_history()
+        assert service.get_history() == []
+
+
+class TestSqliteHistory:
+    """Test the SQLite history backend."""
+
+    @pytest.fixture
+    def service(self, tmp_path, monkeypatch):
+        """Create a SQLite-backed service in a temporary directory."""
+        monkeypatch.setattr(Config, "DATA_DIR", tmp_path)
+        monkeypatch.setattr(Config, "ENABLE_HISTORY", True)
+        monkeypatch.setattr(Config, "WRITE_BEHIND", False)
+        monkeypatch.setattr(Config, "HISTORY_MAX_ENTRIES", 0)
+        service = HistoryService(backend="sqlite")
+        yield service
+        service._store.close()
+
+    def _seed(self, service):
+        """Insert a month of decisions for two trees."""
+        service._store.extend([
+            {
+                "timestamp": f"2026-03-{day:02d}T10:00:00",
+                "tree_name": "Vendor Risk Tiering" if day % 2 else "DPIA Requirement",
+                "decision": "RISK TIER: CRITICAL" if day % 3 == 0 else "RISK TIER: LOW",
+                "path": [], "answers": {}, "metadata": {}
+            }
+            for day in range(1, 31)
+        ])
+
+    def test_wal_mode(self, service):
+        """Test that the database runs in write-ahead logging mode."""
+        mode = service._store._conn.execute("PRAGMA journal_mode").fetchone()[0]
+        assert mode == "wal"
+
+    def test_round_trip(self, service):
+        """Test that saved decisions come back newest first."""
+        service.save_decision("Tree", _result("A"), {"q1": "Yes"})
+        service.save_decision("Tree", _result("B"), {"q1": "No"})
+        history = service.get_history(limit=5)
+        assert [entry["decision"] for entry in history] == ["B", "A"]
+        assert history[1]["answers"] == {"q1": "Yes"}
+        assert history[0]["path"] == ["Q1 → Yes"]
+
+    def test_filtered_query_uses_index(self, service):
+        """Test that tree and date filters are index lookups."""
+        self._seed(service)
+        page = service.query_history(
+            tree_name="Vendor Risk Tiering",
+            decision="RISK TIER: CRITICAL",
+            start="2026-03-10",
+            end="2026-03-31"
+        )
+        assert [entry["timestamp"][:10] for entry in page.entries] == ["2026-03-27", "2026-03-21", "2026-03-15"]
+
+        plan = service._store._conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM history WHERE tree_name = ? AND timestamp >= ? "
+            "ORDER BY timestamp DESC, id DESC", ("Vendor Risk Tiering", "2026-03-10")
+        ).fetchall()
+        assert "idx_history_tree_time" in str(plan)
+
+    def test_cursor_pagination(self, service):
+        """Test that pages chain through the cursor without overlap."""
+        self._seed(service)
+        seen, cursor = [], None
+        while True:
+            page = service.query_history(limit=7, cursor=cursor)
+            seen.extend(entry["timestamp"] for entry in page.entries)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        assert len(seen) == 30
+        assert seen == sorted(seen, reverse=True)
+
+    def test_retention_by_count_and_age(self, service):
+        """Test that pruning keeps the newest entries within the age limit."""
+        self._seed(service)
+        service.save_decision("Tree", _result("NOW"), {})
+        store = service._store
+
+        store.max_entries = 20
+        assert store.prune() == 11
+        store.retention_days = 30
+        assert store.prune() == 19
+        assert [entry["decision"] for entry in service.get_history()] == ["NOW"]
+
+
+
+class TestHistorySegments:
+    """Test rotation of the JSONL log into compressed segments."""
+
+    @pytest.fixture
+    def service(self, tmp_path, monkeypatch):
+        """Create a segmented JSONL service that rotates every few entries."""
+        monkeypatch.setattr(Config, "DATA_DIR", tmp_path)
+        monkeypatch.setattr(Config, "ENABLE_HISTORY", True)
+        monkeypatch.setattr(Config, "WRITE_BEHIND", False)
+        monkeypatch.setattr(Config, "HISTORY_MAX_ENTRIES", 0)
+        monkeypatch.setattr(Config, "HISTORY_SEGMENT_BYTES", 1000)
+        monkeypatch.setattr(Config, "HISTORY_SEGMENT_DAYS", 0)
+        return HistoryService(backend="jsonl")
+
+    def _seed(self, service, count=40):
+        """Insert one decision per hour, alternating between two trees."""
+        for day in range(count):
+            service._store.extend([{
+                "timestamp": (datetime(2026, 1, 1) + timedelta(hours=day)).isoformat(),
+                "tree_name": "Even" if day % 2 == 0 else "Odd",
+                "decision": f"D{day}",
+                "path": [], "answers": {}, "metadata": {}
+            }])
+
+    def test_rotates_into_gzip_segments(self, service):
+        """Test that full logs are archived with a manifest of their contents."""
+        self._seed(service)
+        segments = service._store.segments()
+        assert len(segments) >= 3
+        assert all((service._store.segments_dir / segment["file"]).read_bytes()[:2] == b"\x1f\x8b"
+                   for segment in segments)
+        assert sum(segment["count"] for segment in segments) + len(service._store._tail(100)) == 40
+        assert segments[0]["trees"] == ["Even", "Odd"]
+        assert segments[0]["end"] < segments[1]["start"]
+
+    def test_reads_span_segments(self, service):
+        """Test that recent history and paging continue into archived segments."""
+        self._seed(service)
+        assert [entry["decision"] for entry in service.get_history(limit=40)] == [f"D{day}" for day in range(39, -1, -1)]
+
+        seen, cursor = [], None
+        while True:
+            page = service.query_history(tree_name="Odd", limit=6, cursor=cursor)
+            seen.extend(entry["decision"] for entry in page.entries)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        assert seen == [f"D{day}" for day in range(39, 0, -2)]
+
+    def test_range_query_opens_overlapping_segments(self, service, monkeypatch):
+        """Test that segments outside the requested range are never read."""
+        self._seed(service)
+        store = service._store
+        first = store.segments()[0]
+        opened = []
+        original = store._read_segment
+        monkeypatch.setattr(store, "_read_segment", lambda segment: opened.append(segment["file"]) or original(segment))
+
+        page = service.query_history(start=first["start"], end=first["end"] + "~")
+        assert [entry["decision"] for entry in page.entries][-1] == "D0"
+        assert opened == [first["file"]]
+
+    def test_count_retention_drops_oldest_segments(self, service):
+        """Test that whole segments beyond the entry cap are deleted."""
+        service._store.max_entries = 10
+        self._seed(service)
+        segments = service._store.segments()
+        kept = sum(segment["count"] for segment in segments)
+        assert kept - segments[0]["count"] < 10
+        assert sorted(path.name for path in service._store.segments_dir.glob("*.gz")) == sorted(
+            segment["file"] for segment in segments
+        )
+        assert len(service.get_history(limit=10)) == 10
+
+    def test_rotates_by_age(self, service):
+        """Test that an active log older than the segment age is closed first."""
+        service._store.segment_days = 7
+        self._seed(service, count=1)
+        service.save_decision("Tree", _result("NOW"), {})
+        assert [segment["count"] for segment in service._store.segments()] == [1]
+        assert [entry["decision"] for entry in service.get_history()] == ["NOW", "D0"]
+
+
+class TestRecentHistoryCache:
+    """Test the in-memory ring buffer of recent entries."""
+
+    @pytest.fixture
+    def service(self, tmp_path, monkeypatch):
+        """Create a JSONL-backed service with a small cache."""
+        monkeypatch.setattr(Config, "DATA_DIR", tmp_path)
+        monkeypatch.setattr(Config, "ENABLE_HISTORY", True)
+        monkeypatch.setattr(Config, "WRITE_BEHIND", False)
+        monkeypatch.setattr(Config, "HISTORY_CACHE_SIZE", 3)
+        return HistoryService(backend="jsonl")
+
+    def test_served_from_memory(self, service, monkeypatch):
+        """Test that repeated reads and own writes do not touch the log."""
+        service.save_decision("Tree", _result("A"), {})
+        assert service.get_history(limit=3)[0]["decision"] == "A"
+
+        reads = []
+        original = service._store.recent
+        monkeypatch.setattr(service._store, "recent", lambda limit: reads.append(limit) or original(limit))
+        service.save_decision("Tree", _result("B"), {})
+        for _ in range(3):
+            assert [entry["decision"] for entry in service.get_history(limit=3)] == ["B", "A"]
+        assert reads == []
+
+    def test_external_write_invalidates(self, service):
+        """Test that another process appending to the log is picked up."""
+        service.save_decision("Tree", _result("A"), {})
+        service.get_history(limit=3)
+
+        other = HistoryService(backend="jsonl")
+        other.save_decision("Tree", _result("B"), {})
+        assert [entry["decision"] for entry in service.get_history(limit=3)] == ["B", "A"]
+
+        # Our next save must not build on the stale buffer
+        service.save_decision("Tree", _result("C"), {})
+        assert [entry["decision"] for entry in service.get_history(limit=3)] == ["C", "B", "A"]
+
+    def test_buffer_is_bounded(self, service):
+        """Test that only the newest entries stay in memory."""
+        service.get_history(limit=3)
+        for index in range(5):
+            service.save_decision("Tree", _result(f"D{index}"), {})
+        assert [entry["decision"] for entry in service._recent] == ["D2", "D3", "D4"]
+        # Longer listings bypass the buffer
+        assert [entry["decision"] for entry in service.get_history(limit=10)] == ["D4", "D3", "D2", "D1", "D0"]
+
+
+class TestWriteBehind:
+    """Test batched background writes of history and analytics."""
+
+    @pytest.fixture
+    def data_dir(self, tmp_path, monkeypatch):
+        """Enable history, analytics and write-behind in a temporary directory."""
+        monkeypatch.setattr(Config, "DATA_DIR", tmp_path)
+        monkeypatch.setattr(Config, "ENABLE_HISTORY", True)
+        monkeypatch.setattr(Config, "ENABLE_ANALYTICS", True)
+        monkeypatch.setattr(Config, "WRITE_BEHIND_INTERVAL", 0.05)
+        monkeypatch.setattr(Config, "WRITE_BEHIND_BATCH_SIZE", 10)
+        return tmp_path
+
+    def test_saves_batched_and_drained(self, data_dir):
+        """Test that queued saves are visible at once and written on close."""
+        service = HistoryService(backend="jsonl", write_behind=True)
+        service.get_history(limit=5)
+        for index in range(25):
+            service.save_decision("Tree", _result(f"D{index}"), {})
+        assert service.get_history(limit=1)[0]["decision"] == "D24"
+
+        service.close()
+        lines = service.history_file.read_text(encoding="utf-8").splitlines()
+        assert len(lines) == 25
+        stats = service.get_write_stats()
+        assert stats["records"] == 25 and stats["queue_depth"] == 0
+        assert stats["batches"] >= 3 and stats["max_flush_ms"] >= stats["avg_flush_ms"]
+
+    def test_failed_batch_is_retried(self, data_dir, monkeypatch):
+        """Test that a batch whose write raised is written later, not dropped."""
+        service = HistoryService(backend="jsonl", write_behind=True)
+        extend = service._store.extend
+        calls = []
+
+        def fail_once(entries):
+            calls.append(len(entries))
+            if len(calls) == 1:
+                raise OSError("disk full")
+            extend(entries)
+
+        monkeypatch.setattr(service._store, "extend", fail_once)
+        for index in range(5):
+            service.save_decision("Tree", _result(f"D{index}"), {})
+        service.flush()
+        service.save_decision("Tree", _result("D5"), {})
+        service.close()
+
+        lines = service.history_file.read_text(encoding="utf-8").splitlines()
+        assert [json.loads(line)["decision"] for line in lines] == [f"D{index}" for index in range(6)]
+        stats = service.get_write_stats()
+        assert stats["errors"] == 1 and stats["lost"] == 0 and stats["retry_pending"] == 0
+
+    def test_reads_not_blocked_by_flush(self, data_dir, monkeypatch):
+        """Test that get_history is served while the writer is stuck on disk I/O."""
+        import threading
+
+        service = HistoryService(backend="jsonl", write_behind=True)
+        service.get_history(limit=1)
+        extend = service._store.extend
+        writing, release = threading.Event(), threading.Event()
+
+        def slow_extend(entries):
+            writing.set()
+            release.wait(5)
+            extend(entries)
+
+        monkeypatch.setattr(service._store, "extend", slow_extend)
+        service.save_decision("Tree", _result("D0"), {})
+        assert writing.wait(5)
+
+        reader = threading.Thread(target=service.get_history, kwargs={"limit": 1})
+        reader.start()
+        reader.join(1)
+        blocked = reader.is_alive()
+        release.set()
+        service.close()
+        assert not blocked
+
+    def test_concurrent_writers_lose_nothing(self, data_dir):
+        """Test that services sharing the analytics file do not drop counts."""
+        import threading
+        from services.analytics_service import AnalyticsService
+
+        services = [AnalyticsService(flush_interval=Config.WRITE_BEHIND_INTERVAL) for _ in range(4)]
+
+        def track(service):
+            for _ in range(50):
+                service.track_decision("Tree", "ACCEPT")
+
+        threads = [threading.Thread(target=track, args=(service,)) for service in services]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for service in services:
+            service.close()
+
+        stats = AnalyticsService(flush_interval=0).get_statistics()
+        assert stats["total_decisions"] == 200
+        assert stats["decision_counts"] == {"ACCEPT": 200}
+
+
+class TestHistoryExport:
+    """Test streaming history export."""
+
+    @pytest.fixture(params=["jsonl", "sqlite"])
+    def service(self, request, tmp_path, monkeypatch):
+        """Create a service with a few decisions on each backend."""
+        monkeypatch.setattr(Config, "DATA_DIR", tmp_path)
+        monkeypatch.setattr(Config, "ENABLE_HISTORY", True)
+        monkeypatch.setattr(Config, "WRITE_BEHIND", False)
+        service = HistoryService(backend=request.param)
+        service._store.extend([
+            {"timestamp": "2026-05-01T09:00:00", "tree_name": "Vendor", "decision": "HIGH",
+             "explanation": "e", "path": ["Q1 → Yes", "Q2 → No"], "answers": {"q1": "Yes", "q2": "No"}, "metadata": {}},
+            {"timestamp": "2026-05-02T09:00:00", "tree_name": "DPIA", "decision": "REQUIRED",
+             "explanation": "e", "path": ["Q1 → Yes"], "answers": {"d1": "Yes"}, "metadata": {}},
+            {"timestamp": "2026-05-03T09:00:00", "tree_name": "Vendor", "decision": "LOW",
+             "explanation": "e", "path": ["Q1 → No"], "answers": {"q1": "No"}, "metadata": {}}
+        ])
+        return service
+
+    def test_csv_rows_oldest_first(self, service, tmp_path):
+        """Test that CSV export writes one filtered row per decision."""
+        import csv
+
+        target = tmp_path / "out.csv"
+        assert service.export("csv", {"tree_name": "Vendor"}, target) == 2
+        with open(target, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        assert [row["decision"] for row in rows] == ["HIGH", "LOW"]
+        assert rows[0]["path"] == "Q1 → Yes | Q2 → No"
+        assert json.loads(rows[0]["answers"]) == {"q1": "Yes", "q2": "No"}
+
+    def test_npz_dictionary_encoded(self, service, tmp_path):
+        """Test that the columnar bundle decodes back to the original values."""
+        np = pytest.importorskip("numpy")
+
+        target = tmp_path / "out.npz"
+        assert service.export("npz", {"start": "2026-05-01", "end": "2026-06-01"}, target) == 3
+        bundle = np.load(target)
+        trees = bundle["tree_values"][bundle["tree"]]
+        assert list(trees) == ["Vendor", "DPIA", "Vendor"]
+        assert list(bundle["decision_values"][bundle["decision"]]) == ["HIGH", "REQUIRED", "LOW"]
+        assert list(bundle["questions"]) == ["q1", "q2", "d1"]
+        assert list(bundle["answer:q2"]) == [bundle["answer_values"].tolist().index("No"), -1, -1]
+        assert str(bundle["timestamp"][1]) == "2026-05-02T09:00:00.000000"
+
+    def test_rejects_unknown_format_and_filters(self, service, tmp_path):
+        """Test that bad export arguments fail early."""
+        with pytest.raises(ValueError):
+            service.export("xlsx", None, tmp_path / "out.xlsx")
+        with pytest.raises(ValueError):
+            service.export("csv", {"user": "x"}, tmp_path / "out.csv")
+
+    def test_cli(self, service, tmp_path, capsys):
+        """Test the export command line."""
+        from decisionguide.export import main
+
+        assert main(["-o", str(tmp_path / "out.csv"), "--backend", service.backend, "--decision", "LOW"]) == 0
+        assert "Exported 1 decisions" in capsys.readouterr().err
+        assert main(["--format", "npz"]) == 2
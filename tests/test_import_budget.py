@@ -0,0 +1,47 @@
+"""Tests that the headless core stays cheap to import."""
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+# Generous ceiling; importing Streamlit alone takes longer than this
+IMPORT_BUDGET_SECONDS = 0.3
+
+# Heavy modules the core must not import eagerly
+FORBIDDEN_MODULES = ["streamlit", "reportlab", "numpy"]
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import decisionguide
+elapsed = time.perf_counter() - started
+print(json.dumps({
+    "seconds": elapsed,
+    "loaded": [name for name in %r if name in sys.modules]
+}))
+""" % (FORBIDDEN_MODULES,)
+
+
+class TestImportBudget:
+    """Test import cost of the core package."""
+
+    def _probe(self):
+        """Import the core package in a fresh interpreter and report the cost."""
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE],
+            cwd=Path(__file__).parent.parent,
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout
+        return json.loads(output.strip().splitlines()[-1])
+
+    def test_core_does_not_import_ui_or_heavy_dependencies(self):
+        """Test that importing the core leaves Streamlit and friends unloaded."""
+        assert self._probe()["loaded"] == []
+
+    def test_core_import_within_budget(self):
+        """Test that the core imports within the time budget."""
+        # Best of three to smooth over a cold filesystem cache
+        seconds = min(self._probe()["seconds"] for _ in range(3))
+        assert seconds < IMPORT_BUDGET_SECONDS
@@ -0,0 +1,89 @@
+"""Tests for metrics collection and exposition."""
+import threading
+import urllib.request
+import pytest
+from models.decision_tree import DecisionResult
+from services.decision_tree_service import DecisionTreeService
+from services.history_service import HistoryService
+from utils.config import Config
+from utils.metrics import REGISTRY, Histogram, MetricsRegistry, start_http_server, write_metrics
+
+
+class TestMetrics:
+    """Test counters, histograms and Prometheus text output."""
+
+    @pytest.fixture
+    def registry(self):
+        """Create an empty registry."""
+        return MetricsRegistry()
+
+    def test_histogram_buckets_are_cumulative(self, registry):
+        """Test that values land in their le bucket and render cumulatively."""
+        histogram = registry.histogram("op_seconds", "Op latency.", {"operation": "x"})
+        for value in (0.0001, 0.003, 0.003, 20.0):
+            histogram.observe(value)
+
+        text = registry.render()
+        assert "# TYPE op_seconds histogram" in text
+        assert 'op_seconds_bucket{operation="x",le="0.0001"} 1' in text
+        assert 'op_seconds_bucket{operation="x",le="0.005"} 3' in text
+        assert 'op_seconds_bucket{operation="x",le="10.0"} 3' in text
+        assert 'op_seconds_bucket{operation="x",le="+Inf"} 4' in text
+        assert 'op_seconds_count{operation="x"} 4' in text
+
+    def test_threads_record_without_losing_counts(self):
+        """Test that per-thread slots add up exactly."""
+        histogram = Histogram("op_seconds", "Op latency.")
+        counter = MetricsRegistry().counter("ops_total", "Ops.")
+
+        def work():
+            for _ in range(5000):
+                histogram.observe(0.001)
+                counter.inc()
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        counts, total = histogram.snapshot()
+        assert sum(counts) == 40000
+        assert total == pytest.approx(40.0)
+        assert counter.value() == 40000
+
+    def test_services_are_timed(self, tmp_path, monkeypatch):
+        """Test that instrumented service calls are recorded when enabled."""
+        monkeypatch.setattr(Config, "ENABLE_METRICS", True)
+        monkeypatch.setattr(Config, "DATA_DIR", tmp_path)
+        monkeypatch.setattr(Config, "WRITE_BEHIND", False)
+        execute = REGISTRY.histogram("decisionguide_operation_duration_seconds", "", {"operation": "execute_tree"})
+        save = REGISTRY.histogram("decisionguide_operation_duration_seconds", "", {"operation": "save_decision"})
+        executed, saved = sum(execute.snapshot()[0]), sum(save.snapshot()[0])
+
+        DecisionTreeService(precompute=False).execute_tree("Incident Reporting", {"ir_q1": "No"})
+        HistoryService().save_decision("Incident Reporting", DecisionResult("ACCEPT", "ok", []), {})
+
+        assert sum(execute.snapshot()[0]) == executed + 1
+        assert sum(save.snapshot()[0]) == saved + 1
+
+        monkeypatch.setattr(Config, "ENABLE_METRICS", False)
+        DecisionTreeService(precompute=False).execute_tree("Incident Reporting", {"ir_q1": "No"})
+        assert sum(execute.snapshot()[0]) == executed + 1
+
+    def test_http_listener_and_file_dump(self, registry, tmp_path):
+        """Test that metrics are served over HTTP and dumped to a file."""
+        registry.counter("ops_total", "Ops.").inc(3)
+        server = start_http_server(0, registry=registry)
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+            with urllib.request.urlopen(url) as response:
+                body = response.read().decode("utf-8")
+        finally:
+            server.shutdown()
+            server.server_close()
+        assert "ops_total 3" in body
+
+        path = tmp_path / "metrics.prom"
+        assert write_metrics(path, registry)
+        assert path.read_text(encoding="utf-8") == body
@@ -0,0 +1,143 @@
+"""Tests for the background PDF job queue."""
+import threading
+import time
+import pytest
+from models.decision_tree import DecisionResult
+from models.pdf_job import JobStatus
+from services.pdf_cache import PDFCache
+from services.pdf_jobs import PDFJobQueue, PDFJobRejected
+from services.pdf_service import PDFService
+from utils.config import Config
+
+
+class BlockingPDFService:
+    """PDF service double that renders once released."""
+
+    def __init__(self, tmp_path):
+        self.tmp_path = tmp_path
+        self.release = threading.Event()
+
+    def cached_pdf(self, result, tree_name):
+        return None
+
+    def render_pdf(self, result, tree_name, lookup=True):
+        self.release.wait(5)
+        return None if result.decision == "FAIL" else b"%PDF-1.4"
+
+    def generate_pdf(self, result, tree_name, output_path=None):
+        data = self.render_pdf(result, tree_name)
+        if data is None:
+            return None
+        path = self.tmp_path / f"{tree_name}.pdf"
+        path.write_bytes(data)
+        return path
+
+
+def wait_until_finished(queue, job):
+    """Poll a job like the UI does until it finishes."""
+    deadline = time.monotonic() + 5
+    while not queue.get(job.id).finished and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return queue.get(job.id)
+
+
+class TestPDFJobQueue:
+    """Test PDF job submission, limits and status polling."""
+
+    @pytest.fixture
+    def pdf_service(self, tmp_path):
+        """Create a PDF service double."""
+        return BlockingPDFService(tmp_path)
+
+    @pytest.fixture
+    def queue(self, pdf_service):
+        """Create a small job queue."""
+        queue = PDFJobQueue(pdf_service, workers=1, max_queued=3, per_session=2, job_ttl=60)
+        yield queue
+        pdf_service.release.set()
+        queue.shutdown()
+
+    def test_job_completes_in_background(self, queue, pdf_service):
+        """Test that submit returns at once and the job finishes later."""
+        job = queue.submit("s1", DecisionResult("ACCEPT", "ok", []), "Vendor")
+        assert not job.finished
+
+        pdf_service.release.set()
+        job = wait_until_finished(queue, job)
+        assert job.status == JobStatus.DONE
+        assert job.data == b"%PDF-1.4"
+        assert job.path is None and job.file_name.endswith(".pdf")
+        stats = queue.stats()
+        assert stats["done"] == 1 and stats["queue_depth"] == 0
+
+    def test_file_output(self, pdf_service):
+        """Test that file output leaves the report in a file."""
+        queue = PDFJobQueue(pdf_service, workers=1, output="file")
+        pdf_service.release.set()
+        job = wait_until_finished(queue, queue.submit("s1", DecisionResult("ACCEPT", "ok", []), "Vendor"))
+        assert job.data is None
+        assert job.path.read_bytes() == b"%PDF-1.4"
+        assert job.file_name == "Vendor.pdf"
+        queue.shutdown()
+
+    def test_cached_report_is_done_at_once(self, queue, pdf_service, monkeypatch):
+        """Test that a cached report skips the queue and its limits."""
+        monkeypatch.setattr(pdf_service, "cached_pdf", lambda result, tree_name: b"%PDF-cached")
+        for _ in range(3):
+            job = queue.submit("s1", DecisionResult("ACCEPT", "ok", []), "Vendor")
+            assert job.status == JobStatus.DONE
+            assert job.data == b"%PDF-cached"
+        assert queue.stats()["cached"] == 3
+
+    def test_cache_counts_one_lookup_per_export(self, tmp_path, monkeypatch):
+        """Test that a queued render does not look the report up a second time."""
+        monkeypatch.setattr(Config, "DATA_DIR", tmp_path)
+        cache = PDFCache(max_bytes=1 << 20)
+        pdf_service = PDFService(cache)
+        if not pdf_service.available:
+            pytest.skip("reportlab is not installed")
+        queue = PDFJobQueue(pdf_service, workers=1, output="memory")
+        result = DecisionResult("ACCEPT", "ok", ["Q1 → Yes"])
+
+        first = wait_until_finished(queue, queue.submit("s1", result, "Vendor"))
+        second = queue.submit("s1", result, "Vendor")
+        assert second.status == JobStatus.DONE
+        assert second.data == first.data
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"]) == (1, 1)
+        assert stats["hit_rate"] == 0.5
+        queue.shutdown()
+
+    def test_failed_render_is_reported(self, queue, pdf_service):
+        """Test that a render returning nothing marks the job failed."""
+        pdf_service.release.set()
+        job = wait_until_finished(queue, queue.submit("s1", DecisionResult("FAIL", "", []), "Vendor"))
+        assert job.status == JobStatus.FAILED
+        assert job.error
+
+    def test_session_and_queue_limits(self, queue, pdf_service):
+        """Test that per-session and total limits reject extra jobs."""
+        result = DecisionResult("ACCEPT", "ok", [])
+        queue.submit("s1", result, "Vendor")
+        queue.submit("s1", result, "Vendor")
+        with pytest.raises(PDFJobRejected):
+            queue.submit("s1", result, "Vendor")
+
+        last = queue.submit("s2", result, "Vendor")
+        with pytest.raises(PDFJobRejected):
+            queue.submit("s3", result, "Vendor")
+        assert queue.stats()["rejected"] == 2
+
+        pdf_service.release.set()
+        wait_until_finished(queue, last)
+        queue.submit("s1", result, "Vendor")
+
+    def test_finished_jobs_expire(self, pdf_service):
+        """Test that finished jobs are forgotten after their TTL."""
+        queue = PDFJobQueue(pdf_service, workers=1, job_ttl=0)
+        pdf_service.release.set()
+        job = wait_until_finished(queue, queue.submit("s1", DecisionResult("ACCEPT", "ok", []), "Vendor"))
+        time.sleep(0.01)
+        queue.submit("s1", DecisionResult("ACCEPT", "ok", []), "Vendor")
+        assert queue.get(job.id) is None
+        queue.shutdown()
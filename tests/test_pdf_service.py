@@ -0,0 +1,108 @@
+"""Tests for PDF report generation."""
+from datetime import date
+import pytest
+from models.decision_tree import DecisionResult
+from services.pdf_cache import PDFCache, cache_key
+from services.pdf_service import PDFService
+from utils.config import Config
+
+
+class TestPDFService:
+    """Test in-memory and file PDF output."""
+
+    @pytest.fixture
+    def service(self, tmp_path, monkeypatch):
+        """Create a PDF service writing to a temporary directory."""
+        monkeypatch.setattr(Config, "DATA_DIR", tmp_path)
+        service = PDFService()
+        if not service.available:
+            pytest.skip("reportlab is not installed")
+        return service
+
+    @pytest.fixture
+    def result(self):
+        """Create a decision result."""
+        return DecisionResult("ACCEPT", "Low risk.", ["Q1 → Yes", "Q2 → No"])
+
+    def test_render_to_bytes_leaves_no_files(self, service, result, tmp_path):
+        """Test that in-memory rendering returns a PDF without writing files."""
+        data = service.render_pdf(result, "Vendor Risk Tiering")
+        assert data.startswith(b"%PDF")
+        assert list(tmp_path.iterdir()) == []
+
+    def test_file_output_names_are_unique(self, service, result):
+        """Test that reports generated back to back do not overwrite each other."""
+        first = service.generate_pdf(result, "Vendor Risk Tiering")
+        second = service.generate_pdf(result, "Vendor Risk Tiering")
+        assert first != second
+        assert first.read_bytes().startswith(b"%PDF")
+
+    def test_only_cached_reports_drop_the_time(self, service, result, monkeypatch):
+        """Test that uncached and file reports print the full timestamp."""
+        printed = []
+        monkeypatch.setattr(service, "_build", lambda target, *args: printed.append(args[-1]))
+
+        service.generate_pdf(result, "Vendor Risk Tiering")
+        service.cache = None
+        service.render_pdf(result, "Vendor Risk Tiering")
+        service.cache = PDFCache()
+        service.render_pdf(result, "Vendor Risk Tiering")
+
+        assert len(printed[0]) == len(printed[1]) == len("2026-03-05 12:00:00")
+        assert printed[2] == date.today().isoformat()
+
+
+class TestPDFCache:
+    """Test the content-addressed PDF render cache."""
+
+    @pytest.fixture
+    def result(self):
+        """Create a decision result."""
+        return DecisionResult("ACCEPT", "Low risk.", ["Q1 → Yes"])
+
+    def test_key_covers_rendered_content(self, result):
+        """Test that keys change with any field shown in the report."""
+        today = date(2026, 3, 5)
+        key = cache_key(result, "Vendor", today)
+        assert key == cache_key(DecisionResult("ACCEPT", "Low risk.", ["Q1 → Yes"]), "Vendor", today)
+        assert key != cache_key(result, "DPIA", today)
+        assert key != cache_key(DecisionResult("ACCEPT", "Low risk.", ["Q1 → No"]), "Vendor", today)
+        assert key != cache_key(result, "Vendor", date(2026, 3, 6))
+
+    def test_lru_eviction_by_bytes(self):
+        """Test that the least recently used entries are evicted to fit the budget."""
+        cache = PDFCache(max_bytes=10)
+        cache.put("a", b"1234")
+        cache.put("b", b"1234")
+        assert cache.get("a") == b"1234"
+        cache.put("c", b"1234")
+
+        assert cache.get("b") is None
+        assert cache.get("a") == b"1234"
+        stats = cache.stats()
+        assert stats["bytes"] == 8
+        assert stats["evictions"] == 1
+        assert (stats["hits"], stats["misses"]) == (2, 1)
+
+    def test_evicted_entries_spill_to_disk(self, tmp_path):
+        """Test that evicted entries are served from disk and survive a restart."""
+        cache = PDFCache(max_bytes=4, spill_dir=tmp_path, max_disk_bytes=100)
+        cache.put("a", b"1234")
+        cache.put("b", b"5678")
+        assert (tmp_path / "a.pdf").exists()
+
+        restarted = PDFCache(max_bytes=4, spill_dir=tmp_path, max_disk_bytes=100)
+        assert restarted.get("a") == b"1234"
+        assert restarted.stats()["disk_hits"] == 1
+
+    def test_repeat_render_is_cached(self, tmp_path, monkeypatch, result):
+        """Test that rendering an identical result again returns the cached bytes."""
+        monkeypatch.setattr(Config, "DATA_DIR", tmp_path)
+        service = PDFService(cache=PDFCache(max_bytes=1024 * 1024))
+        if not service.available:
+            pytest.skip("reportlab is not installed")
+
+        first = service.render_pdf(result, "Vendor")
+        assert service.cached_pdf(result, "Vendor") is first
+        assert service.render_pdf(result, "Vendor") is first
+        assert service.cache.stats()["misses"] == 1
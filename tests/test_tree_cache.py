@@ -0,0 +1,72 @@
+"""Tests for the compiled-tree cache."""
+import json
+import os
+import time
+from services.tree_cache import CompiledTreeCache
+from services.tree_compiler import compile_tree
+from utils.config import Config
+
+
+class TestCompiledTreeCache:
+    """Test compiled-tree cache."""
+
+    def test_round_trip(self, tmp_path):
+        """Test that a stored artifact loads back as an equal tree."""
+        source = Config.LOGIC_DIR / "vendor_risk_tiering.json"
+        content = source.read_bytes()
+        tree_data = json.loads(content)
+        compiled = compile_tree(tree_data)
+
+        cache = CompiledTreeCache(tmp_path)
+        assert cache.load(content) is None
+        cache.store(content, tree_data, compiled)
+
+        loaded_data, loaded = cache.load(content)
+        assert loaded_data == tree_data
+        assert loaded == compiled
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_changed_content_misses(self, tmp_path):
+        """Test that edited files are not served from the cache."""
+        tree_data = {
+            "tree_name": "Small",
+            "questions": {"q1": {"yes": "a", "no": "b"}},
+            "outcomes": {"a": "A.", "b": "B."}
+        }
+        content = json.dumps(tree_data).encode("utf-8")
+        cache = CompiledTreeCache(tmp_path)
+        cache.store(content, tree_data, compile_tree(tree_data))
+
+        assert cache.load(content + b" ") is None
+        assert cache.load(content, default_name="other") is None
+
+    def test_prune_keeps_current_artifacts(self, tmp_path):
+        """Test that pruning deletes every artifact not in use."""
+        tree_data = {
+            "tree_name": "Small",
+            "questions": {"q1": {"yes": "a", "no": "b"}},
+            "outcomes": {"a": "A.", "b": "B."}
+        }
+        content = json.dumps(tree_data).encode("utf-8")
+        edited = content + b" "
+        cache = CompiledTreeCache(tmp_path)
+        cache.store(content, tree_data, compile_tree(tree_data))
+        cache.store(edited, tree_data, compile_tree(tree_data))
+
+        assert cache.prune({cache.key(edited)}) == 1
+        assert cache.load(content) is None
+        assert cache.load(edited) is not None
+
+    def test_prune_sweeps_stale_temp_files(self, tmp_path):
+        """Test that pruning deletes abandoned temp files but not fresh ones."""
+        cache = CompiledTreeCache(tmp_path)
+        abandoned = tmp_path / "abc.123.tmp"
+        in_progress = tmp_path / "def.456.tmp"
+        abandoned.write_bytes(b"partial")
+        in_progress.write_bytes(b"partial")
+        old = time.time() - 3600
+        os.utime(abandoned, (old, old))
+
+        assert cache.prune(set()) == 1
+        assert not abandoned.exists()
+        assert in_progress.exists()
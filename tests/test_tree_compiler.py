@@ -0,0 +1,81 @@
+"""Tests for the JSON tree compiler."""
+import pytest
+from models.compiled_tree import NodeKind
+from services.tree_compiler import TreeCompilationError, compile_tree
+
+
+class TestTreeCompiler:
+    """Test tree compilation."""
+
+    @pytest.fixture
+    def legacy_tree(self):
+        """Tree using the yes/no shorthand and plain-text outcomes."""
+        return {
+            "tree_name": "Legacy",
+            "start": "q1",
+            "questions": {
+                "q1": {"text": "First?", "yes": "q2", "no": "monitor"},
+                "q2": {"text": "Second?", "yes": "report", "no": "monitor"}
+            },
+            "outcomes": {
+                "report": "Report it.",
+                "monitor": "Keep monitoring."
+            }
+        }
+
+    def test_compile_yes_no_shorthand(self, legacy_tree):
+        """Test that yes/no keys become options with integer transitions."""
+        tree = compile_tree(legacy_tree)
+        q1 = tree.node_for("q1")
+        assert tree.kinds[q1] == NodeKind.QUESTION
+        assert tree.options[q1] == ("Yes", "No")
+        assert tree.transitions[q1] == (tree.node_for("q2"), tree.node_for("monitor"))
+        assert tree.outcomes[tree.node_for("report")].decision == "REPORT"
+
+    def test_dangling_target_rejected(self, legacy_tree):
+        """Test that unknown targets fail compilation."""
+        legacy_tree["questions"]["q2"]["yes"] = "missing"
+        with pytest.raises(TreeCompilationError):
+            compile_tree(legacy_tree)
+
+    def test_score_bands(self):
+        """Test that scores resolve to the first band whose max is not exceeded."""
+        tree = compile_tree({
+            "tree_name": "Scored",
+            "questions": {
+                "q1": {"options": {
+                    "Low": {"next": "$score", "score": 1},
+                    "High": {"next": "$score", "score": 5}
+                }}
+            },
+            "scoring": {"bands": [{"max": 2, "outcome": "low"}, {"outcome": "high"}]},
+            "outcomes": {"low": "Low.", "high": "High."}
+        })
+        assert tree.scored
+        assert tree.band_for(1) == tree.node_for("low")
+        assert tree.band_for(2) == tree.node_for("low")
+        assert tree.band_for(5) == tree.node_for("high")
+
+    def test_cycle_rejected(self, legacy_tree):
+        """Test that a question leading back to an earlier one fails compilation."""
+        legacy_tree["questions"]["q2"]["no"] = "q1"
+        with pytest.raises(TreeCompilationError, match="cycle"):
+            compile_tree(legacy_tree)
+
+    def test_unreachable_nodes_rejected(self, legacy_tree):
+        """Test that orphan questions and outcomes fail compilation."""
+        legacy_tree["questions"]["q3"] = {"yes": "report", "no": "monitor"}
+        legacy_tree["outcomes"]["unused"] = "Never reached."
+        with pytest.raises(TreeCompilationError, match="unreachable") as excinfo:
+            compile_tree(legacy_tree)
+        assert "q3" in str(excinfo.value) and "unused" in str(excinfo.value)
+
+    def test_node_metrics(self, legacy_tree):
+        """Test remaining depth, reachable outcomes and question counts."""
+        tree = compile_tree(legacy_tree)
+        q1, q2 = tree.node_for("q1"), tree.node_for("q2")
+        assert tree.remaining_depth[q1] == 2
+        assert tree.remaining_depth[q2] == 1
+        assert tree.remaining_depth[tree.node_for("report")] == 0
+        assert set(tree.reachable_outcomes[q2]) == {tree.node_for("report"), tree.node_for("monitor")}
+        assert tree.question_counts[q1] == 2
@@ -0,0 +1,104 @@
+"""Tests for hot reloading of tree snapshots."""
+import json
+import os
+import time
+import pytest
+from services.decision_tree_service import DecisionTreeService
+from utils.config import Config
+
+
+def _write_tree(path, explanation, bump=0):
+    """Write a one-question tree and push its mtime forward."""
+    path.write_text(json.dumps({
+        "tree_name": "Reloadable",
+        "questions": {"q1": {"yes": "done", "no": "done"}},
+        "outcomes": {"done": explanation}
+    }), encoding="utf-8")
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + bump * 1_000_000_000))
+
+
+class TestHotReload:
+    """Test registry snapshots and reloading."""
+
+    @pytest.fixture
+    def logic_dir(self, tmp_path, monkeypatch):
+        """Point the service at an empty logic directory."""
+        monkeypatch.setattr(Config, "LOGIC_DIR", tmp_path)
+        return tmp_path
+
+    def test_reload_swaps_snapshot(self, logic_dir):
+        """Test that edits publish a new snapshot and old cursors keep theirs."""
+        tree_file = logic_dir / "tree.json"
+        _write_tree(tree_file, "First.")
+        service = DecisionTreeService(use_cache=False, error_reporter=lambda _: None)
+        cursor = service.create_cursor("Reloadable")
+        first = service.registry
+
+        assert service.reload() is False
+
+        _write_tree(tree_file, "Second.", bump=1)
+        assert service.reload() is True
+        assert service.registry.version == first.version + 1
+        assert service.execute_tree("Reloadable", {"q1": "Yes"}).explanation == "Second."
+
+        cursor.answer("q1", "Yes")
+        assert cursor.result().explanation == "First."
+
+    def test_reload_prunes_stale_artifacts(self, logic_dir, tree_cache_dir):
+        """Test that an edited tree's old compiled artifact is deleted."""
+        tree_file = logic_dir / "tree.json"
+        _write_tree(tree_file, "First.")
+        service = DecisionTreeService(use_cache=True, error_reporter=lambda _: None)
+        first = list(service.tree_cache.directory.iterdir())
+
+        _write_tree(tree_file, "Second.", bump=1)
+        assert service.reload() is True
+        artifacts = list(service.tree_cache.directory.iterdir())
+        assert len(first) == len(artifacts) == 1
+        assert artifacts != first
+
+    def test_shared_cache_dir_keeps_other_logic_dirs(self, tmp_path, monkeypatch):
+        """Test that pruning leaves artifacts of another logic directory alone."""
+        services = []
+        for name in ("a", "b"):
+            logic_dir = tmp_path / name
+            logic_dir.mkdir()
+            _write_tree(logic_dir / "tree.json", f"From {name}.")
+            monkeypatch.setattr(Config, "LOGIC_DIR", logic_dir)
+            services.append(DecisionTreeService(use_cache=True, error_reporter=lambda _: None))
+        other_artifacts = list(services[0].tree_cache.directory.iterdir())
+
+        _write_tree(tmp_path / "b" / "tree.json", "Edited.", bump=1)
+        assert services[1].reload() is True
+        assert list(services[0].tree_cache.directory.iterdir()) == other_artifacts
+
+    def test_broken_edit_keeps_previous_tree(self, logic_dir):
+        """Test that a tree that fails to compile does not replace the live one."""
+        tree_file = logic_dir / "tree.json"
+        _write_tree(tree_file, "First.")
+        messages = []
+        service = DecisionTreeService(use_cache=False, error_reporter=messages.append)
+
+        tree_file.write_text("{broken", encoding="utf-8")
+        stat = tree_file.stat()
+        os.utime(tree_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2_000_000_000))
+
+        service.reload()
+        assert messages
+        assert service.execute_tree("Reloadable", {"q1": "No"}).explanation == "First."
+
+    def test_poller_picks_up_changes(self, logic_dir):
+        """Test that the background poller reloads edited trees."""
+        tree_file = logic_dir / "tree.json"
+        _write_tree(tree_file, "First.")
+        service = DecisionTreeService(use_cache=False, error_reporter=lambda _: None)
+        service.start_watching(interval=0.01)
+        try:
+            _write_tree(tree_file, "Second.", bump=1)
+            deadline = time.monotonic() + 2
+            while service.registry.version == 1 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            service.stop_watching()
+        assert service.execute_tree("Reloadable", {"q1": "Yes"}).explanation == "Second."
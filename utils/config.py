@@ -24,8 +24,53 @@ class Config:
     ENABLE_HISTORY: bool = os.getenv("ENABLE_HISTORY", "true").lower() == "true"
     ENABLE_ANALYTICS: bool = os.getenv("ENABLE_ANALYTICS", "false").lower() == "true"
     
+    # History
+    HISTORY_BACKEND: str = os.getenv("HISTORY_BACKEND", "jsonl")  # jsonl, sqlite or json
+    # Entries to keep, 0 keeps everything. With jsonl segments enabled this is a floor, not
+    # a cap: old segments are dropped whole once newer ones hold this many entries, and the
+    # active log is bounded by HISTORY_SEGMENT_BYTES and HISTORY_SEGMENT_DAYS instead
+    HISTORY_MAX_ENTRIES: int = int(os.getenv("HISTORY_MAX_ENTRIES", "100"))
+    HISTORY_CACHE_SIZE: int = int(os.getenv("HISTORY_CACHE_SIZE", "50"))  # recent entries kept in memory
+    HISTORY_RETENTION_DAYS: int = int(os.getenv("HISTORY_RETENTION_DAYS", "0"))  # 0 keeps everything
+    # jsonl only: close the active log into a gzip segment at this size or age; 0 disables
+    HISTORY_SEGMENT_BYTES: int = int(os.getenv("HISTORY_SEGMENT_BYTES", str(4 * 1024 * 1024)))
+    HISTORY_SEGMENT_DAYS: float = float(os.getenv("HISTORY_SEGMENT_DAYS", "7"))
+    
+    # Background writes of history and analytics
+    ANALYTICS_FLUSH_INTERVAL: float = float(os.getenv("ANALYTICS_FLUSH_INTERVAL", "5"))  # seconds; 0 writes every decision
+    # Each process writes its own analytics shard, for replicas sharing DATA_DIR
+    ANALYTICS_SHARDED: bool = os.getenv("ANALYTICS_SHARDED", "false").lower() == "true"
+    WRITE_BEHIND: bool = os.getenv("WRITE_BEHIND", "true").lower() == "true"
+    WRITE_BEHIND_INTERVAL: float = float(os.getenv("WRITE_BEHIND_INTERVAL", "0.5"))  # seconds
+    WRITE_BEHIND_BATCH_SIZE: int = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "100"))
+    WRITE_BEHIND_MAX_PENDING: int = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "10000"))
+    
     # Performance
     CACHE_TTL: int = int(os.getenv("CACHE_TTL", "3600"))  # 1 hour default
+    PRECOMPUTE_OUTCOMES: bool = os.getenv("PRECOMPUTE_OUTCOMES", "true").lower() == "true"
+    PRECOMPUTE_MAX_ENTRIES: int = int(os.getenv("PRECOMPUTE_MAX_ENTRIES", "65536"))  # slots per tree
+    ENABLE_TREE_CACHE: bool = os.getenv("ENABLE_TREE_CACHE", "true").lower() == "true"
+    TREE_CACHE_DIR: Path = DATA_DIR / "tree_cache"  # one subdirectory per LOGIC_DIR
+    HOT_RELOAD: bool = os.getenv("HOT_RELOAD", "false").lower() == "true"
+    RELOAD_INTERVAL: float = float(os.getenv("RELOAD_INTERVAL", "2"))  # seconds between logic/ scans
+    
+    # Background PDF rendering
+    PDF_OUTPUT: str = os.getenv("PDF_OUTPUT", "memory")  # memory, or file to keep reports in DATA_DIR
+    # Rendered PDFs cached by content; 0 bytes disables, empty dir keeps the cache in memory only
+    PDF_CACHE_BYTES: int = int(os.getenv("PDF_CACHE_BYTES", str(32 * 1024 * 1024)))
+    PDF_CACHE_DIR: str = os.getenv("PDF_CACHE_DIR", "")
+    PDF_CACHE_DISK_BYTES: int = int(os.getenv("PDF_CACHE_DISK_BYTES", str(256 * 1024 * 1024)))
+    PDF_WORKERS: int = int(os.getenv("PDF_WORKERS", "2"))
+    PDF_MAX_QUEUED: int = int(os.getenv("PDF_MAX_QUEUED", "16"))  # jobs waiting or rendering, all sessions
+    PDF_JOBS_PER_SESSION: int = int(os.getenv("PDF_JOBS_PER_SESSION", "2"))  # unfinished jobs per session
+    PDF_JOB_TTL: float = float(os.getenv("PDF_JOB_TTL", "600"))  # seconds a finished job is kept
+    
+    # Metrics: latency histograms in Prometheus text format
+    ENABLE_METRICS: bool = os.getenv("ENABLE_METRICS", "false").lower() == "true"
+    METRICS_PORT: int = int(os.getenv("METRICS_PORT", "0"))  # serve /metrics on this port; 0 disables
+    METRICS_HOST: str = os.getenv("METRICS_HOST", "127.0.0.1")
+    METRICS_FILE: str = os.getenv("METRICS_FILE", "")  # dump to this file; empty disables
+    METRICS_DUMP_INTERVAL: float = float(os.getenv("METRICS_DUMP_INTERVAL", "15"))  # seconds
     
     # Security
     MAX_SESSION_DURATION: int = int(os.getenv("MAX_SESSION_DURATION", "7200"))  # 2 hours
@@ -0,0 +1,51 @@
+"""Advisory file locking shared by processes writing to the data directory."""
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+# flock is per open file, so threads of one process also need a local lock
+_thread_locks: Dict[str, threading.Lock] = {}
+_thread_locks_guard = threading.Lock()
+
+
+def _thread_lock(path: Path) -> threading.Lock:
+    """Get the in-process lock for a path."""
+    key = str(path)
+    with _thread_locks_guard:
+        lock = _thread_locks.get(key)
+        if lock is None:
+            lock = _thread_locks[key] = threading.Lock()
+        return lock
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """
+    Hold an exclusive advisory lock for a data file.
+
+    The lock is taken on a ``.lock`` file next to ``path`` so the data file
+    itself can be replaced atomically while locked. Without ``fcntl`` (on
+    Windows) only threads of the current process are serialized.
+
+    Args:
+        path: Data file to protect
+    """
+    with _thread_lock(path):
+        if not FCNTL_AVAILABLE:
+            yield
+            return
+
+        lock_path = path.with_name(path.name + ".lock")
+        with open(lock_path, 'a') as handle:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
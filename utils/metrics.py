@@ -0,0 +1,417 @@
+"""Counters and latency histograms exposed in Prometheus text format."""
+import atexit
+import functools
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from utils.config import Config
+
+# Upper bounds in seconds, from sub-millisecond lookups to multi-second PDF renders
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _ThreadSlots:
+    """
+    Fixed-size array of float slots, one copy per recording thread.
+
+    Recording adds to the calling thread's own array, so it takes no lock
+    and allocates nothing after a thread's first use. Readers sum every
+    thread's array; arrays of finished threads are folded into one.
+    """
+
+    def __init__(self, size: int):
+        """
+        Create the slots.
+
+        Args:
+            size: Number of slots
+        """
+        self.size = size
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._threads: List[Tuple[threading.Thread, array]] = []
+        self._retired = array('d', [0.0]) * size
+
+    def slots(self) -> array:
+        """Get the calling thread's slots."""
+        try:
+            return self._local.slots
+        except AttributeError:
+            slots = self._local.slots = array('d', [0.0]) * self.size
+            with self._lock:
+                self._retire_finished()
+                self._threads.append((threading.current_thread(), slots))
+            return slots
+
+    def totals(self) -> List[float]:
+        """Sum the slots over every thread."""
+        with self._lock:
+            self._retire_finished()
+            totals = list(self._retired)
+            for _, slots in self._threads:
+                for index, value in enumerate(slots):
+                    totals[index] += value
+        return totals
+
+    def _retire_finished(self) -> None:
+        """Fold the slots of finished threads into ``_retired``; call with the lock held."""
+        alive = []
+        for thread, slots in self._threads:
+            if thread.is_alive():
+                alive.append((thread, slots))
+            else:
+                for index, value in enumerate(slots):
+                    self._retired[index] += value
+        self._threads = alive
+
+
+class Counter:
+    """Monotonic counter."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Optional[Dict[str, str]] = None):
+        """
+        Create a counter.
+
+        Args:
+            name: Metric name
+            help_text: Description for the HELP line
+            labels: Fixed label values of this series
+        """
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels or {}
+        self._slots = _ThreadSlots(1)
+
+    def inc(self, amount: float = 1) -> None:
+        """Add to the counter."""
+        self._slots.slots()[0] += amount
+
+    def value(self) -> float:
+        """Current value."""
+        return self._slots.totals()[0]
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        """Exposition samples as (name, labels, value)."""
+        return [(self.name, self.labels, self.value())]
+
+
+class Gauge:
+    """Value that goes up and down, such as a queue depth."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: Optional[Dict[str, str]] = None):
+        """
+        Create a gauge.
+
+        Args:
+            name: Metric name
+            help_text: Description for the HELP line
+            labels: Fixed label values of this series
+        """
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels or {}
+        self._value = array('d', [0.0])
+
+    def set(self, value: float) -> None:
+        """Set the current value."""
+        self._value[0] = value
+
+    def value(self) -> float:
+        """Current value."""
+        return self._value[0]
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        """Exposition samples as (name, labels, value)."""
+        return [(self.name, self.labels, self.value())]
+
+
+class Histogram:
+    """
+    Latency histogram with fixed bucket bounds.
+
+    Each thread's slots hold one count per bucket, one for values above
+    the last bound, and the running sum.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Optional[Dict[str, str]] = None,
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS
+    ):
+        """
+        Create a histogram.
+
+        Args:
+            name: Metric name
+            help_text: Description for the HELP line
+            labels: Fixed label values of this series
+            buckets: Sorted upper bounds
+        """
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels or {}
+        self.buckets = tuple(buckets)
+        self._sum_slot = len(self.buckets) + 1
+        self._slots = _ThreadSlots(len(self.buckets) + 2)
+
+    def observe(self, value: float) -> None:
+        """Record one value."""
+        slots = self._slots.slots()
+        slots[bisect_left(self.buckets, value)] += 1
+        slots[self._sum_slot] += value
+
+    def snapshot(self) -> Tuple[List[float], float]:
+        """
+        Read the histogram.
+
+        Returns:
+            Count per bucket (the last one above every bound) and the sum
+        """
+        totals = self._slots.totals()
+        return totals[:-1], totals[-1]
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        """Exposition samples as (name, labels, value), with cumulative buckets."""
+        counts, total = self.snapshot()
+        samples = []
+        cumulative = 0.0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            samples.append((f"{self.name}_bucket", {**self.labels, "le": _format_bound(bound)}, cumulative))
+        samples.append((f"{self.name}_sum", self.labels, total))
+        samples.append((f"{self.name}_count", self.labels, cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    """Named metric series, rendered together in Prometheus text format."""
+
+    def __init__(self):
+        """Create an empty registry."""
+        self._lock = threading.Lock()
+        self._metrics: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Any] = {}
+
+    def counter(self, name: str, help_text: str, labels: Optional[Dict[str, str]] = None) -> Counter:
+        """Get or create a counter series."""
+        return self._get(Counter, name, help_text, labels)
+
+    def gauge(self, name: str, help_text: str, labels: Optional[Dict[str, str]] = None) -> Gauge:
+        """Get or create a gauge series."""
+        return self._get(Gauge, name, help_text, labels)
+
+    def histogram(self, name: str, help_text: str, labels: Optional[Dict[str, str]] = None) -> Histogram:
+        """Get or create a latency histogram series."""
+        return self._get(Histogram, name, help_text, labels)
+
+    def _get(self, kind: type, name: str, help_text: str, labels: Optional[Dict[str, str]]) -> Any:
+        """Get a series, creating it on first use."""
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            metric = self._metrics.get(key)
+            if metric is None:
+                metric = self._metrics[key] = kind(name, help_text, labels)
+            elif not isinstance(metric, kind):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def render(self) -> str:
+        """
+        Render every series in Prometheus text exposition format.
+
+        Returns:
+            Exposition text, series of one metric grouped under its HELP
+            and TYPE lines
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.items(), key=lambda item: item[0])
+        lines = []
+        current = None
+        for (name, _), metric in metrics:
+            if name != current:
+                lines.append(f"# HELP {name} {metric.help_text}")
+                lines.append(f"# TYPE {name} {metric.kind}")
+                current = name
+            for sample_name, labels, value in metric.samples():
+                lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(bound)
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+    return "{" + pairs + "}"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+# Process-wide registry used by the instrumented services
+REGISTRY = MetricsRegistry()
+
+
+def timed(operation: str) -> Callable:
+    """
+    Decorate a function to record its call latency and failures.
+
+    Calls are counted in ``decisionguide_operation_duration_seconds`` and
+    exceptions in ``decisionguide_operation_errors_total``, both labelled
+    with ``operation``, while Config.ENABLE_METRICS is set.
+
+    Args:
+        operation: Label value naming the operation
+    """
+    histogram = REGISTRY.histogram(
+        "decisionguide_operation_duration_seconds",
+        "Latency of instrumented operations in seconds.",
+        {"operation": operation}
+    )
+    errors = REGISTRY.counter(
+        "decisionguide_operation_errors_total",
+        "Instrumented operations that raised an exception.",
+        {"operation": operation}
+    )
+
+    def decorate(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not Config.ENABLE_METRICS:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except BaseException:
+                errors.inc()
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+
+def start_http_server(port: int, host: str = "127.0.0.1", registry: MetricsRegistry = REGISTRY) -> Any:
+    """
+    Serve metrics at ``http://host:port/metrics`` from a daemon thread.
+
+    Args:
+        port: Port to listen on; 0 picks a free one
+        host: Interface to bind, local only by default
+        registry: Registry to serve
+
+    Returns:
+        The running ThreadingHTTPServer; its ``server_address`` holds the
+        bound port
+    """
+    # Imported here so the headless core does not pay for http.server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        """Serves the registry at /metrics."""
+
+        def do_GET(self) -> None:
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            # Scrapes are too frequent to log
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def write_metrics(path: Path, registry: MetricsRegistry = REGISTRY) -> bool:
+    """
+    Dump metrics to a file atomically, e.g. for the node exporter's textfile collector.
+
+    Args:
+        path: Output file
+        registry: Registry to dump
+
+    Returns:
+        False if the file could not be written
+    """
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        tmp_path.write_text(registry.render(), encoding="utf-8")
+        os.replace(tmp_path, path)
+        return True
+    except IOError as e:
+        print(f"Error writing metrics: {e}")
+        return False
+
+
+_exporter_lock = threading.Lock()
+_exporter_started = False
+
+
+def start_exporter() -> None:
+    """
+    Start the exposition configured by Config, once per process.
+
+    Listens on Config.METRICS_PORT when it is set, and dumps to
+    Config.METRICS_FILE every Config.METRICS_DUMP_INTERVAL seconds and at
+    exit when a file is set.
+    """
+    global _exporter_started
+    if not Config.ENABLE_METRICS:
+        return
+    with _exporter_lock:
+        if _exporter_started:
+            return
+        _exporter_started = True
+
+    if Config.METRICS_PORT:
+        try:
+            start_http_server(Config.METRICS_PORT, Config.METRICS_HOST)
+        except OSError as e:
+            print(f"Error starting metrics listener on port {Config.METRICS_PORT}: {e}")
+
+    if Config.METRICS_FILE:
+        path = Path(Config.METRICS_FILE)
+        stop = threading.Event()
+
+        def dump_loop() -> None:
+            while not stop.wait(Config.METRICS_DUMP_INTERVAL):
+                write_metrics(path)
+
+        def final_dump() -> None:
+            stop.set()
+            write_metrics(path)
+
+        threading.Thread(target=dump_loop, name="metrics-dump", daemon=True).start()
+        atexit.register(final_dump)